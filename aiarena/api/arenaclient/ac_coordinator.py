@@ -8,13 +8,18 @@ if TYPE_CHECKING:
     from aiarena.core.models import ArenaClient
 
 import logging
+import time
 
 from constance import config
-from django.db import transaction, connection
+from django.db import transaction
 from django.db.models import F
+from rest_framework import status
+from rest_framework.exceptions import APIException
 
 from aiarena.api.arenaclient.exceptions import LadderDisabled, NoCurrentlyAvailableCompetitions
 from aiarena.core.api import Matches
+from aiarena.core.d_utils import can_signal_match_availability, get_match_availability_version, \
+    wait_for_match_availability_change
 from aiarena.core.models import Match, Competition
 
 logger = logging.getLogger(__name__)
@@ -39,6 +44,14 @@ class ACCoordinator:
             competition_ids = ACCoordinator._get_competition_priority_order()
             for id in competition_ids:
                 competition = Competition.objects.get(id=id)
+                if Matches.can_claim_with_skip_locked():
+                    # Try claiming an already queued match first. This doesn't wait on other arena clients,
+                    # so we only fall through to the fully locked path when a new round might be needed.
+                    with transaction.atomic():
+                        match = Matches.claim_a_ladder_match(arenaclient, competition)
+                    if match is not None:
+                        return match
+
                 # this atomic block is done inside the for loop so that we don't hold onto a lock for a single competition
                 with transaction.atomic():
                     # this call will apply a select for update, so we do it inside an atomic block
@@ -56,74 +69,107 @@ class ACCoordinator:
             return requested_match
         return ACCoordinator.next_competition_match(arenaclient)
 
+    @staticmethod
+    def _unfinished_matches(arenaclient: ArenaClient):
+        return Match.objects.only('id', 'map') \
+            .filter(started__isnull=False, assigned_to=arenaclient,
+                    result__isnull=True).order_by(F('round_id').asc())
+
+    @staticmethod
+    def requeue_expired_leases():
+        with transaction.atomic():
+            Matches.requeue_expired_leases()
+
     @staticmethod
     def next_match(arenaclient: ArenaClient) -> Match:
         if config.LADDER_ENABLED:
             try:
+                ACCoordinator.requeue_expired_leases()
                 if config.REISSUE_UNFINISHED_MATCHES:
                     # Check for any unfinished matches assigned to this user. If any are present, return that.
-                    unfinished_matches = Match.objects.only('id', 'map') \
-                        .filter(started__isnull=False, assigned_to=arenaclient,
-                                result__isnull=True).order_by(F('round_id').asc())
+                    unfinished_matches = ACCoordinator._unfinished_matches(arenaclient)
                     if unfinished_matches.count() > 0:
-                        return unfinished_matches[0]  # todo: re-set started time?
+                        match = unfinished_matches[0]  # todo: re-set started time?
+                        Matches.renew_leases(arenaclient, [match.id])
+                        return match
                 # Trying a new match
                 return ACCoordinator.next_new_match(arenaclient)
-            except Exception as e:
+            except Exception:
                 logger.exception("Exception while processing request for match.")
                 raise
         else:
             raise LadderDisabled()
 
+    @staticmethod
+    def wait_for_next_match(arenaclient: ArenaClient, timeout: float) -> Match:
+        """
+        Like next_match, but when there's no match to play, waits up to timeout seconds for one instead of
+        returning straight away. While waiting only the cache is polled - the scheduler is only run again
+        once something has happened which might have made a match available.
+        Long polling is turned off when the cache can't signal such changes, since waiting could then only
+        hold a web worker for the whole timeout.
+        """
+        if not can_signal_match_availability():
+            return ACCoordinator.next_match(arenaclient)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            version = get_match_availability_version()
+            try:
+                match = ACCoordinator.next_match(arenaclient)
+                if match is not None:
+                    return match
+            except APIException as e:
+                if e.status_code != status.HTTP_200_OK:
+                    raise  # an actual error
+            if not wait_for_match_availability_change(version, deadline - time.monotonic()):
+                break
+        # Not every change is signalled - matches timing out for one - so have one last look before giving up.
+        # This also means the reason given for there being no match is a current one.
+        return ACCoordinator.next_match(arenaclient)
+
+    @staticmethod
+    def next_matches(arenaclient: ArenaClient, count: int) -> list:
+        """
+        Returns up to count matches for an arena client running several games at once.
+        Each match is picked the same way next_match would pick it, so competition priority and bot data locks
+        are respected between the matches in the batch. Each match is started in its own transaction, so that the
+        competition's scheduling pass has moved on before the next match is picked and no locks are held for longer
+        than it takes to start one match.
+        If no match at all could be found, the exception explaining why is raised, as with next_match.
+        """
+        if not config.LADDER_ENABLED:
+            raise LadderDisabled()
+
+        matches = []
+        try:
+            ACCoordinator.requeue_expired_leases()
+            if config.REISSUE_UNFINISHED_MATCHES:
+                matches.extend(ACCoordinator._unfinished_matches(arenaclient)[:count])
+                Matches.renew_leases(arenaclient, [match.id for match in matches])
+            while len(matches) < count:
+                try:
+                    match = ACCoordinator.next_new_match(arenaclient)
+                except APIException:
+                    if len(matches) == 0:
+                        raise
+                    break  # hand over what we have so far
+                if match is None:
+                    break
+                matches.append(match)
+        except Exception:
+            logger.exception("Exception while processing request for matches.")
+            if len(matches) == 0:
+                raise
+            # the matches we have were already started, so hand them over rather than leaving them orphaned
+        return matches
+
     @staticmethod
     def _get_competition_priority_order():
         """
         Returns a list of competition ids in priority order with respect to the current number of active participants
-         in each competition verses each competition's share of the most recent 100 matches.
-         In otherwords, campetitions with higher active participant counts should play more matches overall.
+         in each competition verses each competition's share of the matches started so far.
+         In otherwords, competitions with higher active participant counts should play more matches overall.
         :return:
         """
-        with connection.cursor() as cursor:
-            # I don't know why but for some reason CTEs didn't work so here; have a massive query.
-            cursor.execute("""
-                select perc_active.competition_id
-                from (select competition_id, 
-                competition_participations.competition_participations_cnt / total_active_cnt as perc_active
-                      from (select cp.competition_id, count(cp.competition_id) competition_participations_cnt
-                            from core_competitionparticipation cp
-                                     join core_competition cc on cp.competition_id = cc.id
-                            where cp.active = 1
-                              and cc.status in ('open', 'closing', 'paused')
-                            group by cp.competition_id) as competition_participations
-                               join
-                           (select count(*) total_active_cnt
-                            from core_competitionparticipation cp
-                                     join core_competition cc on cp.competition_id = cc.id
-                            where cp.active = 1
-                              and cc.status in ('open', 'closing', 'paused')) as competition_participations_total) as perc_active
-                         left join
-                     (select competition_id, perc_recent_matches_cnt / recent_matches_total_cnt as perc_recent_matches
-                      from (select competition_id,
-                                   count(competition_id)       perc_recent_matches_cnt,
-                                   (select count(*)
-                                    from (select competition_id
-                                          from core_match cm
-                                                   join core_round cr on cm.round_id = cr.id
-                                                   join core_competition cc on cr.competition_id = cc.id
-                                          where cm.started is not null
-                                            and cc.status in ('open', 'closing', 'paused')
-                                          order by cm.started desc
-                                          limit 100) matches2) recent_matches_total_cnt
-                            from (select competition_id
-                                  from core_match cm
-                                           join core_round cr on cm.round_id = cr.id
-                                           join core_competition cc on cr.competition_id = cc.id
-                                  where cm.started is not null
-                                    and cc.status in ('open', 'closing', 'paused')
-                                  order by cm.started desc
-                                  limit 100) matches
-                            group by competition_id) as recent_matches) as perc_recent_matches
-                     on perc_recent_matches.competition_id = perc_active.competition_id
-                order by COALESCE(perc_recent_matches, 0) - perc_active
-            """)
-            return [row[0] for row in cursor.fetchall()]  # return competition ids
+        return Competitions.get_priority_order()
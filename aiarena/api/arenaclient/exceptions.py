@@ -59,3 +59,9 @@ class NoGameForClient(APIException):
     status_code = 200
     default_detail = 'No game available for client.'
     default_code = 'no_game_available'
+
+
+class MatchLeaseExpired(APIException):
+    status_code = 409
+    default_detail = 'This arena client no longer holds the lease on that match.'
+    default_code = 'match_lease_expired'
@@ -1,3 +1,4 @@
+import os
 from typing import List
 
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -29,6 +30,16 @@ class AcApiTestingClient(APIClient):
         assert response.status_code == 201, f"{response.status_code} {response.data}"
         return Match.objects.get(id=response.data['id'])
 
+    def post_to_matches_batch(self, count: int):
+        url = reverse('ac_next_match-batch')
+        return self.post(url, data={'count': count})
+
+    def next_matches(self, count: int) -> List[Match]:
+        response = self.post_to_matches_batch(count)
+
+        assert response.status_code == 201, f"{response.status_code} {response.data}"
+        return [Match.objects.get(id=match['id']) for match in response.data]
+
     def submit_custom_result(self, match_id, result_type, replay_file, bot1_data, bot2_data, bot1_log, bot2_log,
                              arenaclient_log, bot1_tags=None, bot2_tags=None):
         data = {
@@ -48,10 +59,43 @@ class AcApiTestingClient(APIClient):
         if bot2_tags: data['bot2_tags'] = bot2_tags
         return self.publish_result(data)
 
-    def publish_result(self, data):
+    def publish_result(self, data, idempotency_key: str = None):
         url = reverse('ac_submit_result-list')
+        if idempotency_key is not None:
+            return self.post(url, data=data, HTTP_IDEMPOTENCY_KEY=idempotency_key)
         return self.post(url, data=data)
 
+    def publish_results(self, results: List[dict]):
+        url = reverse('ac_submit_result-batch')
+        return self.post(url, data={f'{index}-{field}': value
+                                    for index, data in enumerate(results) for field, value in data.items()})
+
+    def start_upload(self, filename: str):
+        return self.post(reverse('ac_upload-list'), data={'filename': filename})
+
+    def upload_chunk(self, upload_id: int, offset: int, chunk: bytes):
+        return self.post(reverse('ac_upload-chunk', kwargs={'pk': upload_id}), data=chunk,
+                         content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def finish_upload(self, upload_id: int, md5hash: str = None):
+        return self.post(reverse('ac_upload-finish', kwargs={'pk': upload_id}),
+                         data={} if md5hash is None else {'md5hash': md5hash})
+
+    def upload_file(self, path: str, chunk_size: int) -> int:
+        """Uploads the file in chunks of chunk_size bytes, returning the id of the finished upload."""
+        response = self.start_upload(os.path.basename(path))
+        assert response.status_code == 201, f"{response.status_code} {response.data}"
+        upload_id = response.data['id']
+        with open(path, 'rb') as file:
+            offset = 0
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                response = self.upload_chunk(upload_id, offset, chunk)
+                assert response.status_code == 200, f"{response.status_code} {response.data}"
+                offset = response.data['size']
+        response = self.finish_upload(upload_id)
+        assert response.status_code == 200, f"{response.status_code} {response.data}"
+        return upload_id
+
     def submit_result(self, match_id: int, type: str) -> Result:
         with open(TestAssetPaths.test_replay_path, 'rb') as replay_file, \
                 open(TestAssetPaths.test_arenaclient_log_path, 'rb') as arenaclient_log, \
@@ -1,17 +1,26 @@
 import io
 import json
 import os
+import threading
+import time
+from datetime import timedelta
 
 import jsonschema
 from constance import config
+from django.core.management import call_command
+from django.db import transaction
 from django.db.models import Sum
-from django.test import TransactionTestCase
+from django.test import TransactionTestCase, skipUnlessDBFeature, override_settings
+from django.urls import reverse
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
 
-from aiarena.core.api import Matches
+from aiarena.core.api import Bots, Matches, Competitions, Jobs
+from aiarena.core.d_utils import get_match_availability_version, notify_match_availability_changed, \
+    wait_for_match_availability_change
 from aiarena.core.models import Match, Bot, MatchParticipation, User, Round, Result, CompetitionParticipation, \
     Competition, Map, \
-    ArenaClient
+    ArenaClient, BotDataLock, ChunkedUpload
 from aiarena.core.models.bot_race import BotRace
 from aiarena.core.models.game_mode import GameMode
 from aiarena.core.tests.testing_utils import TestAssetPaths
@@ -243,6 +252,281 @@ class MatchesTestCase(LoggedInMixin, TransactionTestCase):
         response = self.test_ac_api_client.post_to_matches()
         self.assertEqual(response.status_code, 201)
 
+    def test_bot_data_locks(self):
+        self.test_client.login(self.staffUser1)
+        comp = self._create_game_mode_and_open_competition()
+        self._create_map_for_competition('test_map', comp.id)
+
+        bot1 = self._create_active_bot_for_competition(comp.id, self.regularUser1, 'testbot1', BotRace.terran())
+        bot2 = self._create_active_bot_for_competition(comp.id, self.regularUser1, 'testbot2', BotRace.zerg())
+        self.assertFalse(bot1.bot_data_is_currently_frozen())
+
+        # starting the match should lock both bots
+        response = self.test_ac_api_client.post_to_matches()
+        self.assertEqual(response.status_code, 201)
+        match_id = response.data['id']
+        self.assertEqual(BotDataLock.objects.filter(match_id=match_id).count(), 2)
+        self.assertTrue(bot1.bot_data_is_currently_frozen())
+        self.assertTrue(bot2.bot_data_is_currently_frozen())
+        self.assertEqual(Bots.get_available(Bot.objects.filter(id__in=[bot1.id, bot2.id])), [])
+
+        # the result should release them again
+        response = self._post_to_results(match_id, 'Player1Win')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(BotDataLock.objects.exists())
+        self.assertFalse(bot1.bot_data_is_currently_frozen())
+        self.assertEqual(len(Bots.get_available(Bot.objects.filter(id__in=[bot1.id, bot2.id]))), 2)
+
+        # cancelling also releases the locks
+        response = self.test_ac_api_client.post_to_matches()
+        self.assertEqual(response.status_code, 201)
+        Match.objects.get(id=response.data['id']).cancel(self.staffUser1)
+        self.assertFalse(BotDataLock.objects.exists())
+
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_claim_ladder_match_with_skip_locked(self):
+        config.REISSUE_UNFINISHED_MATCHES = False
+        config.CLAIM_MATCHES_WITH_SKIP_LOCKED = True
+
+        self.test_client.login(self.staffUser1)
+        comp = self._create_game_mode_and_open_competition()
+        self._create_map_for_competition('test_map', comp.id)
+
+        self._create_active_bot_for_competition(comp.id, self.regularUser1, 'testbot1', BotRace.terran())
+        self._create_active_bot_for_competition(comp.id, self.regularUser1, 'testbot2', BotRace.zerg())
+        self._create_active_bot_for_competition(comp.id, self.regularUser1, 'testbot3', BotRace.protoss())
+        self._create_active_bot_for_competition(comp.id, self.regularUser1, 'testbot4', BotRace.random())
+
+        # the first request generates the round, the second claims a queued match from it
+        match1 = self.test_ac_api_client.next_match()
+        match2 = self.test_ac_api_client.next_match()
+        match1_bots = set(match1.matchparticipation_set.values_list('bot_id', flat=True))
+        match2_bots = set(match2.matchparticipation_set.values_list('bot_id', flat=True))
+        self.assertFalse(match1_bots & match2_bots)
+
+        # every bot is now busy, so there is nothing left to claim
+        with transaction.atomic():
+            self.assertIsNone(Matches.claim_a_ladder_match(self.arenaclientUser1, comp))
+
+    def test_next_matches_batch(self):
+        self.test_client.login(self.staffUser1)
+        comp = self._create_game_mode_and_open_competition()
+        self._create_map_for_competition('test_map', comp.id)
+
+        # no bots yet
+        response = self.test_ac_api_client.post_to_matches_batch(3)
+        self.assertEqual(response.status_code, 200)
+
+        for i, race in enumerate([BotRace.terran(), BotRace.zerg(), BotRace.protoss(), BotRace.random()]):
+            self._create_active_bot_for_competition(comp.id, self.regularUser1, f'testbot{i + 1}', race)
+
+        # only 2 matches can be played at once with 4 bots, so we should get those 2 and nothing more
+        matches = self.test_ac_api_client.next_matches(3)
+        self.assertEqual(len(matches), 2)
+        bots = [set(m.matchparticipation_set.values_list('bot_id', flat=True)) for m in matches]
+        self.assertFalse(bots[0] & bots[1])
+        self.assertEqual(BotDataLock.objects.count(), 4)
+
+        # the unfinished matches should be reissued
+        reissued = self.test_ac_api_client.next_matches(3)
+        self.assertEqual({m.id for m in reissued}, {m.id for m in matches})
+
+        response = self.test_ac_api_client.post_to_matches_batch(0)
+        self.assertEqual(response.status_code, 400)
+
+    def test_next_matches_batch_shares_competitions(self):
+        self.test_client.login(self.staffUser1)
+        comp1 = self._create_game_mode_and_open_competition()
+        comp2 = self._create_open_competition(comp1.game_mode_id, 'Competition 2')
+        for comp in [comp1, comp2]:
+            self._create_map_for_competition(f'test_map{comp.id}', comp.id)
+            for i, race in enumerate([BotRace.terran(), BotRace.zerg(), BotRace.protoss(), BotRace.random()]):
+                self._create_active_bot_for_competition(comp.id, self.regularUser1, f'testbot{comp.id}_{i + 1}', race)
+
+        # both competitions could fill the batch on their own, but they have the same share of matches,
+        # so each should get one of them
+        matches = self.test_ac_api_client.next_matches(2)
+        self.assertEqual(sorted(match.round.competition_id for match in matches), [comp1.id, comp2.id])
+
+    def test_match_leases(self):
+        config.REISSUE_UNFINISHED_MATCHES = False
+        config.MATCH_LEASE_DURATION = timedelta(minutes=15)
+        self.arenaclientUser2 = ArenaClient.objects.create(username='arenaclient2', email='arenaclient2@dev.aiarena.net',
+                                                           type='ARENA_CLIENT', trusted=True, owner=self.staffUser1)
+
+        self.test_client.login(self.staffUser1)
+        comp = self._create_game_mode_and_open_competition()
+        self._create_map_for_competition('test_map', comp.id)
+        self._create_active_bot_for_competition(comp.id, self.regularUser1, 'testbot1', BotRace.terran())
+        self._create_active_bot_for_competition(comp.id, self.regularUser1, 'testbot2', BotRace.zerg())
+
+        match = self.test_ac_api_client.next_match()
+        self.assertIsNotNone(match.lease_expires)
+        self.assertEqual(match.first_started, match.started)
+
+        # a heartbeat renews the lease
+        Match.objects.filter(id=match.id).update(lease_expires=timezone.now())
+        response = self.test_ac_api_client.post(reverse('api_ac_heartbeat-list'), data={'matches': [match.id]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['matches'], [match.id])
+        self.assertGreater(Match.objects.get(id=match.id).lease_expires, timezone.now())
+
+        # once the lease expires, the match goes back to the queue and can be picked up by another arena client
+        Match.objects.filter(id=match.id).update(lease_expires=timezone.now() - timedelta(seconds=1))
+        ac1_token = Token.objects.get(user=self.arenaclientUser1).key
+        self.test_ac_api_client.set_api_token(Token.objects.create(user=self.arenaclientUser2).key)
+        self.assertEqual(self.test_ac_api_client.next_match().id, match.id)
+        self.assertEqual(Match.objects.get(id=match.id).assigned_to_id, self.arenaclientUser2.id)
+
+        # the original arena client has lost the match
+        self.test_ac_api_client.set_api_token(ac1_token)
+        response = self.test_ac_api_client.post(reverse('api_ac_heartbeat-list'))
+        self.assertEqual(response.data['matches'], [])
+        response = self._post_to_results(match.id, 'Player1Win')
+        self.assertEqual(response.status_code, 409)
+
+        # a match which was put back into the queue but not picked up again still accepts its arena client's result
+        Match.objects.filter(id=match.id).update(lease_expires=timezone.now() - timedelta(seconds=1))
+        Matches.requeue_expired_leases()
+        scheduling_pass = Competition.objects.get(id=comp.id).scheduling_pass
+        self.test_ac_api_client.set_api_token(Token.objects.get(user=self.arenaclientUser2).key)
+        response = self._post_to_results(match.id, 'Player1Win')
+        self.assertEqual(response.status_code, 201)
+        # taking it back doesn't count as another match started in the competition
+        self.assertEqual(Competition.objects.get(id=comp.id).scheduling_pass, scheduling_pass)
+
+    def test_create_matches_on_demand(self):
+        config.REISSUE_UNFINISHED_MATCHES = False
+        config.ON_DEMAND_MATCH_QUEUE_SIZE = 1
+
+        self.test_client.login(self.staffUser1)
+        comp = self._create_game_mode_and_open_competition()
+        comp.refresh_from_db()  # it has been opened since
+        comp.create_matches_on_demand = True
+        comp.save()
+        self._create_map_for_competition('test_map', comp.id)
+        for i, race in enumerate([BotRace.terran(), BotRace.zerg(), BotRace.protoss(), BotRace.random()]):
+            self._create_active_bot_for_competition(comp.id, self.regularUser1, f'testbot{i + 1}', race)
+
+        # the round only stores its pairings, and matches are created as they're requested
+        match_ids = [self.test_ac_api_client.next_match().id]
+        round1 = Round.objects.get()
+        self.assertEqual(Match.objects.count(), 1)
+        self.assertEqual(round1.pending_pairing_count, 5)
+
+        match_ids.append(self.test_ac_api_client.next_match().id)
+        self.assertEqual(Match.objects.count(), 2)
+
+        # play out the rest of the round
+        for match_id in match_ids:
+            self.assertEqual(self._post_to_results(match_id, 'Player1Win').status_code, 201)
+        for _ in range(4):
+            self.assertEqual(self._post_to_results(self.test_ac_api_client.next_match().id, 'Player1Win').status_code,
+                             201)
+
+        round1.refresh_from_db()
+        self.assertIsNone(round1.pending_pairings)
+        self.assertTrue(round1.complete)
+        self.assertEqual(Match.objects.count(), 6)
+
+    def test_create_matches_on_demand_tops_up_round_with_matches(self):
+        config.REISSUE_UNFINISHED_MATCHES = False
+        config.ON_DEMAND_MATCH_QUEUE_SIZE = 1
+
+        self.test_client.login(self.staffUser1)
+        comp = self._create_game_mode_and_open_competition()
+        comp.refresh_from_db()  # it has been opened since
+        comp.create_matches_on_demand = True
+        comp.save()
+        self._create_map_for_competition('test_map', comp.id)
+        for i, race in enumerate([BotRace.terran(), BotRace.zerg(), BotRace.protoss(), BotRace.random()]):
+            self._create_active_bot_for_competition(comp.id, self.regularUser1, f'testbot{i + 1}', race)
+
+        first_match = self.test_ac_api_client.next_match()
+        round1 = Round.objects.get()
+        pending_pairings = {tuple(pairing) for pairing in round1.pending_pairings}
+
+        # top up the round, which already has a match
+        second_match = self.test_ac_api_client.next_match()
+        self.assertEqual(Match.objects.filter(round=round1).count(), 2)
+
+        # every match has its own pair of participants, and the new ones come from the pending pairings
+        first_bots = set(MatchParticipation.objects.filter(match=first_match.id).values_list('bot_id', flat=True))
+        self.assertEqual(len(first_bots), 2)
+        round1.refresh_from_db()
+        remaining_pairings = {tuple(pairing) for pairing in round1.pending_pairings}
+        for match in Match.objects.filter(round=round1).exclude(id=first_match.id):
+            participants = tuple(MatchParticipation.objects.filter(match=match).order_by('participant_number')
+                                 .values_list('bot_id', flat=True))
+            self.assertIn(participants, pending_pairings - remaining_pairings)
+        self.assertTrue(first_bots.isdisjoint(
+            MatchParticipation.objects.filter(match=second_match.id).values_list('bot_id', flat=True)))
+
+    def test_competition_fair_share(self):
+        config.MAX_USER_BOT_PARTICIPATIONS_ACTIVE_FREE_TIER = 10
+        config.MAX_USER_BOT_COUNT = 10
+
+        self.test_client.login(self.staffUser1)
+        comp1 = self._create_game_mode_and_open_competition()
+        comp2 = self._create_open_competition(comp1.game_mode_id, 'Competition 2')
+        for i in range(2):
+            self._create_active_bot_for_competition(comp1.id, self.regularUser1, f'comp1bot{i}')
+        for i in range(4):
+            self._create_active_bot_for_competition(comp2.id, self.regularUser1, f'comp2bot{i}')
+        comp1.refresh_from_db()
+        comp2.refresh_from_db()
+        self.assertEqual(comp1.active_participant_count, 2)
+        self.assertEqual(comp2.active_participant_count, 4)
+
+        # competitions should be picked in proportion to their active participants
+        picks = {comp1.id: 0, comp2.id: 0}
+        for _ in range(6):
+            competition_id = Competitions.get_priority_order()[0]
+            picks[competition_id] += 1
+            Competitions.record_match_started(competition_id)
+        self.assertEqual(picks, {comp1.id: 2, comp2.id: 4})
+
+        # saving a stale instance shouldn't clobber the counters
+        comp1.save()
+        self.assertGreater(Competition.objects.get(id=comp1.id).scheduling_pass, 0)
+
+        cp = CompetitionParticipation.objects.filter(competition=comp2).first()
+        cp.active = False
+        cp.save()
+        self.assertEqual(Competition.objects.get(id=comp2.id).active_participant_count, 3)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_long_poll_next_match(self):
+        config.MATCH_REQUEST_LONG_POLL_TIMEOUT = 1
+
+        # nothing to play, so the request should wait out its timeout
+        started = time.monotonic()
+        response = self.test_ac_api_client.post(reverse('ac_next_match-list'), data={'wait': 0.5})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - started, 0.5)
+
+        # waiting clients should be woken when something changes
+        version = get_match_availability_version()
+        threading.Timer(0.1, notify_match_availability_changed).start()
+        self.assertTrue(wait_for_match_availability_change(version, 5))
+
+        # a match that's available straight away is returned without waiting
+        self.test_client.login(self.staffUser1)
+        comp = self._create_game_mode_and_open_competition()
+        self._create_map_for_competition('test_map', comp.id)
+        self._create_active_bot_for_competition(comp.id, self.regularUser1, 'testbot1', BotRace.terran())
+        self._create_active_bot_for_competition(comp.id, self.regularUser1, 'testbot2', BotRace.zerg())
+        response = self.test_ac_api_client.post(reverse('ac_next_match-list'), data={'wait': 30})
+        self.assertEqual(response.status_code, 201)
+
+    def test_long_poll_next_match_without_cache(self):
+        config.MATCH_REQUEST_LONG_POLL_TIMEOUT = 30
+
+        # the dummy cache can't wake waiting clients, so the request shouldn't wait at all
+        started = time.monotonic()
+        response = self.test_ac_api_client.post(reverse('ac_next_match-list'), data={'wait': 30})
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(time.monotonic() - started, 30)
 
 
 class ResultsTestCase(LoggedInMixin, TransactionTestCase):
@@ -375,6 +659,143 @@ class ResultsTestCase(LoggedInMixin, TransactionTestCase):
         self.assertEqual(u'Unable to log result: Bot bot1 is not currently in this match!',
                          response.data['detail'])
 
+    def test_resubmit_result_with_idempotency_key(self):
+        self.test_client.login(self.staffUser1)
+
+        comp = self._create_game_mode_and_open_competition()
+        self._create_map_for_competition('test_map', comp.id)
+        bot1 = self._create_active_bot_for_competition(comp.id, self.regularUser1, 'bot1')
+        self._create_active_bot_for_competition(comp.id, self.regularUser1, 'bot2', BotRace.zerg())
+
+        match = self.test_ac_api_client.next_match()
+        with open(TestAssetPaths.test_replay_path, 'rb') as replay_file:
+            response = self.test_ac_api_client.publish_result({'match': match.id, 'type': 'Player1Win',
+                                                               'replay_file': replay_file, 'game_steps': 500},
+                                                              idempotency_key='submission-1')
+        self.assertEqual(response.status_code, 201, f"{response.status_code} {response.data}")
+        result_id = response.data['result_id']
+        self.assertEqual(Result.objects.get(id=result_id).idempotency_key, 'submission-1')
+        elo = CompetitionParticipation.objects.get(bot=bot1).elo
+
+        # A retry is answered with the original result before its body is looked at, so it isn't processed again.
+        response = self.test_ac_api_client.publish_result({'match': match.id, 'type': 'Player2Win'},
+                                                          idempotency_key='submission-1')
+        self.assertEqual(response.status_code, 201, f"{response.status_code} {response.data}")
+        self.assertEqual(response.data['result_id'], result_id)
+        self.assertEqual(Result.objects.count(), 1)
+        self.assertEqual(CompetitionParticipation.objects.get(bot=bot1).elo, elo)
+
+        # without the key it's a new submission, which is refused since the match already has a result
+        response = self.test_ac_api_client.publish_result({'match': match.id, 'type': 'Player2Win',
+                                                           'game_steps': 500})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.test_ac_api_client.publish_result({'match': match.id, 'type': 'Player2Win'},
+                                                          idempotency_key='x' * 65)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('idempotency_key', response.data)
+
+    def test_submit_results_batch(self):
+        self.test_client.login(self.staffUser1)
+
+        comp = self._create_game_mode_and_open_competition()
+        self._create_map_for_competition('test_map', comp.id)
+        for i, race in enumerate([BotRace.terran(), BotRace.zerg(), BotRace.protoss(), BotRace.random()]):
+            self._create_active_bot_for_competition(comp.id, self.regularUser1, f'testbot{i + 1}', race)
+
+        first, second = sorted(self.test_ac_api_client.next_matches(2), key=lambda match: match.started)
+        with open(TestAssetPaths.test_replay_path, 'rb') as replay1, open(TestAssetPaths.test_replay_path, 'rb') as replay2:
+            results = [
+                {'match': second.id, 'type': 'Player2Win', 'replay_file': replay2, 'game_steps': 500,
+                 'bot1_tags': ['batched'], 'idempotency_key': 'second'},
+                {'match': first.id, 'type': 'Player1Win', 'replay_file': replay1, 'game_steps': 500,
+                 'idempotency_key': 'first'},
+                # this one is missing its type, which shouldn't stop the others
+                {'match': first.id, 'game_steps': 500},
+                # and neither should one whose match isn't a number
+                {'match': '\u00b2', 'type': 'Player1Win', 'game_steps': 500},
+            ]
+            response = self.test_ac_api_client.publish_results(results)
+        self.assertEqual(response.status_code, 200, f"{response.status_code} {response.data}")
+        self.assertEqual([outcome['status'] for outcome in response.data], [201, 201, 400, 400])
+        self.assertIn('type', response.data[2]['errors'])
+        self.assertIn('match', response.data[3]['errors'])
+
+        second_result = Result.objects.get(match=second)
+        first_result = Result.objects.get(match=first)
+        self.assertEqual(response.data[0]['result_id'], second_result.id)
+        self.assertEqual(response.data[1]['result_id'], first_result.id)
+        # recorded in the order the matches started, rather than the order they were sent
+        self.assertLess(first_result.id, second_result.id)
+        self.assertEqual(second_result.type, 'Player2Win')
+        self.assertTrue(second.tags.filter(tag__name='batched').exists())
+
+        # a retried batch gets the same results back
+        response = self.test_ac_api_client.publish_results([{'idempotency_key': 'first'}, {'idempotency_key': 'second'}])
+        self.assertEqual(response.status_code, 200, f"{response.status_code} {response.data}")
+        self.assertEqual([outcome.get('result_id') for outcome in response.data],
+                         [first_result.id, second_result.id])
+        self.assertEqual(Result.objects.count(), 2)
+
+        response = self.test_ac_api_client.publish_results([])
+        self.assertEqual(response.status_code, 400)
+
+    def test_submit_result_with_chunked_uploads(self):
+        self.test_client.login(self.staffUser1)
+
+        comp = self._create_game_mode_and_open_competition()
+        self._create_map_for_competition('test_map', comp.id)
+        bot1 = self._create_active_bot_for_competition(comp.id, self.regularUser1, 'bot1')
+        self._create_active_bot_for_competition(comp.id, self.regularUser1, 'bot2', BotRace.zerg())
+        match = self.test_ac_api_client.next_match()
+
+        # a chunk which doesn't follow on from the last is refused, along with where to resume from
+        response = self.test_ac_api_client.start_upload('replay.SC2Replay')
+        self.assertEqual(response.status_code, 201, f"{response.status_code} {response.data}")
+        upload_id = response.data['id']
+        with open(TestAssetPaths.test_replay_path, 'rb') as replay_file:
+            replay = replay_file.read()
+        self.assertEqual(self.test_ac_api_client.upload_chunk(upload_id, 0, replay[:10]).status_code, 200)
+        response = self.test_ac_api_client.upload_chunk(upload_id, 0, replay[:10])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['size'], 10)
+        self.assertEqual(self.test_ac_api_client.upload_chunk(upload_id, 10, replay[10:]).status_code, 200)
+        self.assertEqual(self.test_ac_api_client.finish_upload(upload_id, md5hash='0' * 32).status_code, 400)
+        response = self.test_ac_api_client.finish_upload(upload_id, md5hash=calculate_md5(TestAssetPaths.test_replay_path))
+        self.assertEqual(response.status_code, 200, f"{response.status_code} {response.data}")
+        self.assertEqual(self.test_ac_api_client.upload_chunk(upload_id, len(replay), b'more').status_code, 400)
+
+        bot_data_upload_id = self.test_ac_api_client.upload_file(TestAssetPaths.test_bot_datas['bot1'][1]['path'], 100)
+
+        # a submission which fails leaves the uploads as they were, to be used by a retry
+        response = self.test_ac_api_client.publish_result({'match': match.id, 'type': 'NotAResultType', 'game_steps': 500,
+                                                           'replay_file_upload': upload_id,
+                                                           'bot1_data_upload': bot_data_upload_id})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ChunkedUpload.objects.filter(id__in=[upload_id, bot_data_upload_id]).count(), 2)
+        upload_dir = os.path.dirname(ChunkedUpload.objects.get(id=upload_id).file.path)
+        self.assertEqual(sorted(name for name in os.listdir(upload_dir) if not name.isdecimal()), [])
+
+        response = self.test_ac_api_client.publish_result({'match': match.id, 'type': 'Player1Win', 'game_steps': 500,
+                                                           'replay_file_upload': upload_id,
+                                                           'bot1_data_upload': bot_data_upload_id})
+        self.assertEqual(response.status_code, 201, f"{response.status_code} {response.data}")
+
+        result = Result.objects.get(id=response.data['result_id'])
+        self.assertEqual(calculate_md5(result.replay_file.path), calculate_md5(TestAssetPaths.test_replay_path))
+        bot1.refresh_from_db()
+        self.assertEqual(bot1.bot_data_md5hash, TestAssetPaths.test_bot_datas['bot1'][1]['hash'])
+        # the uploads are used up
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+        # uploads which are never used are cleaned up
+        upload = ChunkedUpload.objects.get(
+            id=self.test_ac_api_client.upload_file(TestAssetPaths.test_arenaclient_log_path, 1000))
+        ChunkedUpload.objects.update(created=timezone.now() - timedelta(days=3))
+        call_command('cleanupuploads', stdout=io.StringIO())
+        self.assertFalse(ChunkedUpload.objects.exists())
+        self.assertFalse(os.path.exists(upload.file.path))
+
     def test_get_results_not_authorized(self):
         response = self.client.get('/api/arenaclient/results/')
         self.assertEqual(response.status_code, 403)
@@ -407,6 +828,10 @@ class ResultsTestCase(LoggedInMixin, TransactionTestCase):
                 response = self._post_to_results(match['id'], 'Player2Crash')
             self.assertEqual(response.status_code, 201)
 
+        # the crash check runs in the background
+        while Jobs.run_next():
+            pass
+
         # The bot should be disabled
         for cp in bot1.competition_participations.all():
             self.assertFalse(cp.active)
@@ -438,6 +863,10 @@ class ResultsTestCase(LoggedInMixin, TransactionTestCase):
                 response = self._post_to_results(match['id'], 'Player2Crash')
             self.assertEqual(response.status_code, 201)
 
+        # the crash check runs in the background
+        while Jobs.run_next():
+            pass
+
         # The bot should be disabled
         for cp in bot1.competition_participations.all():
             self.assertFalse(cp.active)
@@ -578,6 +1007,8 @@ class EloTestCase(LoggedInMixin, TransactionTestCase):
         response = self._post_to_matches()
         self.assertEqual(response.status_code, 201)
         self._post_to_results(response.data['id'], 'Player1Win')
+        while Jobs.run_next():
+            pass
 
         # with open(log_file, "r") as f:
         #     self.assertFalse("did not match expected value of" in f.read())
@@ -608,6 +1039,13 @@ class RoundRobinGenerationTestCase(MatchReadyMixin, TransactionTestCase):
 
         # check match count
         self.assertEqual(Match.objects.count(), expectedMatchCountPerRound)
+        # every pair of bots should be matched up exactly once
+        pairings = set()
+        for match in Match.objects.prefetch_related('matchparticipation_set'):
+            bot_ids = frozenset(p.bot_id for p in match.matchparticipation_set.all())
+            self.assertEqual(len(bot_ids), 2)
+            pairings.add(bot_ids)
+        self.assertEqual(len(pairings), expectedMatchCountPerRound)
 
         # check round data
         self.assertEqual(Round.objects.count(), 1)
@@ -1116,3 +1554,33 @@ class ArenaClientCompatabilityTestCase(MatchReadyMixin, TransactionTestCase):
                   'If you intentionally changed it, update this test and the arenaclient.\n'
                             'ValidationError:\n' + str(error))
 
+
+
+class QueryBudgetTestCase(MatchReadyMixin, TransactionTestCase):
+    """
+    Catches changes which add database queries to the arena client's busiest endpoints.
+    If a change legitimately needs more queries, raise the budget in the same change.
+    """
+    NEXT_MATCH_QUERY_BUDGET = 75
+    RESULT_QUERY_BUDGET = 65
+
+    def test_next_match_queries(self):
+        # the first request also generates a round
+        response = self._post_to_matches()
+        self.assertEqual(response.status_code, 201)
+        response = self._post_to_results(response.data['id'], 'Player1Win')
+        self.assertEqual(response.status_code, 201)
+
+        with self.assertMaxQueries(self.NEXT_MATCH_QUERY_BUDGET):
+            response = self._post_to_matches()
+        self.assertEqual(response.status_code, 201)
+
+    def test_submit_result_queries(self):
+        # one of each kind of result, which queue different follow up jobs
+        for result_type in ('Player1Win', 'Player2Crash', 'Tie'):
+            response = self._post_to_matches()
+            self.assertEqual(response.status_code, 201)
+
+            with self.assertMaxQueries(self.RESULT_QUERY_BUDGET):
+                response = self._post_to_results(response.data['id'], result_type)
+            self.assertEqual(response.status_code, 201)
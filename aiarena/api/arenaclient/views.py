@@ -1,27 +1,30 @@
 import logging
+import re
+import shutil
+import tempfile
 from wsgiref.util import FileWrapper
 
 from constance import config
+from django.conf import settings
 from django.db import transaction
-from django.db.models import Sum, F, Prefetch
-from django.http import HttpResponse
+from django.db.models import Prefetch
+from django.http import HttpResponse, QueryDict
+from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, serializers, mixins, status
 from rest_framework.decorators import action
-from rest_framework.exceptions import APIException, PermissionDenied
+from rest_framework.exceptions import APIException, PermissionDenied, ValidationError
 from rest_framework.fields import FileField, FloatField
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 
-from aiarena import settings
 from aiarena.api.arenaclient.ac_coordinator import ACCoordinator
-from aiarena.api.arenaclient.exceptions import LadderDisabled, NoGameForClient
+from aiarena.api.arenaclient.exceptions import LadderDisabled, NoGameForClient, MatchLeaseExpired
 from aiarena.core.utils import parse_tags
-from aiarena.core.api import Bots, Matches
-from aiarena.core.events import EVENT_MANAGER
-from aiarena.core.events import MatchResultReceivedEvent
-from aiarena.core.models import Bot, Map, Match, MatchParticipation, Result, CompetitionParticipation, MatchTag, Tag
+from aiarena.core.api import Jobs, Matches, Tags
+from aiarena.core.models import Bot, ChunkedUpload, Map, Match, MatchParticipation, Result
 from aiarena.core.models.arena_client_status import ArenaClientStatus
 from aiarena.core.permissions import IsArenaClientOrAdminUser, IsArenaClient
+from aiarena.core.stats.stats_generator import StatsGenerator
 from aiarena.core.validators import validate_not_inf, validate_not_nan
 
 logger = logging.getLogger(__name__)
@@ -73,6 +76,14 @@ class MatchSerializer(serializers.ModelSerializer):
         fields = ('id', 'bot1', 'bot2', 'map')
 
 
+class NextMatchSerializer(serializers.Serializer):
+    wait = serializers.FloatField(min_value=0, required=False, default=0)
+
+
+class NextMatchesSerializer(serializers.Serializer):
+    count = serializers.IntegerField(min_value=1)
+
+
 class MatchViewSet(viewsets.GenericViewSet):
     """
     MatchViewSet implements a POST method with no field requirements, which will create a match and return the JSON.
@@ -90,8 +101,20 @@ class MatchViewSet(viewsets.GenericViewSet):
             .get(match_id=match.id, participant_number=2).bot
 
     def create(self, request, *args, **kwargs):
+        """
+        Hands the arena client its next match.
+        An optional `wait`, in seconds and capped at the MATCH_REQUEST_LONG_POLL_TIMEOUT setting, long polls:
+        the request is held open until a match becomes available instead of returning when there's none.
+        """
         if request.user.is_arenaclient:
-            match = ACCoordinator.next_match(request.user.arenaclient)
+            serializer = NextMatchSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            wait = min(serializer.validated_data['wait'], config.MATCH_REQUEST_LONG_POLL_TIMEOUT)
+
+            if wait > 0:
+                match = ACCoordinator.wait_for_next_match(request.user.arenaclient, wait)
+            else:
+                match = ACCoordinator.next_match(request.user.arenaclient)
             if match:
                 self.load_participants(match)
 
@@ -100,6 +123,28 @@ class MatchViewSet(viewsets.GenericViewSet):
 
         raise NoGameForClient()
 
+    @action(detail=False, methods=['POST'], name='Request several matches', url_path='batch',
+            serializer_class=NextMatchesSerializer)
+    def batch(self, request, *args, **kwargs):
+        """
+        Lets an arena client which runs several games at once lease up to `count` matches in a single request.
+        The count is capped at the MAX_MATCHES_PER_ARENACLIENT_REQUEST setting.
+        """
+        if request.user.is_arenaclient:
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            count = min(serializer.validated_data['count'], config.MAX_MATCHES_PER_ARENACLIENT_REQUEST)
+
+            matches = ACCoordinator.next_matches(request.user.arenaclient, count)
+            if len(matches) > 0:
+                data = []
+                for match in matches:
+                    self.load_participants(match)
+                    # serialized one at a time because BotSerializer relies on the root instance being the match
+                    data.append(MatchSerializer(match, context=self.get_serializer_context()).data)
+                return Response(data, status=status.HTTP_201_CREATED)
+
+        raise NoGameForClient()
 
     # todo: check match is in progress/bot is in this match
     @action(detail=True, methods=['GET'], name='Download a participant\'s zip file', url_path='(?P<p_num>\d+)/zip')
@@ -182,222 +227,332 @@ class ResultViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     # throttle_scope = 'arenaclient'
     swagger_schema = None  # exclude this from swagger generation
 
+    IDEMPOTENCY_KEY_MAX_LENGTH = Result._meta.get_field('idempotency_key').max_length
+    BATCH_ITEM_PREFIX = re.compile(r'^(\d+)-(.+)$')
+    UPLOADABLE_FIELDS = ('replay_file', 'arenaclient_log', 'bot1_data', 'bot2_data', 'bot1_log', 'bot2_log')
+
+    def _validate_idempotency_key(self, idempotency_key):
+        if idempotency_key is not None and len(idempotency_key) > self.IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise ValidationError({'idempotency_key': [f'Ensure this value has no more than '
+                                                       f'{self.IDEMPOTENCY_KEY_MAX_LENGTH} characters.']})
+        return idempotency_key or None
+
+    def _submitted_result_ids(self, request, idempotency_keys) -> dict:
+        """The ids of the results already recorded for these submissions, keyed by their idempotency key."""
+        if len(idempotency_keys) == 0:
+            return {}
+        submitted = dict(Result.objects.filter(submitted_by=request.user, idempotency_key__in=idempotency_keys)
+                         .values_list('idempotency_key', 'id'))
+        for idempotency_key, result_id in submitted.items():
+            logger.info(f"Result {result_id} was submitted again with idempotency key {idempotency_key}.")
+        return submitted
+
+    def _record_result(self, request, data, idempotency_key) -> int:
+        """Validates and records a single result submission, returning the id of the result."""
+        try:
+            return self._submit_result(request, data, idempotency_key)
+        except Exception:
+            if idempotency_key is not None:
+                # a concurrent retry of this submission might have been recorded first
+                result_id = self._submitted_result_ids(request, [idempotency_key]).get(idempotency_key)
+                if result_id is not None:
+                    return result_id
+            logger.exception("Exception while processing result submission")
+            raise
+
+    def _attach_uploads(self, request, data):
+        """
+        Swaps any finished chunked uploads referred to by `<field>_upload` for their files.
+        Returns the data to validate, the uploads it refers to and their opened files, which must be discarded
+        once the result has been saved.
+        """
+        references = {field: str(data.get(f'{field}_upload')) for field in self.UPLOADABLE_FIELDS
+                      if data.get(f'{field}_upload')}
+        if len(references) == 0:
+            return data, [], []
+
+        uploads = {str(upload.id): upload for upload in ChunkedUpload.objects.filter(
+            user=request.user, status=ChunkedUpload.COMPLETE,
+            id__in=[upload_id for upload_id in references.values() if upload_id.isdecimal()])}
+        if isinstance(data, QueryDict):
+            attached = QueryDict(mutable=True)
+            for key in data.keys():
+                attached.setlist(key, data.getlist(key))
+        else:
+            attached = dict(data)
+        for field, upload_id in references.items():
+            if upload_id not in uploads:
+                raise ValidationError({f'{field}_upload': ['There is no finished upload with this id.']})
+        attachments = []
+        for field, upload_id in references.items():
+            attached[field] = uploads[upload_id].open_for_attaching()
+            attachments.append(attached[field])
+        return attached, list(uploads.values()), attachments
+
+    def _submit_result(self, request, data, idempotency_key) -> int:
+        data, uploads, attachments = self._attach_uploads(request, data)
+        try:
+            return self._save_result(request, data, uploads, idempotency_key)
+        finally:
+            for attachment in attachments:
+                attachment.discard()
+
+    def _save_result(self, request, data, uploads, idempotency_key) -> int:
+        serializer = SubmitResultCombinedSerializer(data=data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+
+        match_id = serializer.validated_data['match']
+
+        if config.DEBUG_LOGGING_ENABLED:
+            logger.info(f"Result submission. "
+                        f"match: {serializer.validated_data.get('match')} "
+                        f"type: {serializer.validated_data.get('type')} "
+                        f"replay_file: {serializer.validated_data.get('replay_file')} "
+                        f"game_steps: {serializer.validated_data.get('game_steps')} "
+                        f"submitted_by: {serializer.validated_data.get('submitted_by')} "
+                        f"arenaclient_log: {serializer.validated_data.get('arenaclient_log')} "
+                        f"bot1_avg_step_time: {serializer.validated_data.get('bot1_avg_step_time')} "
+                        f"bot1_log: {serializer.validated_data.get('bot1_log')} "
+                        f"bot1_data: {serializer.validated_data.get('bot1_data')} "
+                        f"bot1_tags: {serializer.validated_data.get('bot1_tags')} "
+                        f"bot2_avg_step_time: {serializer.validated_data.get('bot2_avg_step_time')} "
+                        f"bot2_log: {serializer.validated_data.get('bot2_log')} "
+                        f"bot2_data: {serializer.validated_data.get('bot2_data')} "
+                        f"bot2_tags: {serializer.validated_data.get('bot2_tags')} "
+                        )
+
+        with transaction.atomic():
+            # everything below works from this match and its participants, rather than looking them up again
+            match = Match.objects.select_related('map', 'round__competition').prefetch_related(
+                Prefetch('matchparticipation_set',
+                         MatchParticipation.objects.all().select_related('bot', 'bot__user'))
+            ).get(id=match_id)
+            p1_instance, p2_instance = sorted(match.matchparticipation_set.all(),
+                                              key=lambda participation: participation.participant_number)
+
+            # the match might have been put back into the queue and handed to someone else
+            if request.user.is_arenaclient and Matches.lease_lost(match, request.user.arenaclient):
+                raise MatchLeaseExpired()
+            if request.user.is_arenaclient and match.started is None and match.first_started is not None:
+                # it was put back into the queue, but nobody has picked it up yet - take it back if its bots are free.
+                # Its start was counted towards the competition's share of matches when it was first started.
+                if not Matches.start_match(match, request.user.arenaclient, record_start=False):
+                    raise MatchLeaseExpired()
+
+            # validate result
+            result = SubmitResultResultSerializer(data={'match': match_id,
+                                                        'type': serializer.validated_data['type'],
+                                                        'replay_file': serializer.validated_data.get('replay_file'),
+                                                        'game_steps': serializer.validated_data['game_steps'],
+                                                        'submitted_by': serializer.validated_data['submitted_by'].pk,
+                                                        'arenaclient_log': serializer.validated_data.get(
+                                                        'arenaclient_log')})
+            result.is_valid(raise_exception=True)
+
+            # validate participants
+            result_cause = p1_instance.calculate_result_cause(serializer.validated_data['type'])
+            participant1 = SubmitResultParticipationSerializer(instance=p1_instance, data={
+                'avg_step_time': serializer.validated_data.get('bot1_avg_step_time'),
+                'match_log': serializer.validated_data.get('bot1_log'),
+                'result': p1_instance.calculate_relative_result(serializer.validated_data['type']),
+                'result_cause': result_cause},
+                                                               partial=True)
+            participant1.is_valid(raise_exception=True)
+
+            participant2 = SubmitResultParticipationSerializer(instance=p2_instance, data={
+                'avg_step_time': serializer.validated_data.get('bot2_avg_step_time'),
+                'match_log': serializer.validated_data.get('bot2_log'),
+                'result': p2_instance.calculate_relative_result(serializer.validated_data['type']),
+                'result_cause': result_cause},
+                                                               partial=True)
+            participant2.is_valid(raise_exception=True)
+
+            # validate bots
+            # Both bots are in the match while it's in progress.
+            # The result serializer has already rejected a match which has a result.
+            if match.started is None:
+                logger.warning(f"A result was submitted for match {match_id}, "
+                               f"which Bot {p1_instance.bot.name} isn't currently in!")
+                raise APIException('Unable to log result: Bot {0} is not currently in this match!'
+                                   .format(p1_instance.bot.name))
+
+            bot1 = None
+            bot2 = None
+
+            match_is_requested = match.is_requested
+            # should we update the bot data?
+            if p1_instance.use_bot_data and p1_instance.update_bot_data and not match_is_requested:
+                bot1_data = serializer.validated_data.get('bot1_data')
+                # if we set the bot data key to anything, it will overwrite the existing bot data
+                # so only include bot1_data if it isn't none
+                # Also don't update bot data if it's a requested match.
+                if bot1_data is not None and not match_is_requested:
+                    bot1_dict = {'bot_data': bot1_data}
+                    bot1 = SubmitResultBotSerializer(instance=p1_instance.bot,
+                                                     data=bot1_dict, partial=True)
+                    bot1.is_valid(raise_exception=True)
+
+            if p2_instance.use_bot_data and p2_instance.update_bot_data and not match_is_requested:
+                bot2_data = serializer.validated_data.get('bot2_data')
+                # if we set the bot data key to anything, it will overwrite the existing bot data
+                # so only include bot2_data if it isn't none
+                # Also don't update bot data if it's a requested match.
+                if bot2_data is not None and not match_is_requested:
+                    bot2_dict = {'bot_data': bot2_data}
+                    bot2 = SubmitResultBotSerializer(instance=p2_instance.bot,
+                                                     data=bot2_dict, partial=True)
+                    bot2.is_valid(raise_exception=True)
+
+            # save models
+            result = result.save(match=match, idempotency_key=idempotency_key)
+            participant1 = participant1.save()
+            participant2 = participant2.save()
+            # save these after the others so if there's a validation error,
+            # then the bot data files don't need reverting to match their hashes.
+            # This could probably be done more fool-proof by actually rolling back the files on a transaction fail.
+            if bot1 is not None:
+                bot1.save()
+            if bot2 is not None:
+                bot2.save()
+
+            # Save Tags
+            bot1_user = participant1.bot.user
+            bot2_user = participant2.bot.user
+            bot1_tags = parse_tags(serializer.validated_data.get('bot1_tags'))
+            bot2_tags = parse_tags(serializer.validated_data.get('bot2_tags'))
+            # Union tags if both bots belong to the same user
+            if bot1_user==bot2_user:
+                total_tags = list(set(bot1_tags if bot1_tags else []) | set(bot2_tags if bot2_tags else []))
+                if total_tags:
+                    Tags.set_match_tags(match, bot1_user, total_tags)
+            else:
+                if bot1_tags:
+                    Tags.set_match_tags(match, bot1_user, bot1_tags)
+                if bot2_tags:
+                    Tags.set_match_tags(match, bot2_user, bot2_tags)
+
+            # Only do these actions if the match is part of a round
+            if result.match.round is not None:
+                result.match.round.update_if_completed()
+
+                # Update and record ELO figures
+                p1_initial_elo, p2_initial_elo = result.get_initial_elos
+                result.adjust_elo()
+
+                initial_elo_sum = p1_initial_elo + p2_initial_elo
+
+                # Calculate the change in ELO
+                sp1, sp2 = result.get_competition_participants
+                participant1.resultant_elo = sp1.elo
+                participant2.resultant_elo = sp2.elo
+                participant1.elo_change = participant1.resultant_elo - p1_initial_elo
+                participant2.elo_change = participant2.resultant_elo - p2_initial_elo
+                participant1.save()
+                participant2.save()
+
+                StatsGenerator.apply_result(result.match.round.competition_id, result.match.map_id,
+                                            [participant1, participant2], [sp1, sp2])
+
+                resultant_elo_sum = participant1.resultant_elo + participant2.resultant_elo
+                if initial_elo_sum != resultant_elo_sum:
+                    logger.critical(f"Initial and resultant ELO sum mismatch: "
+                                    f"Result {result.id}. "
+                                    f"initial_elo_sum: {initial_elo_sum}. "
+                                    f"resultant_elo_sum: {resultant_elo_sum}. "
+                                    f"participant1.elo_change: {participant1.elo_change}. "
+                                    f"participant2.elo_change: {participant2.elo_change}")
+
+            # The rest of the result processing doesn't need to hold up the arena client
+            Jobs.enqueue_result_processing(result)
+
+            if uploads:
+                # the uploads are only used up once the result is saved for good - until then a retry can reuse them
+                def delete_uploads():
+                    ChunkedUpload.objects.filter(id__in=[upload.id for upload in uploads]).delete()
+                    for upload in uploads:
+                        upload.file.delete(save=False)
+                transaction.on_commit(delete_uploads)
+        return result.id
+
     def create(self, request, *args, **kwargs):
         if config.LADDER_ENABLED:
-            try:
-                serializer = self.get_serializer(data=request.data)
-                serializer.is_valid(raise_exception=True)
-
-                match_id = serializer.validated_data['match']
-
-                if config.DEBUG_LOGGING_ENABLED:
-                    logger.info(f"Result submission. "
-                                 f"match: {serializer.validated_data.get('match')} "
-                                 f"type: {serializer.validated_data.get('type')} "
-                                 f"replay_file: {serializer.validated_data.get('replay_file')} "
-                                 f"game_steps: {serializer.validated_data.get('game_steps')} "
-                                 f"submitted_by: {serializer.validated_data.get('submitted_by')} "
-                                 f"arenaclient_log: {serializer.validated_data.get('arenaclient_log')} "
-                                 f"bot1_avg_step_time: {serializer.validated_data.get('bot1_avg_step_time')} "
-                                 f"bot1_log: {serializer.validated_data.get('bot1_log')} "
-                                 f"bot1_data: {serializer.validated_data.get('bot1_data')} "
-                                 f"bot1_tags: {serializer.validated_data.get('bot1_tags')} "
-                                 f"bot2_avg_step_time: {serializer.validated_data.get('bot2_avg_step_time')} "
-                                 f"bot2_log: {serializer.validated_data.get('bot2_log')} "
-                                 f"bot2_data: {serializer.validated_data.get('bot2_data')} "
-                                 f"bot2_tags: {serializer.validated_data.get('bot2_tags')} "
-                                 )
-
-                with transaction.atomic():
-                    match = Match.objects.prefetch_related(
-                        Prefetch('matchparticipation_set', MatchParticipation.objects.all().select_related('bot'))
-                    ).get(id=match_id)
-
-                    # validate result
-                    result = SubmitResultResultSerializer(data={'match': match_id,
-                                                                'type': serializer.validated_data['type'],
-                                                                'replay_file': serializer.validated_data.get('replay_file'),
-                                                                'game_steps': serializer.validated_data['game_steps'],
-                                                                'submitted_by': serializer.validated_data['submitted_by'].pk,
-                                                                'arenaclient_log': serializer.validated_data.get(
-                                                                'arenaclient_log')})
-                    result.is_valid(raise_exception=True)
-
-                    # validate participants
-                    p1_instance = match.matchparticipation_set.get(participant_number=1)
-                    result_cause = p1_instance.calculate_result_cause(serializer.validated_data['type'])
-                    participant1 = SubmitResultParticipationSerializer(instance=p1_instance, data={
-                        'avg_step_time': serializer.validated_data.get('bot1_avg_step_time'),
-                        'match_log': serializer.validated_data.get('bot1_log'),
-                        'result': p1_instance.calculate_relative_result(serializer.validated_data['type']),
-                        'result_cause': result_cause},
-                                                                       partial=True)
-                    participant1.is_valid(raise_exception=True)
-
-                    p2_instance = match.matchparticipation_set.get(participant_number=2)
-                    participant2 = SubmitResultParticipationSerializer(instance=p2_instance, data={
-                        'avg_step_time': serializer.validated_data.get('bot2_avg_step_time'),
-                        'match_log': serializer.validated_data.get('bot2_log'),
-                        'result': p2_instance.calculate_relative_result(serializer.validated_data['type']),
-                        'result_cause': result_cause},
-                                                                       partial=True)
-                    participant2.is_valid(raise_exception=True)
-
-                    # validate bots
-
-                    if not p1_instance.bot.is_in_match(match_id):
-                        logger.warning(f"A result was submitted for match {match_id}, "
-                                       f"which Bot {p1_instance.bot.name} isn't currently in!")
-                        raise APIException('Unable to log result: Bot {0} is not currently in this match!'
-                                           .format(p1_instance.bot.name))
-
-                    if not p2_instance.bot.is_in_match(match_id):
-                        logger.warning(f"A result was submitted for match {match_id}, "
-                                       f"which Bot {p2_instance.bot.name} isn't currently in!")
-                        raise APIException('Unable to log result: Bot {0} is not currently in this match!'
-                                           .format(p2_instance.bot.name))
-
-                    bot1 = None
-                    bot2 = None
-
-                    match_is_requested = match.is_requested
-                    # should we update the bot data?
-                    if p1_instance.use_bot_data and p1_instance.update_bot_data and not match_is_requested:
-                        bot1_data = serializer.validated_data.get('bot1_data')
-                        # if we set the bot data key to anything, it will overwrite the existing bot data
-                        # so only include bot1_data if it isn't none
-                        # Also don't update bot data if it's a requested match.
-                        if bot1_data is not None and not match_is_requested:
-                            bot1_dict = {'bot_data': bot1_data}
-                            bot1 = SubmitResultBotSerializer(instance=p1_instance.bot,
-                                                             data=bot1_dict, partial=True)
-                            bot1.is_valid(raise_exception=True)
-
-                    if p2_instance.use_bot_data and p2_instance.update_bot_data and not match_is_requested:
-                        bot2_data = serializer.validated_data.get('bot2_data')
-                        # if we set the bot data key to anything, it will overwrite the existing bot data
-                        # so only include bot2_data if it isn't none
-                        # Also don't update bot data if it's a requested match.
-                        if bot2_data is not None and not match_is_requested:
-                            bot2_dict = {'bot_data': bot2_data}
-                            bot2 = SubmitResultBotSerializer(instance=p2_instance.bot,
-                                                             data=bot2_dict, partial=True)
-                            bot2.is_valid(raise_exception=True)
-
-                    # save models
-                    result = result.save()
-                    participant1 = participant1.save()
-                    participant2 = participant2.save()
-                    # save these after the others so if there's a validation error,
-                    # then the bot data files don't need reverting to match their hashes.
-                    # This could probably be done more fool-proof by actually rolling back the files on a transaction fail.
-                    if bot1 is not None:
-                        bot1.save()
-                    if bot2 is not None:
-                        bot2.save()
-
-                    # Save Tags
-                    bot1_user = participant1.bot.user
-                    bot2_user = participant2.bot.user
-                    bot1_tags = parse_tags(serializer.validated_data.get('bot1_tags'))
-                    bot2_tags = parse_tags(serializer.validated_data.get('bot2_tags'))
-                    # Union tags if both bots belong to the same user
-                    if bot1_user==bot2_user:
-                        total_tags = list(set(bot1_tags if bot1_tags else []) | set(bot2_tags if bot2_tags else [])) 
-
-                        if total_tags:
-                            total_match_tags = []
-                            for tag in total_tags:
-                                tag_obj = Tag.objects.get_or_create(name=tag)
-                                total_match_tags.append(MatchTag.objects.get_or_create(tag=tag_obj[0], user=bot1_user)[0])
-                            # remove tags for this match that belong to this user and were not sent in the form
-                            match.tags.remove(*match.tags.filter(user=bot1_user).exclude(id__in=[mt.id for mt in total_match_tags]))
-                            # add everything, this shouldn't cause duplicates
-                            match.tags.add(*total_match_tags)
-                    else:
-                        if bot1_tags:
-                            p1_match_tags = []
-                            for tag in bot1_tags:
-                                tag_obj = Tag.objects.get_or_create(name=tag)
-                                p1_match_tags.append(MatchTag.objects.get_or_create(tag=tag_obj[0], user=bot1_user)[0])
-                            # remove tags for this match that belong to this user and were not sent in the form
-                            match.tags.remove(*match.tags.filter(user=bot1_user).exclude(id__in=[mt.id for mt in p1_match_tags]))
-                            # add everything, this shouldn't cause duplicates
-                            match.tags.add(*p1_match_tags)
-
-                        if bot2_tags:
-                            p2_match_tags = []
-                            for tag in bot2_tags:
-                                tag_obj = Tag.objects.get_or_create(name=tag)
-                                p2_match_tags.append(MatchTag.objects.get_or_create(tag=tag_obj[0], user=bot2_user)[0])
-                            # remove tags for this match that belong to this user and were not sent in the form
-                            match.tags.remove(*match.tags.filter(user=bot2_user).exclude(id__in=[mt.id for mt in p2_match_tags]))
-                            # add everything, this shouldn't cause duplicates
-                            match.tags.add(*p2_match_tags)
-
-                    # Only do these actions if the match is part of a round
-                    if result.match.round is not None:
-                        result.match.round.update_if_completed()
-
-                        # Update and record ELO figures
-                        p1_initial_elo, p2_initial_elo = result.get_initial_elos
-                        result.adjust_elo()
-
-                        initial_elo_sum = p1_initial_elo + p2_initial_elo
-
-                        # Calculate the change in ELO
-                        # the bot elos have changed so refresh them
-                        # todo: instead of having to refresh, return data from adjust_elo and apply it here
-                        sp1, sp2 = result.get_competition_participants
-                        participant1.resultant_elo = sp1.elo
-                        participant2.resultant_elo = sp2.elo
-                        participant1.elo_change = participant1.resultant_elo - p1_initial_elo
-                        participant2.elo_change = participant2.resultant_elo - p2_initial_elo
-                        participant1.save()
-                        participant2.save()
-
-                        resultant_elo_sum = participant1.resultant_elo + participant2.resultant_elo
-                        if initial_elo_sum != resultant_elo_sum:
-                            logger.critical(f"Initial and resultant ELO sum mismatch: "
-                                            f"Result {result.id}. "
-                                            f"initial_elo_sum: {initial_elo_sum}. "
-                                            f"resultant_elo_sum: {resultant_elo_sum}. "
-                                            f"participant1.elo_change: {participant1.elo_change}. "
-                                            f"participant2.elo_change: {participant2.elo_change}")
-
-                        if config.ENABLE_ELO_SANITY_CHECK:
-                            if config.DEBUG_LOGGING_ENABLED:
-                                logger.info("ENABLE_ELO_SANITY_CHECK enabled. Performing check.")
-
-                            # test here to check ELO total and ensure no corruption
-                            match_competition = result.match.round.competition
-                            expected_elo_sum = settings.ELO_START_VALUE * CompetitionParticipation.objects.filter(competition=match_competition).count()
-                            actual_elo_sum = CompetitionParticipation.objects.filter(competition=match_competition).aggregate(
-                                Sum('elo'))
-
-                            if actual_elo_sum['elo__sum'] != expected_elo_sum:
-                                logger.critical(
-                                    "ELO sum of {0} did not match expected value of {1} upon submission of result {2}".format(
-                                        actual_elo_sum['elo__sum'], expected_elo_sum, result.id))
-                            elif config.DEBUG_LOGGING_ENABLED:
-                                logger.info("ENABLE_ELO_SANITY_CHECK passed!")
-
-                        elif config.DEBUG_LOGGING_ENABLED:
-                            logger.info("ENABLE_ELO_SANITY_CHECK disabled. Skipping check.")
-
-                        if result.is_crash_or_timeout:
-                            run_consecutive_crashes_check(result.get_causing_participant_of_crash_or_timeout_result)
-
-                EVENT_MANAGER.broadcast_event(MatchResultReceivedEvent(result))
-
-                headers = self.get_success_headers(serializer.data)
-                return Response({'result_id': result.id}, status=status.HTTP_201_CREATED, headers=headers)
-            except Exception as e:
-                logger.exception("Exception while processing result submission")
-                raise
+            # The key is sent as a header so a retry can be answered before the request body,
+            # with all its uploads, is read.
+            idempotency_key = self._validate_idempotency_key(request.headers.get('Idempotency-Key'))
+            result_id = None
+            if idempotency_key is not None:
+                result_id = self._submitted_result_ids(request, [idempotency_key]).get(idempotency_key)
+            if result_id is None:
+                result_id = self._record_result(request, request.data, idempotency_key)
+            return Response({'result_id': result_id}, status=status.HTTP_201_CREATED)
         else:
             raise LadderDisabled()
 
+    @action(detail=False, methods=['POST'], name='Submit several results', url_path='batch')
+    def batch(self, request, *args, **kwargs):
+        """
+        Lets an arena client submit several results in a single request, e.g. after being offline for a while.
+        Each result's fields are sent as they would be to a single submission, prefixed with the result's
+        index in the batch, e.g. `0-match`, `0-replay_file`, `1-match`. A result may also include an
+        `idempotency_key`, which is treated like the header on a single submission.
+        The results are recorded in the order their matches started, each in its own transaction, so one which
+        fails doesn't hold up the others. The response lists the outcome of each, in the order they were sent.
+        The number of results is capped at the MAX_RESULTS_PER_ARENACLIENT_REQUEST setting.
+        """
+        if not config.LADDER_ENABLED:
+            raise LadderDisabled()
+
+        items = {}
+        for key in request.data.keys():
+            prefixed = self.BATCH_ITEM_PREFIX.match(key)
+            if prefixed is not None:
+                items.setdefault(int(prefixed.group(1)), QueryDict(mutable=True)) \
+                    .setlist(prefixed.group(2), request.data.getlist(key))
+        if len(items) == 0:
+            raise ValidationError({'detail': ['No results were submitted.']})
+        if len(items) > config.MAX_RESULTS_PER_ARENACLIENT_REQUEST:
+            raise ValidationError({'detail': [f'No more than {config.MAX_RESULTS_PER_ARENACLIENT_REQUEST} '
+                                              f'results can be submitted at once.']})
+        indexes = sorted(items)
+
+        outcomes = {}
+        idempotency_keys = {}
+        for index in indexes:
+            try:
+                idempotency_keys[index] = self._validate_idempotency_key(items[index].pop('idempotency_key', [None])[-1])
+            except ValidationError as e:
+                outcomes[index] = {'status': e.status_code, 'errors': e.detail}
+        submitted = self._submitted_result_ids(request, [key for key in idempotency_keys.values() if key is not None])
+
+        match_ids = {}
+        for index in indexes:
+            try:
+                match_ids[index] = int(items[index].get('match'))
+            except (TypeError, ValueError):
+                pass  # the result serializer will refuse it
+        started = dict(Match.objects.filter(id__in=match_ids.values()).values_list('id', 'started'))
+
+        def start_order(index):
+            # anything which doesn't refer to a started match is left until last, and will most likely be refused
+            match_started = started.get(match_ids.get(index))
+            return match_started is None, match_started or 0, index
+
+        for index in sorted(idempotency_keys, key=start_order):
+            idempotency_key = idempotency_keys[index]
+            try:
+                result_id = submitted.get(idempotency_key) if idempotency_key is not None else None
+                if result_id is None:
+                    result_id = self._record_result(request, items[index], idempotency_key)
+                outcomes[index] = {'status': status.HTTP_201_CREATED, 'result_id': result_id}
+            except APIException as e:
+                outcomes[index] = {'status': e.status_code, 'errors': e.detail}
+            except Exception:
+                # already logged
+                outcomes[index] = {'status': status.HTTP_500_INTERNAL_SERVER_ERROR,
+                                   'errors': {'detail': 'A server error occurred.'}}
+
+        return Response([outcomes[index] for index in indexes], status=status.HTTP_200_OK)
+
     # todo: use a model form
     # todo: avoid results being logged against matches not owned by the submitter
 
@@ -419,35 +574,102 @@ class SetArenaClientStatusViewSet(mixins.CreateModelMixin, viewsets.GenericViewS
 
     def perform_create(self, serializer):
         serializer.save(arenaclient=self.request.user.arenaclient)
+        # a status update also shows the arena client is still alive
+        Matches.renew_leases(self.request.user.arenaclient)
+
 
+class HeartbeatSerializer(serializers.Serializer):
+    matches = serializers.ListField(child=serializers.IntegerField(), required=False)
 
-def run_consecutive_crashes_check(triggering_participant: MatchParticipation):
+
+class HeartbeatViewSet(viewsets.GenericViewSet):
     """
-    Checks to see whether the last X results for a participant are crashes and, if so, disables the bot
-    and sends an alert to the bot author
-    :param triggering_participant: The participant who triggered this check and whose bot we should run the check for.
-    :return:
+    HeartbeatViewSet implements a POST method an arena client calls periodically to renew its match leases.
+    Optionally limited to a list of match ids. Responds with the matches the arena client still holds,
+    so it can abandon any it has lost.
     """
+    serializer_class = HeartbeatSerializer
+    permission_classes = [IsArenaClient]
+    swagger_schema = None  # exclude this from swagger generation
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        leased_match_ids = Matches.renew_leases(request.user.arenaclient, serializer.validated_data.get('matches'))
+        return Response({'matches': leased_match_ids}, status=status.HTTP_200_OK)
 
-    if config.BOT_CONSECUTIVE_CRASH_LIMIT < 1:
-        return  # Check is disabled
 
-    if not triggering_participant.bot.competition_participations.filter(active=True).exists():
-        return  # No use running the check - bot is already inactive.
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChunkedUpload
+        fields = 'id', 'filename', 'size', 'md5hash', 'status'
+        read_only_fields = 'size', 'md5hash', 'status'
 
-    # Get recent match participation records for this bot
-    recent_participations = MatchParticipation.objects.filter(bot=triggering_participant.bot,
-                                                              match__result__isnull=False).order_by(
-        '-match__result__created')[:config.BOT_CONSECUTIVE_CRASH_LIMIT]
 
-    # if there's not enough participations yet, then exit without action
-    if recent_participations.count() < config.BOT_CONSECUTIVE_CRASH_LIMIT:
-        return
+class FinishChunkedUploadSerializer(serializers.Serializer):
+    md5hash = serializers.CharField(max_length=32, required=False)
 
-    # if any of the previous results weren't a crash, then exit without action
-    for recent_participation in recent_participations:
-        if not recent_participation.crashed:
-            return
 
-    # If we get to here, all the results were crashes, so take action
-    Bots.disable_and_send_crash_alert(triggering_participant.bot)
+class ChunkedUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    ChunkedUploadViewSet lets an arena client upload a large file over several requests, so that a dropped
+    connection only costs the chunk in flight. POST to start an upload, POST each chunk as the raw request body
+    to `chunk`, then POST to `finish`. A finished upload can then be referred to when submitting a result,
+    e.g. `replay_file_upload=<id>` in place of `replay_file`.
+    """
+    serializer_class = ChunkedUploadSerializer
+    permission_classes = [IsArenaClientOrAdminUser]
+    swagger_schema = None  # exclude this from swagger generation
+
+    def get_queryset(self):
+        return ChunkedUpload.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def _get_upload_for_update(self) -> ChunkedUpload:
+        upload = get_object_or_404(self.get_queryset().select_for_update(), pk=self.kwargs['pk'])
+        if upload.status != ChunkedUpload.IN_PROGRESS:
+            raise ValidationError({'status': ['This upload has already been finished.']})
+        return upload
+
+    @action(detail=True, methods=['POST'], name='Append a chunk', url_path='chunk')
+    def chunk(self, request, *args, **kwargs):
+        """
+        Appends the request body to the upload. The Upload-Offset header must give the upload's current size,
+        so a chunk can't be appended twice or out of order. If it doesn't, the response is a 409 with the upload's
+        details, whose size is where to resume from.
+        """
+        # Spool the body before taking the lock, so the upload isn't locked for as long as the client takes to send it.
+        # It's read straight from the request, rather than have the body parsed and buffered first.
+        with tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE) as chunk:
+            if request.stream is not None:
+                shutil.copyfileobj(request.stream, chunk)
+            chunk.seek(0)
+
+            with transaction.atomic():
+                upload = self._get_upload_for_update()
+                if request.headers.get('Upload-Offset') != str(upload.size):
+                    return Response(self.get_serializer(upload).data, status=status.HTTP_409_CONFLICT)
+                upload.append(chunk)
+                upload.save()
+        return Response(self.get_serializer(upload).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['POST'], name='Finish the upload', url_path='finish',
+            serializer_class=FinishChunkedUploadSerializer)
+    def finish(self, request, *args, **kwargs):
+        """
+        Completes the upload, after which no more chunks can be added. If an md5hash is supplied,
+        it's checked against the upload and the upload is left open if they differ.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            upload = self._get_upload_for_update()
+            upload.finish()
+            expected_md5hash = serializer.validated_data.get('md5hash')
+            if expected_md5hash is not None and expected_md5hash != upload.md5hash:
+                raise ValidationError({'md5hash': [f'The upload has an MD5 hash of {upload.md5hash}. '
+                                                   f'Its chunks may need uploading again.']})
+            upload.save()
+        return Response(ChunkedUploadSerializer(upload).data, status=status.HTTP_200_OK)
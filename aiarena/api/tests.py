@@ -1,5 +1,6 @@
 from django.test import TransactionTestCase
 
+from aiarena.core.models import CompetitionParticipation
 from aiarena.core.tests.tests import FullDataSetMixin
 
 
@@ -61,6 +62,22 @@ class ApiReadPublicPagesTestCase(FullDataSetMixin, TransactionTestCase):
         response = self.client.get('/api/competition-participations/')
         self.assertEqual(response.status_code, 200)
 
+    def test_get_api_competitionparticipation_elo_history(self):
+        # the full data set's matchups are random, so take whichever participant played the most
+        sp = CompetitionParticipation.objects.order_by('-match_count').first()
+        self.assertGreater(sp.match_count, 0)
+        response = self.client.get(f'/api/competition-participations/{sp.id}/elo-history/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(len(response.data['elo']), sp.match_count)  # cancelled matches still record an ELO
+        full_length = len(response.data['elo'])
+
+        response = self.client.get(f'/api/competition-participations/{sp.id}/elo-history/', {'points': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['elo']), min(3, full_length))
+
+        response = self.client.get(f'/api/competition-participations/{sp.id}/elo-history/', {'points': 1})
+        self.assertEqual(response.status_code, 400)
+
     def test_get_api_games_page(self):
         response = self.client.get('/api/games/')
         self.assertEqual(response.status_code, 200)
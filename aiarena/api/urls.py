@@ -31,6 +31,8 @@ router.register(r'arenaclient/results', arenaclient_views.ResultViewSet, basenam
 router.register(r'arenaclient/next-match', arenaclient_views.MatchViewSet, basename='ac_next_match')
 router.register(r'arenaclient/submit-result', arenaclient_views.ResultViewSet, basename='ac_submit_result')
 router.register(r'arenaclient/set-status', arenaclient_views.SetArenaClientStatusViewSet, basename='api_ac_set_status')
+router.register(r'arenaclient/heartbeat', arenaclient_views.HeartbeatViewSet, basename='api_ac_heartbeat')
+router.register(r'arenaclient/uploads', arenaclient_views.ChunkedUploadViewSet, basename='ac_upload')
 
 # stream
 router.register(r'stream/next-replay', stream_views.StreamNextReplayViewSet, basename='api_stream_nextreplay')
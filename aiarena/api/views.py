@@ -8,6 +8,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, serializers
 from rest_framework.decorators import action
 from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.response import Response
 from rest_framework.reverse import reverse
 
 from aiarena.api.view_filters import BotFilter, MatchParticipationFilter, ResultFilter, MatchFilter
@@ -15,6 +16,8 @@ from aiarena.core.models import Match, Result, Bot, Map, User, Round, MatchParti
     Competition, MatchTag, Game, GameMode, MapPool, CompetitionBotMatchupStats, CompetitionBotMapStats, News, Trophy
 from aiarena.core.models.bot_race import BotRace
 from aiarena.core.permissions import IsServiceOrAdminUser
+from aiarena.core.stats.downsampling import downsample_lttb
+from aiarena.core.stats.stats_generator import StatsGenerator
 from aiarena.patreon.models import PatreonUnlinkedDiscordUID
 
 logger = logging.getLogger(__name__)
@@ -271,6 +274,10 @@ class CompetitionParticipationSerializer(serializers.ModelSerializer):
         fields = competition_participation_include_fields
 
 
+class EloHistoryQuerySerializer(serializers.Serializer):
+    points = serializers.IntegerField(min_value=3, required=False)
+
+
 # !ATTENTION! IF YOU CHANGE THE API ANNOUNCE IT TO USERS
 
 class CompetitionParticipationViewSet(viewsets.ReadOnlyModelViewSet):
@@ -285,6 +292,22 @@ class CompetitionParticipationViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = competition_participation_filter_fields
     ordering_fields = competition_participation_filter_fields
 
+    @action(detail=True, methods=['GET'], name='A bot\'s ELO over time in the competition', url_path='elo-history')
+    def elo_history(self, request, *args, **kwargs):
+        """
+        The bot's ELO after each of its results in the competition, as [unix timestamp, ELO] pairs, oldest first.
+        Supply a points parameter to downsample the series to at most that many points.
+        """
+        query = EloHistoryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        sp = self.get_object()
+        series = [[int(created.timestamp()), elo]
+                  for created, elo in StatsGenerator.get_elo_series(sp.bot_id, sp.competition_id)]
+        if query.validated_data.get('points') is not None:
+            series = downsample_lttb(series, query.validated_data['points'])
+        return Response({'bot': sp.bot_id, 'competition': sp.competition_id,
+                         'bot_zip_updated': int(sp.bot.bot_zip_updated.timestamp()), 'elo': series})
+
 
 # !ATTENTION! IF YOU CHANGE THE API ANNOUNCE IT TO USERS
 
@@ -1,3 +1,5 @@
 from .bots import Bots
 from .matches import Matches
-from .competitions import Competitions
\ No newline at end of file
+from .competitions import Competitions
+from .jobs import Jobs
+from .tags import Tags
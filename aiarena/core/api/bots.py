@@ -2,19 +2,54 @@ import logging
 
 from django.contrib.sites.models import Site
 from django.core.mail import send_mail
+from constance import config
 from django.db.models import QuerySet
 from django.urls import reverse
 
 from aiarena import settings
-from aiarena.core.models import Bot
+from aiarena.core.models import Bot, BotDataLock, Competition, MatchParticipation
 
 logger = logging.getLogger(__name__)
 
 
 class Bots:
+    @staticmethod
+    def run_consecutive_crashes_check(triggering_participant: MatchParticipation):
+        """
+        Checks to see whether the last X results for a participant are crashes and, if so, disables the bot
+        and sends an alert to the bot author
+        :param triggering_participant: The participant who triggered this check and whose bot we should run the check for.
+        :return:
+        """
+
+        if config.BOT_CONSECUTIVE_CRASH_LIMIT < 1:
+            return  # Check is disabled
+
+        if not triggering_participant.bot.competition_participations.filter(active=True).exists():
+            return  # No use running the check - bot is already inactive.
+
+        # Get recent match participation records for this bot
+        recent_participations = MatchParticipation.objects.filter(bot=triggering_participant.bot,
+                                                                  match__result__isnull=False).order_by(
+            '-match__result__created')[:config.BOT_CONSECUTIVE_CRASH_LIMIT]
+
+        # if there's not enough participations yet, then exit without action
+        if recent_participations.count() < config.BOT_CONSECUTIVE_CRASH_LIMIT:
+            return
+
+        # if any of the previous results weren't a crash, then exit without action
+        for recent_participation in recent_participations:
+            if not recent_participation.crashed:
+                return
+
+        # If we get to here, all the results were crashes, so take action
+        Bots.disable_and_send_crash_alert(triggering_participant.bot)
+
     @staticmethod
     def disable_and_send_crash_alert(bot: Bot):
+        competition_ids = list(bot.competition_participations.filter(active=True).values_list('competition_id', flat=True))
         bot.competition_participations.update(active=False)
+        Competition.update_active_participant_counts(competition_ids)
         try:
             send_mail(  # todo: template this
                 'AI Arena - ' + bot.name + ' deactivated due to crashing',
@@ -42,15 +77,11 @@ class Bots:
 
     @staticmethod
     def get_available(bots) -> list:
-        return [bot for bot in bots if not bot.bot_data_is_currently_frozen()]
+        bots = list(bots)
+        frozen_bot_ids = BotDataLock.get_data_frozen_bot_ids([bot.id for bot in bots])
+        return [bot for bot in bots if bot.id not in frozen_bot_ids]
 
     @staticmethod
     def available_is_more_than(bots, amount: int) -> bool:
-        available = 0
-        for bot in bots:
-            if not bot.bot_data_is_currently_frozen():
-                available += 1
-            if available >= amount:
-                return True
-        return False
+        return len(Bots.get_available(bots)) >= amount
 
@@ -4,13 +4,27 @@ from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from django.db.models import QuerySet
-    from aiarena.core.models import Competition
+
+import logging
+
+from constance import config
+from django.db.models import Count, F, FloatField, Min, Value, ExpressionWrapper, Sum
+from django.db.models.functions import Greatest
+
+from aiarena import settings
 
 from aiarena.core.models import CompetitionParticipation
 from aiarena.core.models import Bot
+from aiarena.core.models import Competition
+
+logger = logging.getLogger(__name__)
 
 
 class Competitions:
+    # How far, in scheduling passes, a competition which sat idle can fall behind the others.
+    # A pass is one match per active participant.
+    MAX_SCHEDULING_CREDIT = 1.0
+
     @staticmethod
     def get_active_bots(competition: Competition) -> QuerySet:
         return Bot.objects.only("id").filter(competition_participations__competition=competition,
@@ -30,4 +44,68 @@ class Competitions:
 
     @staticmethod
     def has_reached_maximum_active_rounds(competition: Competition):
-        return competition.round_set.filter(complete=False).count() >= competition.max_active_rounds
\ No newline at end of file
+        return competition.round_set.filter(complete=False).count() >= competition.max_active_rounds
+
+    @staticmethod
+    def get_schedulable_competitions() -> QuerySet:
+        return Competition.objects.filter(status__in=['open', 'closing', 'paused'], active_participant_count__gt=0)
+
+    @staticmethod
+    def get_priority_order() -> list:
+        """
+        Returns the ids of the competitions with matches to schedule, the competition furthest behind its fair share
+        of matches first. Each competition's share is proportional to its number of active participants.
+        """
+        return list(Competitions.get_schedulable_competitions().order_by('scheduling_pass', 'id')
+                    .values_list('id', flat=True))
+
+    @staticmethod
+    def record_match_started(competition_id: int):
+        """
+        Advances the competition's scheduling pass by one match's worth of its share.
+        A competition which sat idle only gets to bank a limited amount of credit: it resumes from no further than
+        one match per active participant behind the furthest behind other competition.
+        This writes to the competition's row, so it shouldn't be done while claiming a match - every other claim
+        for the competition would have to wait for it.
+        """
+        min_pass = Competitions.get_schedulable_competitions().exclude(id=competition_id) \
+            .aggregate(min_pass=Min('scheduling_pass'))['min_pass']
+        current_pass = F('scheduling_pass') if min_pass is None \
+            else Greatest(F('scheduling_pass'), Value(min_pass - Competitions.MAX_SCHEDULING_CREDIT))
+        stride = Value(1.0) / Greatest(F('active_participant_count'), Value(1))
+        Competition.objects.filter(id=competition_id).update(
+            scheduling_pass=ExpressionWrapper(current_pass + stride, output_field=FloatField()))
+
+    @staticmethod
+    def run_elo_sanity_check(competition_id: int, result_id: int):
+        """
+        Checks the competition's ELO drift is still zero, in order to detect ELO corruption.
+        This is only a cheap read of the running count kept in Competition.elo_drift. Results add to it when saving
+        their ELO changes overwrote ELO which had changed since it was read. The auditelos command checks the count
+        against the participations' actual ELO.
+        """
+        if config.DEBUG_LOGGING_ENABLED:
+            logger.info("ENABLE_ELO_SANITY_CHECK enabled. Performing check.")
+
+        elo_drift = Competition.objects.values_list('elo_drift', flat=True).get(id=competition_id)
+        if elo_drift != 0:
+            logger.critical(f"ELO sum of competition {competition_id} was {elo_drift} off its expected value "
+                            f"upon submission of result {result_id}")
+        elif config.DEBUG_LOGGING_ENABLED:
+            logger.info("ENABLE_ELO_SANITY_CHECK passed!")
+
+    @staticmethod
+    def audit_elo_drift(competition_ids=None) -> list:
+        """
+        Recomputes each competition's ELO drift from its participations and compares it to the running count.
+        Returns (competition id, counted drift, actual drift) for every competition audited.
+        """
+        competitions = Competition.objects.all() if competition_ids is None \
+            else Competition.objects.filter(id__in=competition_ids)
+        actual = {competition_id: elo_sum - participant_count * settings.ELO_START_VALUE
+                  for competition_id, elo_sum, participant_count
+                  in CompetitionParticipation.objects.filter(competition__in=competitions).order_by()
+                  .values('competition_id').annotate(elo_sum=Sum('elo'), participant_count=Count('id'))
+                  .values_list('competition_id', 'elo_sum', 'participant_count')}
+        return [(competition_id, elo_drift, actual.get(competition_id, 0))
+                for competition_id, elo_drift in competitions.order_by('id').values_list('id', 'elo_drift')]
@@ -0,0 +1,117 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from constance import config
+from django.db import transaction
+from django.utils import timezone
+
+from aiarena.core.api.bots import Bots
+from aiarena.core.api.competitions import Competitions
+from aiarena.core.api.matches import Matches
+from aiarena.core.events import EVENT_MANAGER, MatchResultReceivedEvent
+from aiarena.core.models import Job, MatchParticipation, Result
+
+logger = logging.getLogger(__name__)
+
+
+class Jobs:
+    ELO_SANITY_CHECK = 'elo_sanity_check'
+    CONSECUTIVE_CRASHES_CHECK = 'consecutive_crashes_check'
+    MATCH_RESULT_RECEIVED = 'match_result_received'
+
+    FINISHED_JOB_RETENTION = timedelta(days=7)
+
+    @staticmethod
+    def enqueue(job_type: str, payload: dict, idempotency_key: str) -> Job:
+        """
+        Queues a job to be run by the processjobs command.
+        Call this inside the transaction making the change the job relates to, so the job is only queued if the change
+        is committed. If a job with the same idempotency key already exists, that job is returned instead.
+        """
+        return Job.objects.get_or_create(idempotency_key=idempotency_key,
+                                         defaults={'type': job_type, 'payload': payload})[0]
+
+    @staticmethod
+    def enqueue_result_processing(result: Result):
+        """Queues the work which follows the submission of a result but doesn't need to hold up the arena client."""
+        jobs = []
+        if result.match.round is not None:
+            if config.ENABLE_ELO_SANITY_CHECK:
+                jobs.append(Job(type=Jobs.ELO_SANITY_CHECK,
+                                payload={'competition_id': result.match.round.competition_id, 'result_id': result.id},
+                                idempotency_key=f'{Jobs.ELO_SANITY_CHECK}:{result.id}'))
+            elif config.DEBUG_LOGGING_ENABLED:
+                logger.info("ENABLE_ELO_SANITY_CHECK disabled. Skipping check.")
+
+            if result.is_crash_or_timeout:
+                jobs.append(Job(type=Jobs.CONSECUTIVE_CRASHES_CHECK,
+                                payload={'match_participation_id':
+                                         result.get_causing_participant_of_crash_or_timeout_result.id},
+                                idempotency_key=f'{Jobs.CONSECUTIVE_CRASHES_CHECK}:{result.id}'))
+
+        jobs.append(Job(type=Jobs.MATCH_RESULT_RECEIVED, payload={'result_id': result.id},
+                        idempotency_key=f'{Jobs.MATCH_RESULT_RECEIVED}:{result.id}'))
+        # queue them all in one query. Like enqueue, this leaves any job which was already queued as it is.
+        Job.objects.bulk_create(jobs, ignore_conflicts=True)
+
+    @staticmethod
+    def run_next() -> bool:
+        """
+        Runs the next queued job that is due, if there is one. Returns whether a job was run.
+        Concurrent workers skip the jobs each other have locked, so several workers can run at once.
+        A job which raises an exception is retried with an increasing delay, up to JOB_MAX_ATTEMPTS attempts.
+        """
+        with transaction.atomic():
+            job = Job.objects.select_for_update(skip_locked=Matches.can_claim_with_skip_locked()) \
+                .filter(status=Job.QUEUED, run_after__lte=timezone.now()).order_by('run_after', 'id').first()
+            if job is None:
+                return False
+
+            job.attempts += 1
+            try:
+                # roll back the job's own changes if it fails, but keep the record of the attempt
+                with transaction.atomic():
+                    Jobs._HANDLERS[job.type](job.payload)
+                job.status = Job.DONE
+                job.finished = timezone.now()
+                job.last_error = None
+            except Exception:
+                job.last_error = traceback.format_exc()
+                if job.attempts >= config.JOB_MAX_ATTEMPTS:
+                    logger.error(f"Job {job.id} ({job.idempotency_key}) failed after {job.attempts} attempts:\n"
+                                 f"{job.last_error}")
+                    job.status = Job.FAILED
+                    job.finished = timezone.now()
+                else:
+                    logger.warning(f"Job {job.id} ({job.idempotency_key}) failed on attempt {job.attempts}. "
+                                   f"It will be retried.")
+                    job.run_after = timezone.now() + config.JOB_RETRY_DELAY * (2 ** (job.attempts - 1))
+            job.save()
+            return True
+
+    @staticmethod
+    def delete_finished_jobs() -> int:
+        """Deletes successful jobs past their retention period. Failed jobs are kept for inspection."""
+        return Job.objects.filter(status=Job.DONE,
+                                  finished__lt=timezone.now() - Jobs.FINISHED_JOB_RETENTION).delete()[0]
+
+    @staticmethod
+    def _run_elo_sanity_check(payload: dict):
+        Competitions.run_elo_sanity_check(payload['competition_id'], payload['result_id'])
+
+    @staticmethod
+    def _run_consecutive_crashes_check(payload: dict):
+        Bots.run_consecutive_crashes_check(
+            MatchParticipation.objects.select_related('bot').get(id=payload['match_participation_id']))
+
+    @staticmethod
+    def _broadcast_match_result_received(payload: dict):
+        EVENT_MANAGER.broadcast_event(MatchResultReceivedEvent(Result.objects.get(id=payload['result_id'])))
+
+
+Jobs._HANDLERS = {
+    Jobs.ELO_SANITY_CHECK: Jobs._run_elo_sanity_check,
+    Jobs.CONSECUTIVE_CRASHES_CHECK: Jobs._run_consecutive_crashes_check,
+    Jobs.MATCH_RESULT_RECEIVED: Jobs._broadcast_match_result_received,
+}
@@ -1,3 +1,4 @@
+from aiarena.core.d_utils import random_pick
 from aiarena.core.models import Competition, Map
 from aiarena.core.models import MapPool
 from aiarena.core.models.game_mode import GameMode
@@ -6,18 +7,12 @@ from aiarena.core.models.game_mode import GameMode
 class Maps:
     @staticmethod
     def random_of_competition(competition: Competition):
-        # todo: apparently this is really slow
-        # https://stackoverflow.com/questions/962619/how-to-pull-a-random-record-using-djangos-orm#answer-962672
-        return Map.objects.filter(competition=competition).order_by('?').first()
+        return random_pick(Map.objects.filter(competitions=competition), 'maps', f'competition:{competition.id}')
 
     @staticmethod
     def random_of_game_mode(game_mode: GameMode):
-        # todo: apparently this is really slow
-        # https://stackoverflow.com/questions/962619/how-to-pull-a-random-record-using-djangos-orm#answer-962672
-        return Map.objects.filter(game_mode=game_mode).order_by('?').first()
+        return random_pick(Map.objects.filter(game_mode=game_mode), 'maps', f'game_mode:{game_mode.id}')
 
     @staticmethod
     def random_from_map_pool(map_pool: MapPool):
-        # todo: apparently this is really slow
-        # https://stackoverflow.com/questions/962619/how-to-pull-a-random-record-using-djangos-orm#answer-962672
-        return Map.objects.filter(map_pools__in=[map_pool]).order_by('?').first()
+        return random_pick(Map.objects.filter(map_pools__in=[map_pool]), 'maps', f'map_pool:{map_pool.id}')
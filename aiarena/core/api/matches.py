@@ -1,11 +1,12 @@
+import itertools
 import logging
 import random
 from enum import Enum
 
 from constance import config
-from django.db import transaction
+from django.db import transaction, connection
 from django.utils import timezone
-from django.db.models import Count
+from django.db.models import Count, Max
 from rest_framework.exceptions import APIException
 
 from aiarena.api.arenaclient.exceptions import NotEnoughAvailableBots, MaxActiveRounds, NoMaps, CompetitionPaused, \
@@ -13,14 +14,20 @@ from aiarena.api.arenaclient.exceptions import NotEnoughAvailableBots, MaxActive
 from aiarena.core.api import Bots
 from aiarena.core.api.competitions import Competitions
 from aiarena.core.api.maps import Maps
+from aiarena.core.d_utils import notify_match_availability_changed
 from aiarena.core.models import Result, Map, Match, Round, Bot, MatchParticipation, Competition, \
-    CompetitionParticipation, ArenaClient
+    CompetitionParticipation, ArenaClient, BotDataLock
 from aiarena.core.models.game_mode import GameMode
 
 logger = logging.getLogger(__name__)
 
 
 class Matches:
+    CLAIM_CANDIDATE_COUNT = 10
+    """The number of queued matches an arena client tries to claim at once when claiming with SKIP LOCKED."""
+    CLAIM_CANDIDATE_POOL_SIZE = 100
+    """The number of oldest queued matches the claim candidates are randomly picked from."""
+
     @staticmethod
     def request_match(user, bot, opponent, map: Map=None, game_mode: GameMode=None):
         # if map is none, a game mode must be supplied and a random map gets chosen
@@ -33,7 +40,6 @@ class Matches:
                             opponent,
                             user, bot1_update_data=False, bot2_update_data=False, require_trusted_arenaclient=False)
 
-    # todo: have arena client check in with web service in order to delay this
     @staticmethod
     def timeout_overtime_bot_games():
         matches_without_result = Match.objects.only('round').select_related('round').select_for_update().filter(
@@ -44,26 +50,68 @@ class Matches:
                 match.round.update_if_completed()
 
     @staticmethod
-    def start_match(match, arenaclient: ArenaClient) -> bool:
+    def new_lease_expiry():
+        """Returns when a lease taken out or renewed now would expire, or None if match leases are disabled."""
+        if config.MATCH_LEASE_DURATION:
+            return timezone.now() + config.MATCH_LEASE_DURATION
+        return None
+
+    @staticmethod
+    def renew_leases(arenaclient: ArenaClient, match_ids=None) -> list:
+        """
+        Extends the arena client's leases on its unfinished matches.
+        :param match_ids: Limit the renewal to these matches. By default every match leased to the arena client is renewed.
+        :return: The ids of the matches the arena client still holds.
+        """
+        matches = Match.objects.filter(assigned_to=arenaclient, started__isnull=False, result__isnull=True)
+        if match_ids is not None:
+            matches = matches.filter(id__in=match_ids)
+        leased_match_ids = list(matches.values_list('id', flat=True))
+        if len(leased_match_ids) > 0:
+            Match.objects.filter(id__in=leased_match_ids, assigned_to=arenaclient) \
+                .update(lease_expires=Matches.new_lease_expiry())
+        return leased_match_ids
+
+    @staticmethod
+    def requeue_expired_leases():
+        """
+        Puts matches whose arena client stopped renewing its lease back into the queue and frees their bots.
+        The first_started time is kept, so a match that keeps getting dropped is still eventually timed out.
+        """
+        expired_match_ids = list(Match.objects.select_for_update(skip_locked=Matches.can_claim_with_skip_locked())
+                                 .filter(lease_expires__lt=timezone.now(), started__isnull=False,
+                                         result__isnull=True).values_list('id', flat=True))
+        if len(expired_match_ids) > 0:
+            logger.info(f"Requeueing matches with expired leases: {expired_match_ids}")
+            Match.objects.filter(id__in=expired_match_ids).update(started=None, assigned_to=None, lease_expires=None)
+            BotDataLock.objects.filter(match_id__in=expired_match_ids).delete()
+            notify_match_availability_changed()
+        return expired_match_ids
+
+    @staticmethod
+    def lease_lost(match: Match, arenaclient: ArenaClient) -> bool:
+        """
+        Whether the arena client was handed this match but it has since been handed to a different arena client.
+        A match which was put back into the queue but hasn't been picked up again still counts as held.
+        """
+        return match.assigned_to_id is not None and match.assigned_to_id != arenaclient.id
+
+    @staticmethod
+    def start_match(match, arenaclient: ArenaClient, record_start=True) -> bool:
+        """
+        Starts the match on the arena client, if its participants are available.
+        record_start=False leaves the competition's scheduling pass alone, for restarting a match whose start
+        was already counted.
+        """
         if match.require_trusted_arenaclient and not arenaclient.trusted:
             return False
         match.lock_me()  # lock self to avoid race conditions
         if match.started is None:
             # Avoid starting a match when a participant is not available
-            participations = MatchParticipation.objects.raw("""
-                SELECT cm.id FROM core_matchparticipation cm
-                where ((cm.use_bot_data =0 or cm.update_bot_data =0) or cm.bot_id not in (
-                        select bot_id
-                        from core_matchparticipation
-                        inner join core_match m on core_matchparticipation.match_id = m.id
-                        left join core_result cr on m.id = cr.match_id
-                        where m.started is not null
-                        and cr.type is null
-                        and (core_matchparticipation.use_bot_data = 1 or core_matchparticipation.update_bot_data =1)       
-                        and m.id != %s 
-                    )) and match_id = %s
-
-            """, (match.id, match.id))
+            participations = list(MatchParticipation.objects.filter(match=match))
+            locked_bot_ids = BotDataLock.get_locked_bot_ids([p.bot_id for p in participations], excluding_match=match)
+            participations = [p for p in participations
+                              if not (p.use_bot_data and p.update_bot_data) or p.bot_id not in locked_bot_ids]
 
             if len(participations) < 2:
                 # Todo: Commented out to avoid log spam. This used to be a last second sanity check.
@@ -80,24 +128,72 @@ class Matches:
                     p.save()
 
             match.started = timezone.now()
+            if match.first_started is None:
+                match.first_started = match.started
             match.assigned_to = arenaclient
+            match.lease_expires = Matches.new_lease_expiry()
             match.save()
+            if record_start and match.round_id is not None:
+                # once the claim is committed, so concurrent claims don't queue up on the competition's row
+                competition_id = match.round.competition_id
+                transaction.on_commit(lambda: Competitions.record_match_started(competition_id))
+            BotDataLock.lock_for_match(match, participations)
             return True
         else:
             logger.warning(f"Match {match.id} failed to start unexpectedly as it was already started.")
             return False
 
+    @staticmethod
+    def can_claim_with_skip_locked() -> bool:
+        """Whether matches should be claimed using SELECT ... FOR UPDATE SKIP LOCKED."""
+        return config.CLAIM_MATCHES_WITH_SKIP_LOCKED and connection.features.has_select_for_update_skip_locked
+
     @staticmethod
     def attempt_to_start_a_requested_match(requesting_ac: ArenaClient):
         # Try get a requested match
         # Do we want trusted clients to run games not requiring trusted clients?
-        matches = Match.objects.select_related('round').only('started', 'assigned_to', 'round') \
-            .filter(started__isnull=True, requested_by__isnull=False).select_for_update().order_by('created')
-        if matches.count() > 0:
+        # Requested matches don't lock bot data, so skipping locked rows is enough to hand out different matches.
+        matches = list(Match.objects.select_related('round').only('started', 'assigned_to', 'round')
+                       .filter(started__isnull=True, requested_by__isnull=False)
+                       .select_for_update(skip_locked=Matches.can_claim_with_skip_locked()).order_by('created'))
+        if len(matches) > 0:
             return Matches._start_and_return_a_match(requesting_ac, matches)
         else:
             return None
 
+    @staticmethod
+    def claim_a_ladder_match(requesting_ac: ArenaClient, competition: Competition):
+        """
+        Attempts to claim and start one queued match from the competition's existing rounds without waiting on
+        locks held by other arena clients. Matches and bots that another transaction is in the middle of claiming
+        are skipped, so concurrent arena clients each end up with a different match.
+        Must be called inside a transaction and only when can_claim_with_skip_locked() is True.
+        :return: The started match, or None if no match could be claimed.
+        """
+        # Candidate selection is a plain read so that only the claimed rows themselves are locked.
+        # The candidates are picked at random from the oldest queued matches, which can be read in index order,
+        # rather than sorting every queued match randomly.
+        candidate_ids = list(Match.objects
+                             .filter(round__competition=competition, started__isnull=True, requested_by__isnull=True)
+                             .exclude(matchparticipation__bot_id__in=BotDataLock.objects.values('bot_id'))
+                             .order_by('round_id', 'id')
+                             .values_list('id', flat=True)[:Matches.CLAIM_CANDIDATE_POOL_SIZE])
+        if len(candidate_ids) == 0:
+            return None
+        candidate_ids = random.sample(candidate_ids, min(len(candidate_ids), Matches.CLAIM_CANDIDATE_COUNT))
+
+        claimed_matches = list(Match.objects.select_for_update(skip_locked=True)
+                               .filter(id__in=candidate_ids, started__isnull=True))
+        random.shuffle(claimed_matches)  # ensure the match selection is random
+        for match in claimed_matches:
+            bot_ids = list(MatchParticipation.objects.filter(match=match).values_list('bot_id', flat=True))
+            # If another arena client is currently claiming a match with one of these bots, leave this one for later.
+            claimed_bot_ids = list(Bot.objects.select_for_update(skip_locked=True)
+                                   .filter(id__in=bot_ids).values_list('id', flat=True))
+            if len(claimed_bot_ids) == len(bot_ids) and Matches.start_match(match, requesting_ac):
+                return match
+        return None
+
     @staticmethod
     def _start_and_return_a_match(requesting_ac: ArenaClient, matches):
         for match in matches:
@@ -134,18 +230,7 @@ class Matches:
             inner join core_bot cb on c.bot_id = cb.id
              where cm.started is null
                and requested_by_id is null
-               and c.bot_id not in 
-                    (select cb.id
-                      from core_matchparticipation
-                     inner join core_match m
-                        on core_matchparticipation.match_id = m.id
-                      left join core_result cr
-                        on m.id = cr.match_id
-                    inner join core_bot cb on core_matchparticipation.bot_id = cb.id
-                     where m.started is not null
-                       and cr.id is null
-                       and core_matchparticipation.use_bot_data = 1
-                       and core_matchparticipation.update_bot_data =1    )               
+               and c.bot_id not in (select bot_id from core_botdatalock)
                 for update         
             """)
             match_ids = [match.id for match in ladder_matches_to_play]
@@ -168,8 +253,8 @@ class Matches:
 
     @staticmethod
     def _attempt_to_generate_new_round(competition: Competition):
-        active_maps = Map.objects.filter(competitions__in=[competition, ]).select_for_update()
-        if active_maps.count() == 0:
+        active_maps = list(Map.objects.filter(competitions__in=[competition, ]).select_for_update())
+        if len(active_maps) == 0:
             raise NoMaps()
 
         if competition.is_paused:
@@ -233,26 +318,108 @@ class Matches:
             CompetitionParticipation.objects.bulk_update(updated_participants, ['division_num', 'in_placements', 'match_count'])
         competition.save()
         
-        # Get updated participants
+        # Get updated participants and pair them up within their divisions
         active_participants = (CompetitionParticipation.objects
-            .only("id","division_num","bot")
-            .filter(competition=competition, active=True, division_num__gte=CompetitionParticipation.MIN_DIVISION))
-        already_processed_participants = []
-        # loop through and generate matches for all active participants
-        for participant1 in active_participants:
-            already_processed_participants.append(participant1.id)
-            active_participants_in_div = (CompetitionParticipation.objects
-                .only("bot")
-                .filter(competition=competition, active=True, division_num=participant1.division_num)
-                .exclude(id__in=already_processed_participants))
-            for participant2 in active_participants_in_div:
-                Match.create(new_round, random.choice(active_maps), participant1.bot, participant2.bot, require_trusted_arenaclient=True)
+            .select_related('bot').only("id", "division_num", "bot__id", "bot__bot_data_enabled")
+            .filter(competition=competition, active=True, division_num__gte=CompetitionParticipation.MIN_DIVISION)
+            .order_by('id'))
+        divisions = {}
+        for participant in active_participants:
+            divisions.setdefault(participant.division_num, []).append(participant.bot)
+        pairings = [pairing for bots in divisions.values() for pairing in itertools.combinations(bots, 2)]
+
+        if competition.create_matches_on_demand:
+            random.shuffle(pairings)
+            new_round.pending_pairings = [[bot1.id, bot2.id] for bot1, bot2 in pairings] or None
+            new_round.save()
+        else:
+            Matches._bulk_create_round_matches(new_round, active_maps, pairings)
 
         return new_round
 
     @staticmethod
-    def start_next_match_for_competition(requesting_ac: ArenaClient, competition: Competition):
-        # LADDER MATCHES
+    def _bulk_create_round_matches(round: Round, maps, pairings) -> int:
+        """
+        Creates a ladder match on a random map for each (bot1, bot2) pairing, using a couple of bulk inserts
+        instead of creating each match individually. Returns the number of matches created.
+        The caller must hold a lock on the round, so no other matches are added to it in the meantime.
+        """
+        if len(pairings) == 0:
+            return 0
+        # the round might already have matches, e.g. when matches are created on demand
+        last_match_id = Match.objects.filter(round=round).aggregate(Max('id'))['id__max'] or 0
+        matches = Match.objects.bulk_create([Match(map=random.choice(maps), round=round, require_trusted_arenaclient=True)
+                                             for _ in pairings])
+        if matches[0].id is None:
+            # Not every database backend returns primary keys from a bulk insert, but they are assigned in insert order.
+            match_ids = Match.objects.filter(round=round, id__gt=last_match_id).order_by('id') \
+                .values_list('id', flat=True)
+            for match, match_id in zip(matches, match_ids):
+                match.id = match_id
+
+        participations = []
+        for match, (bot1, bot2) in zip(matches, pairings):
+            participations.append(MatchParticipation(match=match, participant_number=1, bot=bot1,
+                                                     use_bot_data=bot1.bot_data_enabled,
+                                                     update_bot_data=bot1.bot_data_enabled))
+            participations.append(MatchParticipation(match=match, participant_number=2, bot=bot2,
+                                                     use_bot_data=bot2.bot_data_enabled,
+                                                     update_bot_data=bot2.bot_data_enabled))
+        MatchParticipation.objects.bulk_create(participations)
+        notify_match_availability_changed()
+        return len(matches)
+
+    @staticmethod
+    def _create_matches_on_demand(competition: Competition, priority_round: Round = None):
+        """
+        For competitions which create matches on demand, tops up the competition's queue of matches
+        from the pending pairings of its rounds, oldest round first.
+        Pairings with a bot which is busy or already has a queued match are left for later.
+        If a priority_round is given, it is topped up first and gets at least one match (if any of its
+        pairings can be played), even if the queue is already full.
+        """
+        if not competition.create_matches_on_demand:
+            return
+        rounds = list(Round.objects.select_for_update()
+                      .filter(competition=competition, complete=False, pending_pairings__isnull=False)
+                      .order_by('number'))
+        if len(rounds) == 0:
+            return
+        maps = list(Map.objects.filter(competitions__in=[competition, ]))
+        if len(maps) == 0:
+            return
+
+        queued_matches = Match.objects.filter(round__competition=competition, started__isnull=True)
+        matches_wanted = config.ON_DEMAND_MATCH_QUEUE_SIZE - queued_matches.count()
+        if priority_round is not None:
+            rounds.sort(key=lambda r: r.id != priority_round.id)
+            matches_wanted = max(matches_wanted, 1)
+        busy_bot_ids = set(MatchParticipation.objects.filter(match__in=queued_matches).values_list('bot_id', flat=True))
+        busy_bot_ids.update(BotDataLock.objects.values_list('bot_id', flat=True))
+
+        for round in rounds:
+            if matches_wanted <= 0:
+                break
+            to_create, remaining = [], []
+            for pairing in round.pending_pairings:
+                if len(to_create) < matches_wanted and busy_bot_ids.isdisjoint(pairing):
+                    to_create.append(pairing)
+                    busy_bot_ids.update(pairing)
+                else:
+                    remaining.append(pairing)
+            if len(to_create) > 0:
+                bots = Bot.objects.only('id', 'bot_data_enabled') \
+                    .in_bulk({bot_id for pairing in to_create for bot_id in pairing})
+                # pairings with a bot that has since been deleted are dropped
+                created = Matches._bulk_create_round_matches(round, maps, [(bots[bot1_id], bots[bot2_id])
+                                                                           for bot1_id, bot2_id in to_create
+                                                                           if bot1_id in bots and bot2_id in bots])
+                round.pending_pairings = remaining or None
+                round.save(update_fields=['pending_pairings'])
+                matches_wanted -= created
+
+    @staticmethod
+    def _attempt_to_start_a_match_in_any_round(requesting_ac: ArenaClient, competition: Competition):
         # Get rounds with un-started matches
         rounds = Round.objects.raw("""
             SELECT distinct cr.id from core_round cr 
@@ -267,6 +434,16 @@ class Matches:
             match = Matches._attempt_to_start_a_ladder_match(requesting_ac, round)
             if match is not None:
                 return match  # a match was found - we're done
+        return None
+
+    @staticmethod
+    def start_next_match_for_competition(requesting_ac: ArenaClient, competition: Competition):
+        Matches._create_matches_on_demand(competition)
+
+        # LADDER MATCHES
+        match = Matches._attempt_to_start_a_match_in_any_round(requesting_ac, competition)
+        if match is not None:
+            return match
 
         # If none of the previous matches were able to start, and we don't have 2 active bots available,
         # then we give up.
@@ -283,7 +460,12 @@ class Matches:
             raise MaxActiveRounds()
         else:  # generate new round
             round = Matches._attempt_to_generate_new_round(competition)
-            match = Matches._attempt_to_start_a_ladder_match(requesting_ac, round)
+            if competition.create_matches_on_demand:
+                # the new round only has pairings so far - make sure some of them are turned into matches
+                Matches._create_matches_on_demand(competition, priority_round=round)
+                match = Matches._attempt_to_start_a_match_in_any_round(requesting_ac, competition)
+            else:
+                match = Matches._attempt_to_start_a_ladder_match(requesting_ac, round)
             if match is None:
                 raise APIException("Failed to start match. There might not be any available participants.")
             else:
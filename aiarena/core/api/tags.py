@@ -0,0 +1,26 @@
+from aiarena.core.models import Match, MatchTag, Tag, User
+
+
+class Tags:
+    @staticmethod
+    def set_match_tags(match: Match, user: User, names: list):
+        """
+        Replaces the user's tags on the match with the named tags, which should already be cleaned by parse_tags.
+        The tags are resolved in bulk, so the number of queries doesn't grow with the number of tags.
+        """
+        match_tag_ids = []
+        if names:
+            # create whichever tags don't exist yet and read back the lot, then do the same for the user's match tags
+            Tag.objects.bulk_create([Tag(name=name) for name in set(names)], ignore_conflicts=True)
+            tag_ids = list(Tag.objects.filter(name__in=names).values_list('id', flat=True))
+            MatchTag.objects.bulk_create([MatchTag(user=user, tag_id=tag_id) for tag_id in tag_ids],
+                                         ignore_conflicts=True)
+            match_tag_ids = list(MatchTag.objects.filter(user=user, tag_id__in=tag_ids).values_list('id', flat=True))
+
+        # remove tags for this match that belong to this user and were not supplied
+        stale_match_tag_ids = list(match.tags.filter(user=user).exclude(id__in=match_tag_ids)
+                                   .values_list('id', flat=True))
+        if stale_match_tag_ids:
+            match.tags.remove(*stale_match_tag_ids)
+        # add everything, this shouldn't cause duplicates
+        match.tags.add(*match_tag_ids)
@@ -1,26 +1,18 @@
 import logging
-from django.db.models.fields import CharField, TextField
-from django.db.models import Q, Aggregate
+import random
+import time
+import uuid
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.db import transaction
+from django.db.models import Q
 from rest_framework.exceptions import ValidationError
 
 # File for housing utils that require 'django' or would break CI if placed in utils.py
 logger = logging.getLogger(__name__)
 
 
-class GroupConcat(Aggregate):
-    function = 'GROUP_CONCAT'
-    template = '%(function)s(%(distinct)s%(expressions)s%(ordering)s%(separator)s)'
-
-    def __init__(self, expression, ordering=None, separator=',', **extra):
-        super(GroupConcat, self).__init__(
-            expression,
-            ordering=' ORDER BY %s' % ordering if ordering is not None else '',
-            separator=' SEPARATOR "%s"' % separator,
-            output_field=TextField(),
-            **extra
-        )
-
-
 def filter_tags(qs, value, tags_field_name, tags_lookup_expr="iexact", user_field_name="", exclude=False):
     """ 
     Given a string value, filter the queryset for tags found in it.
@@ -54,26 +46,114 @@ def filter_tags(qs, value, tags_field_name, tags_lookup_expr="iexact", user_fiel
         user_query |= Q(**{user_lookup: v})
 
     # Build query for tags
-    tag_query = Q()
     if tags_str:
         tags = [s.strip() for s in tags_str.split(',')]
         tags = [s for s in tags if s]
-        if tags_lookup_expr == 'icontains':
-            qs = method(qs)(user_query).distinct()
-            # Create string with all tag names and run icontains on the string
-            qs = qs.annotate(all_tags=GroupConcat(tags_field_name))
-            tags_lookup = '%s__%s' % ('all_tags', tags_lookup_expr)
-            for v in tags:
-                tag_query &= Q(**{tags_lookup: v})
-            return method(qs)(tag_query)
-        else:
-            user_lookup = '%s__%s' % (user_field_name, "in")
-            tags_lookup = '%s__%s' % (tags_field_name, tags_lookup_expr)
-            for v in tags:
-                if users:
-                    qs = qs.filter(**{tags_lookup: v, user_lookup:users})
-                else:
-                    qs = qs.filter(**{tags_lookup: v})
-            return qs.distinct()
+        # Each tag is looked up through the match's own tag rows, so the search starts from the (small, indexed)
+        # tag table and follows the tag->match links, rather than reading every match's tags to search them.
+        user_lookup = '%s__%s' % (user_field_name, "in")
+        tags_lookup = '%s__%s' % (tags_field_name, tags_lookup_expr)
+        for v in tags:
+            if users:
+                qs = method(qs)(**{tags_lookup: v, user_lookup: users})
+            else:
+                qs = method(qs)(**{tags_lookup: v})
+        return qs.distinct()
 
     return method(qs)(user_query).distinct()
+
+
+RANDOM_PICK_CACHE_TIMEOUT = 3600
+
+
+def _random_pick_version_key(group: str) -> str:
+    return f'random_pick_version:{group}'
+
+
+def invalidate_random_picks(group: str):
+    """Discards every id list cached by random_pick for the group, e.g. after one of its models changed."""
+    cache.set(_random_pick_version_key(group), uuid.uuid4().hex, None)
+
+
+def random_pick(queryset, group: str = None, key: str = None, exclude_pks=()):
+    """
+    Returns a random object from the queryset, or None if it's empty, without the full sort order_by('?') causes.
+    Only the ids matching the queryset are read and one is picked from them in python.
+    When a group and key are supplied, the id list is cached until invalidate_random_picks is called for the group.
+    Without a cache to keep it in, the object is instead picked by counting the queryset and reading the row at a
+    random offset, which is cheaper than reading every id each time.
+    exclude_pks are never picked.
+    """
+    if isinstance(caches['default'], DummyCache):
+        queryset = queryset.exclude(pk__in=exclude_pks) if exclude_pks else queryset
+        count = queryset.count()
+        if count == 0:
+            return None
+        offset = random.randrange(count)
+        picked = list(queryset.order_by('pk')[offset:offset + 1])
+        return picked[0] if picked else None
+
+    cache_key = None
+    if group is not None and key is not None:
+        version = cache.get(_random_pick_version_key(group))
+        if version is None:
+            invalidate_random_picks(group)
+            version = cache.get(_random_pick_version_key(group))
+        cache_key = f'random_pick:{group}:{version}:{key}'
+
+    ids = cache.get(cache_key) if cache_key else None
+    from_cache = ids is not None
+    if ids is None:
+        ids = list(queryset.values_list('pk', flat=True))
+        if cache_key:
+            cache.set(cache_key, ids, RANDOM_PICK_CACHE_TIMEOUT)
+
+    candidates = [pk for pk in ids if pk not in exclude_pks] if exclude_pks else ids
+    if len(candidates) == 0:
+        return None
+    picked = queryset.filter(pk=random.choice(candidates)).first()
+    if picked is None and from_cache:
+        # the cached list was stale - try again with a fresh one
+        invalidate_random_picks(group)
+        return random_pick(queryset, group, key, exclude_pks)
+    return picked
+
+
+MATCH_AVAILABILITY_VERSION_KEY = 'match_availability_version'
+MATCH_AVAILABILITY_POLL_INTERVAL = 0.5
+
+
+def notify_match_availability_changed():
+    """
+    Signals arena clients waiting for a match that one might now be available.
+    Takes effect once the current transaction commits, so that the waiting clients can see the change.
+    """
+    transaction.on_commit(lambda: cache.set(MATCH_AVAILABILITY_VERSION_KEY, uuid.uuid4().hex, None))
+
+
+def can_signal_match_availability():
+    """
+    Whether arena clients waiting for a match can be woken at all. The dummy cache doesn't keep anything set in it,
+    so with it the version never changes and a waiting client could only ever time out.
+    """
+    return not isinstance(caches['default'], DummyCache)
+
+
+def get_match_availability_version():
+    return cache.get(MATCH_AVAILABILITY_VERSION_KEY)
+
+
+def wait_for_match_availability_change(version, timeout: float) -> bool:
+    """
+    Waits up to timeout seconds for notify_match_availability_changed to be called after version was read.
+    Only the cache is polled while waiting.
+    :return: Whether a change was signalled before the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(MATCH_AVAILABILITY_POLL_INTERVAL, remaining))
+        if get_match_availability_version() != version:
+            return True
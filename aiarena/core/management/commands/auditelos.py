@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from aiarena.core.api import Competitions
+from aiarena.core.models import Competition
+
+
+class Command(BaseCommand):
+    help = "Audits each competition's total ELO against what its participants started with, " \
+           "and against the running count checked as results are submitted. Intended to be run periodically."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--competitionid', type=int, help="The competition id to audit. "
+                                                              "If this isn't supplied, all competitions are audited.")
+        parser.add_argument('--resync', action='store_true',
+                            help="Reset the running count to the drift found, "
+                                 "e.g. once the cause of a discrepancy has been dealt with.")
+
+    def handle(self, *args, **options):
+        audit = Competitions.audit_elo_drift(
+            None if options['competitionid'] is None else [options['competitionid']])
+
+        drifted = 0
+        for competition_id, counted_drift, actual_drift in audit:
+            if actual_drift == 0 and counted_drift == 0:
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Competition {competition_id}: OK')
+                continue
+
+            drifted += 1
+            self.stderr.write(f'Competition {competition_id}: ELO sum is {actual_drift} off its expected value. '
+                              f'The running count has it {counted_drift} off.')
+            if options['resync'] and counted_drift != actual_drift:
+                Competition.objects.filter(id=competition_id).update(elo_drift=actual_drift)
+                self.stdout.write(f'Competition {competition_id}: running count reset to {actual_drift}.')
+
+        self.stdout.write(f'Audited {len(audit)} competitions.')
+        if drifted:
+            raise CommandError(f'ELO drift found in {drifted} of {len(audit)} competitions.')
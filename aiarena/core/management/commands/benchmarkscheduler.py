@@ -0,0 +1,216 @@
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from constance import config
+from django.core.files import File
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, DatabaseError
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from aiarena import settings
+from aiarena.api.arenaclient.testing_utils import AcApiTestingClient
+from aiarena.core.models import Bot, Map, Competition, CompetitionParticipation, ArenaClient, WebsiteUser
+from aiarena.core.models.bot_race import BotRace
+from aiarena.core.models.game import Game
+from aiarena.core.models.game_mode import GameMode
+from aiarena.core.tests.testing_utils import TestAssetPaths
+from aiarena.core.utils import EnvironmentType
+
+
+class Command(BaseCommand):
+    help = "Builds a ladder and measures how the arena client match and result endpoints hold up " \
+           "under a number of concurrent arena clients. Intended for development and staging environments only. " \
+           "Each run builds its own ladder, and freezes the competitions of earlier runs."
+
+    _DEFAULT_BOTS = 300
+    _DEFAULT_COMPETITIONS = 5
+    _DEFAULT_ARENACLIENTS = 40
+    _DEFAULT_MATCHES_PER_ARENACLIENT = 10
+    _BOTS_PER_USER = 10
+    _RESULT_TYPES = ['Player1Win', 'Player2Win', 'Tie', 'Player1Crash', 'Player2Crash']
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bots', type=int, default=self._DEFAULT_BOTS,
+                            help=f"Number of bots to create. Default is {self._DEFAULT_BOTS}.")
+        parser.add_argument('--competitions', type=int, default=self._DEFAULT_COMPETITIONS,
+                            help=f"Number of competitions to spread the bots over. "
+                                 f"Default is {self._DEFAULT_COMPETITIONS}.")
+        parser.add_argument('--arenaclients', type=int, default=self._DEFAULT_ARENACLIENTS,
+                            help=f"Number of concurrent arena clients. Default is {self._DEFAULT_ARENACLIENTS}.")
+        parser.add_argument('--matches', type=int, default=self._DEFAULT_MATCHES_PER_ARENACLIENT,
+                            help=f"Number of matches each arena client plays. "
+                                 f"Default is {self._DEFAULT_MATCHES_PER_ARENACLIENT}.")
+        parser.add_argument('--flush', action='store_true', help="Whether to flush the existing database data.")
+        parser.add_argument('--randomseed', type=int,
+                            help="Set the random seed. Useful for consistent results.")
+
+    def handle(self, *args, **options):
+        if settings.ENVIRONMENT_TYPE not in [EnvironmentType.DEVELOPMENT, EnvironmentType.STAGING]:
+            self.stdout.write('Benchmark failed: This is not a development or staging environment!')
+            return
+
+        if options['randomseed'] is not None:
+            random.seed(options['randomseed'])
+        if options['flush']:
+            self.stdout.write('Flushing data...')
+            call_command('flush', '--noinput')
+
+        if not config.LADDER_ENABLED:
+            self.stdout.write('Warning: the ladder is disabled, so arena clients will not receive any matches.')
+
+        self.stdout.write(f"Building a ladder of {options['bots']} bots in {options['competitions']} competition(s)...")
+        tokens = self._build_ladder(options['bots'], options['competitions'], options['arenaclients'])
+
+        self.stdout.write(f"Running {options['matches']} match(es) on each of {len(tokens)} arena client(s)...")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(tokens)) as executor:
+            runs = list(executor.map(lambda token: self._run_arenaclient(token, options['matches']), tokens))
+        elapsed = time.perf_counter() - started
+
+        self._report(runs, elapsed)
+
+    def _build_ladder(self, bot_count, competition_count, arenaclient_count) -> list:
+        # earlier runs' competitions would otherwise take some of the matches
+        for competition in Competition.objects.filter(name__startswith='Benchmark Competition',
+                                                      status__in=['open', 'paused']):
+            competition.freeze()
+        # everything is named after the run, so the benchmark can be run again without flushing the database
+        run = uuid.uuid4().hex[:8]
+
+        owner = WebsiteUser.objects.create_superuser(username=f'benchmark_admin_{run}', password='x',
+                                                     email=f'benchmark_admin_{run}@dev.aiarena.net')
+        game_mode = GameMode.objects.create(name='Melee',
+                                            game=Game.objects.create(name=f'Benchmark StarCraft II {run}'))
+        if not BotRace.objects.exists():  # normally created by a migration
+            BotRace.create_all_races()
+        races = list(BotRace.objects.all())
+
+        competitions = []
+        with open(TestAssetPaths.test_map_path, 'rb') as map_file:
+            for i in range(competition_count):
+                competition = Competition.objects.create(name=f'Benchmark Competition {i + 1} {run}', type='L',
+                                                         game_mode=game_mode)
+                competition.open()
+                map = Map.objects.create(name=f'benchmark_map{i + 1}_{run}', game_mode=game_mode,
+                                         file=File(map_file))
+                map.competitions.add(competition)
+                competitions.append(competition)
+
+        # multi-table inherited users can't be bulk inserted, so only create a handful of them
+        users = [WebsiteUser.objects.create_user(username=f'benchmark_user{i}_{run}', password='x',
+                                                 email=f'benchmark_user{i}_{run}@dev.aiarena.net')
+                 for i in range(max(1, bot_count // self._BOTS_PER_USER))]
+
+        # save one bot normally so its zip is stored, then point the rest at the same file
+        with open(TestAssetPaths.test_bot_zip_path, 'rb') as bot_zip:
+            template = Bot.objects.create(user=users[0], name=f'benchmark_{run}_bot0', plays_race=races[0],
+                                          type='python', bot_zip=File(bot_zip))
+        Bot.objects.bulk_create([Bot(user=users[i % len(users)], name=f'benchmark_{run}_bot{i}',
+                                     plays_race=races[i % len(races)], type='python',
+                                     bot_zip=template.bot_zip.name, bot_zip_md5hash=template.bot_zip_md5hash,
+                                     bot_zip_updated=timezone.now())
+                                 for i in range(1, bot_count)])
+        bot_ids = list(Bot.objects.filter(name__startswith=f'benchmark_{run}_bot').values_list('id', flat=True))
+
+        CompetitionParticipation.objects.bulk_create([
+            CompetitionParticipation(competition=competitions[i % len(competitions)], bot_id=bot_id,
+                                     slug=f'benchmark_{run}_bot{bot_id}')
+            for i, bot_id in enumerate(bot_ids)])
+        # bulk inserts skip the signals which maintain these
+        Competition.update_active_participant_counts([competition.id for competition in competitions])
+
+        tokens = []
+        for i in range(arenaclient_count):
+            arenaclient = ArenaClient.objects.create(username=f'benchmark_arenaclient{i}_{run}',
+                                                     email=f'benchmark_arenaclient{i}_{run}@dev.aiarena.net',
+                                                     type='ARENA_CLIENT', trusted=True, owner=owner)
+            tokens.append(Token.objects.create(user=arenaclient).key)
+        return tokens
+
+    def _run_arenaclient(self, token, matches) -> dict:
+        run = {'next_match': [], 'submit_result': [], 'no_match': 0, 'errors': 0}
+        client = AcApiTestingClient(token)
+        try:
+            played = 0
+            attempts = 0
+            while played < matches and attempts < matches * 10:
+                attempts += 1
+                response = self._timed(run['next_match'], client.post_to_matches)
+                if response.status_code != 201:
+                    run['no_match'] += 1
+                    time.sleep(0.1)  # let other arena clients finish their matches
+                    continue
+                try:
+                    self._timed(run['submit_result'],
+                                lambda: client.submit_result(response.data['id'], random.choice(self._RESULT_TYPES)))
+                    played += 1
+                except AssertionError:
+                    run['errors'] += 1
+        finally:
+            connection.close()  # each thread has its own connection
+        return run
+
+    @staticmethod
+    def _timed(samples: list, call):
+        lock_time_before = Command._get_lock_time()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = call()
+            latency = time.perf_counter() - started
+        lock_time_after = Command._get_lock_time()
+        lock_time = lock_time_after - lock_time_before \
+            if lock_time_before is not None and lock_time_after is not None else None
+        samples.append((latency, len(queries), lock_time))
+        return response
+
+    @staticmethod
+    def _get_lock_time():
+        """
+        The time, in ms, the statements run on this thread's connection have spent waiting for locks so far,
+        or None where the database can't tell. MySQL only counts row lock waits in this from 8.0.28.
+        """
+        if connection.vendor != 'mysql':
+            return None
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT COALESCE(SUM(SUM_LOCK_TIME), 0) "
+                               "FROM performance_schema.events_statements_summary_by_thread_by_event_name "
+                               "WHERE THREAD_ID = sys.ps_thread_id(CONNECTION_ID())")
+                return cursor.fetchone()[0] / 10 ** 9  # picoseconds
+        except DatabaseError:
+            return None  # e.g. the performance schema is disabled
+
+    @staticmethod
+    def _percentile(values, percentile):
+        values = sorted(values)
+        return values[round(percentile / 100 * (len(values) - 1))]
+
+    def _report(self, runs, elapsed):
+        self.stdout.write(f"Completed in {elapsed:.2f}s.")
+        for call in ['next_match', 'submit_result']:
+            samples = [sample for run in runs for sample in run[call]]
+            if len(samples) == 0:
+                self.stdout.write(f"{call}: no calls")
+                continue
+            latencies = [latency * 1000 for latency, _, _ in samples]
+            query_counts = [queries for _, queries, _ in samples]
+            lock_times = [lock_time for _, _, lock_time in samples if lock_time is not None]
+            self.stdout.write(f"{call}: {len(samples)} calls, {len(samples) / elapsed:.1f}/s, "
+                              f"p50 {self._percentile(latencies, 50):.1f}ms, "
+                              f"p99 {self._percentile(latencies, 99):.1f}ms, "
+                              f"queries per call avg {sum(query_counts) / len(query_counts):.1f} "
+                              f"max {max(query_counts)}")
+            if len(lock_times) > 0:
+                self.stdout.write(f"{call} lock wait per call: avg {sum(lock_times) / len(lock_times):.1f}ms, "
+                                  f"p99 {self._percentile(lock_times, 99):.1f}ms, max {max(lock_times):.1f}ms")
+            else:
+                self.stdout.write(f"{call} lock wait per call: not available for this database")
+        played = sum(len(run['submit_result']) for run in runs)
+        self.stdout.write(f"Matches played: {played} ({played / elapsed:.1f}/s), "
+                          f"requests without a match: {sum(run['no_match'] for run in runs)}, "
+                          f"failed result submissions: {sum(run['errors'] for run in runs)}")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from aiarena.core.models import MatchTag, Tag
+
+
+class Command(BaseCommand):
+    help = "Cleanup and remove match tags which are no longer on any match, and tags which are no longer used. " \
+           "Removing tags from a match cleans them up straight away, but deleting a match or user doesn't."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose', action='store_true', help="Output information with each action.")
+
+    def handle(self, *args, **options):
+        self.stdout.write('Cleaning up tags...')
+        match_tag_count, tag_count = self.cleanup_tags(options['verbose'])
+        self.stdout.write('Cleaned up {0} match tags and {1} tags.'.format(match_tag_count, tag_count))
+
+    def cleanup_tags(self, verbose):
+        match_tag_count = MatchTag.objects.filter(match__isnull=True).delete()[1].get(MatchTag._meta.label, 0)
+        if verbose:
+            self.stdout.write(f'{match_tag_count} match tags deleted.')
+        tag_count = Tag.objects.filter(matchtag__isnull=True).delete()[1].get(Tag._meta.label, 0)
+        if verbose:
+            self.stdout.write(f'{tag_count} tags deleted.')
+        return match_tag_count, tag_count
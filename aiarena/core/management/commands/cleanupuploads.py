@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from aiarena.core.models import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = "Cleanup and remove chunked uploads which were abandoned, or finished but never used."
+
+    _DEFAULT_DAYS_LOOKBACK = 2
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help="Number of days into the past to start cleaning from. Default is {0}.".format(
+                                self._DEFAULT_DAYS_LOOKBACK))
+        parser.add_argument('--verbose', action='store_true', help="Output information with each action.")
+
+    def handle(self, *args, **options):
+        if options['days'] is not None:
+            days = options['days']
+        else:
+            days = self._DEFAULT_DAYS_LOOKBACK
+        self.stdout.write('Cleaning up uploads starting from {0} days into the past...'.format(days))
+        self.stdout.write('Cleaned up {0} uploads.'.format(self.cleanup_uploads(days, options['verbose'])))
+
+    def cleanup_uploads(self, days, verbose):
+        uploads = list(ChunkedUpload.objects.filter(created__lt=timezone.now() - timedelta(days=days)))
+        for upload in uploads:
+            if upload.file:
+                upload.file.delete(save=False)
+            upload.delete()
+            if verbose:
+                self.stdout.write(f'Upload {upload.id} deleted.')
+        return len(uploads)
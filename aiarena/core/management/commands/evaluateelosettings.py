@@ -0,0 +1,73 @@
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from aiarena.core.models import Bot, Competition, Result
+from aiarena.core.stats.elo_replay import EloReplay
+from aiarena.settings import ELO_K, ELO_START_VALUE
+
+
+class Command(BaseCommand):
+    help = "Replays a competition's results under several ELO K values at once and reports how well each " \
+           "would have predicted the results, along with the rankings each would have produced. " \
+           "Nothing is written to the database."
+
+    _DEFAULT_TOP = 10
+    # keeps the log-loss finite when a rating system is certain and wrong
+    _EPSILON = 1e-15
+
+    def add_arguments(self, parser):
+        parser.add_argument('competition_id', type=int, help="The competition to replay.")
+        parser.add_argument('--k', type=float, nargs='+', default=sorted({4, ELO_K, 16, 32}),
+                            help=f"The K values to evaluate. Default is 4, {ELO_K} (the current value), 16 and 32.")
+        parser.add_argument('--top', type=int, default=self._DEFAULT_TOP,
+                            help=f"How many of the top ranked bots to list for each K value. "
+                                 f"Default is {self._DEFAULT_TOP}.")
+
+    def handle(self, *args, **options):
+        if not Competition.objects.filter(id=options['competition_id']).exists():
+            raise CommandError(f"Competition {options['competition_id']} does not exist.")
+
+        results = EloReplay.load_results(options['competition_id'])
+        bot_ids = sorted({bot_id for result in results for bot_id in (result[2], result[4])})
+        bot_indexes = {bot_id: index for index, bot_id in enumerate(bot_ids)}
+        k_values = np.array(options['k'], dtype=float)
+
+        # one row of ratings per K value, so every K value is replayed in the same pass over the results.
+        # Everyone starts on the same rating and every change is zero-sum,
+        # so the starting value itself doesn't affect the predictions.
+        ratings = np.full((len(k_values), len(bot_ids)), float(ELO_START_VALUE))
+        log_loss = np.zeros(len(k_values))
+        scored_results = 0
+        winners = {result_type: Result(type=result_type).winner_participant_number for result_type, _ in Result.TYPES}
+        for result_type, _, bot1_id, _, bot2_id in results:
+            winner = winners[result_type]
+            if winner == 0 and result_type != 'Tie':
+                continue  # the result didn't affect ELO, e.g. the match was cancelled
+
+            # replay from the same perspective as Result.adjust_elo, so the ratings round identically
+            if winner == 2:
+                first, second = bot_indexes[bot2_id], bot_indexes[bot1_id]
+            else:
+                first, second = bot_indexes[bot1_id], bot_indexes[bot2_id]
+            score = 0.5 if winner == 0 else 1.0
+            expected = 1.0 / (1.0 + 10.0 ** ((ratings[:, second] - ratings[:, first]) / 400.0))
+
+            predicted = np.clip(expected, self._EPSILON, 1 - self._EPSILON)
+            log_loss -= score * np.log(predicted) + (1 - score) * np.log(1 - predicted)
+            scored_results += 1
+
+            # rounded half to even, like Python's round()
+            delta = np.round(k_values * (score - expected))
+            ratings[:, first] += delta
+            ratings[:, second] -= delta
+
+        self.stdout.write(f"Replayed {scored_results} of {len(results)} results for {len(bot_ids)} bots.")
+        if scored_results == 0:
+            return
+
+        bot_names = dict(Bot.objects.filter(id__in=bot_ids).values_list('id', 'name'))
+        for setting, k in enumerate(k_values):
+            self.stdout.write(f"K={k:g}: log-loss {log_loss[setting] / scored_results:.4f}"
+                              f"{' (current)' if k == ELO_K else ''}")
+            for rank, index in enumerate(np.argsort(-ratings[setting], kind='stable')[:options['top']], start=1):
+                self.stdout.write(f"  {rank}. {bot_names[bot_ids[index]]} {int(ratings[setting, index])}")
@@ -1,13 +1,39 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
 
 from aiarena.core.models import Bot, CompetitionParticipation, Competition
 from aiarena.core.stats.stats_generator import StatsGenerator
 
 
+def generate_elo_graphs(sp_id: int, latest_result_id):
+    """
+    Renders a participant's ELO graphs and records latest_result_id as the latest result they include.
+    Returns the error if it fails, so one bot can't stop the others.
+    """
+    try:
+        with transaction.atomic():
+            sp = CompetitionParticipation.objects.select_for_update().get(id=sp_id)
+            StatsGenerator.update_elo_graphs(sp)
+            CompetitionParticipation.objects.filter(id=sp_id).update(stats_last_result_id=latest_result_id)
+        return None
+    except Exception:
+        return traceback.format_exc()
+
+
 class Command(BaseCommand):
-    help = "Runs the generate stats db routine to generate bot stats."
+    help = "Recomputes bot stats from scratch and renders their ELO graphs. " \
+           "The stats are otherwise kept up to date as results are submitted, so this mostly serves to repair them. " \
+           "Only bots with results since the last run are processed, unless --full is supplied."
 
+    # Results don't necessarily commit in id order, so a result with a lower id than one this run sees might not
+    # be visible yet. The run only records results older than this as processed, so any committed later are picked
+    # up by the next run.
+    _RESULT_SETTLE_TIME = timedelta(minutes=10)
 
     def add_arguments(self, parser):
         parser.add_argument('--botid', type=int, help="The bot id to generate the stats for. "
@@ -17,6 +43,10 @@ class Command(BaseCommand):
                                                        "If this isn't supplied all "
                                                        "open competitions will be used")
         parser.add_argument('--allcompetitions', action='store_true', help="Run this for all competition")
+        parser.add_argument('--full', action='store_true',
+                            help="Process every bot, including those without any results since the last run.")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Number of processes to render the bots' ELO graphs with. Default is 1.")
 
     def handle(self, *args, **options):
         if options['allcompetitions']:
@@ -32,11 +62,50 @@ class Command(BaseCommand):
             competitions = competitions.filter(participations__bot_id=bot_id)
 
         self.stdout.write(f'looping   {len(competitions)} Competitions')
+        participations = []
+        settled_before = timezone.now() - self._RESULT_SETTLE_TIME
         for competition in competitions:
-            for sp in CompetitionParticipation.objects.filter(competition_id=competition.id):
-                with transaction.atomic():
-                    sp.lock_me()
-                    self.stdout.write(f'Generating current competition stats for bot {sp.bot_id}...')
-                    StatsGenerator.update_stats(sp)
+            latest_result_ids = StatsGenerator.get_latest_result_ids(competition.id)
+            settled_result_ids = StatsGenerator.get_latest_result_ids(competition.id, settled_before)
+            competition_participations = [
+                (sp_id, sp_bot_id, settled_result_ids.get(sp_bot_id))
+                for sp_id, sp_bot_id, stats_last_result_id in CompetitionParticipation.objects
+                .filter(competition=competition).values_list('id', 'bot_id', 'stats_last_result_id')
+                if options['full'] or (latest_result_ids.get(sp_bot_id) or 0) > (stats_last_result_id or 0)]
+            if len(competition_participations) == 0:
+                self.stdout.write(f'No new results for competition {competition.id}.')
+                continue
+
+            with transaction.atomic():
+                self.stdout.write(f'Generating current competition stats for competition {competition.id} '
+                                  f'({len(competition_participations)} bots)...')
+                StatsGenerator.update_competition_stats(
+                    competition.id, None if options['full'] else [sp_bot_id for _, sp_bot_id, _
+                                                                  in competition_participations])
+            participations.extend(competition_participations)
+
+        failures = []
+        if options['workers'] > 1:
+            # the worker processes must open their own database connections rather than share ours
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+                errors = executor.map(generate_elo_graphs, [sp_id for sp_id, _, _ in participations],
+                                      [latest_result_id for _, _, latest_result_id in participations])
+                for (sp_id, sp_bot_id, _), error in zip(participations, errors):
+                    if error is None:
+                        self.stdout.write(f'Generated ELO graphs for bot {sp_bot_id}.')
+                    else:
+                        failures.append((sp_id, sp_bot_id, error))
+        else:
+            for sp_id, sp_bot_id, latest_result_id in participations:
+                self.stdout.write(f'Generating ELO graphs for bot {sp_bot_id}...')
+                error = generate_elo_graphs(sp_id, latest_result_id)
+                if error is not None:
+                    failures.append((sp_id, sp_bot_id, error))
+
+        if failures:
+            for sp_id, sp_bot_id, error in failures:
+                self.stderr.write(f'Generating ELO graphs for bot {sp_bot_id} (participation {sp_id}) failed:\n{error}')
+            raise CommandError(f'Generating ELO graphs failed for {len(failures)} of {len(participations)} bots.')
 
         self.stdout.write('Done')
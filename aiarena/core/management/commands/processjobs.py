@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from aiarena.core.api import Jobs
+
+
+class Command(BaseCommand):
+    help = "Runs queued background jobs, such as the post-processing of submitted results. " \
+           "Several workers can be run at once."
+
+    _DEFAULT_SLEEP = 1.0
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Run the jobs which are currently due and then exit, instead of waiting for more.")
+        parser.add_argument('--sleep', type=float, default=self._DEFAULT_SLEEP,
+                            help=f"Seconds to wait before checking again when there are no jobs due. "
+                                 f"Default is {self._DEFAULT_SLEEP}.")
+
+    def handle(self, *args, **options):
+        jobs_run = 0
+        while True:
+            if Jobs.run_next():
+                jobs_run += 1
+                continue
+
+            deleted = Jobs.delete_finished_jobs()
+            if deleted and options['verbosity'] > 1:
+                self.stdout.write(f'Deleted {deleted} finished jobs.')
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(f'Ran {jobs_run} jobs.')
@@ -1,73 +1,66 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction, connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
-from aiarena.core.models import Match, Competition, CompetitionParticipation, Round, MatchParticipation, Result
-from aiarena.settings import ELO_START_VALUE
+from aiarena.core.models import Competition, CompetitionParticipation, MatchParticipation
+from aiarena.core.stats.elo_replay import EloReplay
+from aiarena.settings import ELO_START_VALUE, ELO
 
 
 class Command(BaseCommand):
-    help = 'Recalculates a competition\'s ELOs based on all matches for that competition. This can take a VERY long time. ' \
+    help = 'Recalculates a competition\'s ELOs based on all matches for that competition. ' \
            'WARNING! Nothing else should attempt to modify the database while this runs.'
 
+    _BATCH_SIZE = 1000
+
     def add_arguments(self, parser):
         parser.add_argument('competition_id', type=int, help="The competition to recalculate.")
 
     def handle(self, *args, **options):
         self.stdout.write(f"Starting ELO re-calculation for competition id {options['competition_id']}...")
         with transaction.atomic():
-            self.stdout.write(f"Locking records...")
+            self.stdout.write("Locking records...")
             target_competition = Competition.objects.select_for_update().get(id=options['competition_id'])
             self.stdout.write(f"Competition id {target_competition.id} locked.")
-            competition_participants = CompetitionParticipation.objects.select_for_update().filter(competition=target_competition)
-            self.stdout.write(f"{competition_participants.count()} competition participants locked.")
-            matches = Match.objects.select_for_update().filter(round__competition=target_competition, result__isnull=False)\
-                .prefetch_related('matchparticipation_set', 'result').order_by('result__created')
-
-            self.stdout.write(f"{matches.count()} matches locked.")
+            competition_participants = list(CompetitionParticipation.objects.select_for_update()
+                                            .filter(competition=target_competition).only('id', 'bot_id', 'elo'))
+            self.stdout.write(f"{len(competition_participants)} competition participants locked.")
+
+            self.stdout.write("Loading results...")
+            results = EloReplay.load_results(target_competition.id)
+            self.stdout.write(f"{len(results)} results loaded.")
+
+            # every ELO is replayed from the starting ELO
+            ratings = {participant.bot_id: ELO_START_VALUE for participant in competition_participants}
+            missing_bot_ids = {bot_id for result in results for bot_id in (result[2], result[4])} - set(ratings)
+            if missing_bot_ids:
+                raise CommandError(f"Bots {sorted(missing_bot_ids)} have results in this competition "
+                                   "but are no longer participating in it.")
+
+            self.stdout.write("Recalculating all match ELOs...")
+            participations = []
+
+            def record_elos(result, p1_before, p1_after, p2_before, p2_after):
+                _, p1_id, _, p2_id, _ = result
+                participations.append(MatchParticipation(id=p1_id, starting_elo=p1_before, resultant_elo=p1_after,
+                                                         elo_change=p1_after - p1_before))
+                participations.append(MatchParticipation(id=p2_id, starting_elo=p2_before, resultant_elo=p2_after,
+                                                         elo_change=p2_after - p2_before))
+
+            EloReplay.replay(results, ratings, ELO, record_elos)
+            self.stdout.write("Recalculating all match ELOs...done")
+
+            self.stdout.write("Saving match ELOs...")
+            for start in range(0, len(participations), self._BATCH_SIZE):
+                MatchParticipation.objects.bulk_update(participations[start:start + self._BATCH_SIZE],
+                                                       ['starting_elo', 'resultant_elo', 'elo_change'])
+                self.stdout.write(f"Saving match ELOs...{min(start + self._BATCH_SIZE, len(participations))}"
+                                  f"/{len(participations)}", ending='\r')
+            self.stdout.write("Saving match ELOs...done")
 
-            self.stdout.write(f"Resetting all ELOs to starting ELO...", ending='\r')
             for participant in competition_participants:
-                participant.elo = ELO_START_VALUE
-                participant.save()
-            self.stdout.write(f"Resetting all ELOs to starting ELO...done")
-
-            self.stdout.write(f"Recalculating all match ELOs...0%", ending='\r')
-            count: int = 0
-            for match in matches:
-                count += 1
-                p1: MatchParticipation = match.participant1
-                p2: MatchParticipation = match.participant2
-
-                # Starting ELO
-                p1.starting_elo = p1.competition_participant.elo
-                p2.starting_elo = p2.competition_participant.elo
-                initial_elo_sum = p1.starting_elo + p2.starting_elo
-
-                match.result.adjust_elo()
-                p1.competition_participant.refresh_from_db()
-                p2.competition_participant.refresh_from_db()
-
-                # Resultant ELO
-                p1.resultant_elo = p1.competition_participant.elo
-                p2.resultant_elo = p2.competition_participant.elo
-                resultant_elo_sum = p1.resultant_elo + p2.resultant_elo
-
-                # ELO change
-                p1.elo_change = p1.resultant_elo - p1.starting_elo
-                p2.elo_change = p2.resultant_elo - p2.starting_elo
-
-                p1.save()
-                p2.save()
-
-                if initial_elo_sum != resultant_elo_sum:
-                    self.stdout.write(f"ERROR: Initial and resultant ELO sum mismatch: "
-                                    f"Match {match.id}. "
-                                    f"initial_elo_sum: {initial_elo_sum}. "
-                                    f"resultant_elo_sum: {resultant_elo_sum}. "
-                                    f"participant1.elo_change: {p1.elo_change}. "
-                                    f"participant2.elo_change: {p2.elo_change}")
-
-                self.stdout.write(f"Recalculating all match ELOs...{count/matches.count()*100}%", ending='\r')
-
-            self.stdout.write(f"Recalculating all match ELOs...done")
-            self.stdout.write(f"Job finished!")
+                participant.elo = ratings[participant.bot_id]
+            CompetitionParticipation.objects.bulk_update(competition_participants, ['elo'],
+                                                         batch_size=self._BATCH_SIZE)
+            # every participant started afresh and results only move ELO between them
+            Competition.objects.filter(id=target_competition.id).update(elo_drift=0)
+            self.stdout.write("Job finished!")
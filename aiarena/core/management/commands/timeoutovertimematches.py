@@ -5,8 +5,9 @@ from aiarena.core.api import Matches
 
 
 class Command(BaseCommand):
-    help = 'Time out any matches that have run overtime.'
+    help = 'Time out any matches that have run overtime and requeue matches with expired leases.'
 
     def handle(self, *args, **options):
         with transaction.atomic():
+            Matches.requeue_expired_leases()
             Matches.timeout_overtime_bot_games()
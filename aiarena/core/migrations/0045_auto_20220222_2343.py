@@ -1,13 +1,20 @@
 # Generated by Django 3.2.9 on 2022-02-22 23:43
 
 from django.db import migrations
-
-from aiarena.core.models import Competition
+from wiki.models import Article, ArticleRevision
 
 
 def create_competition_wiki_articles(apps, schema_editor):
-    for competition in Competition.objects.all():
-        competition.save()  # trigger the presave hook that creates the article
+    # Use the historical model: the current one has columns which don't exist yet at this point.
+    Competition = apps.get_model('core', 'Competition')
+    for competition in Competition.objects.filter(wiki_article__isnull=True):
+        # the same article Competition.create_competition_wiki_article creates
+        article = Article(owner=None, group=None, group_read=True, group_write=False, other_read=True,
+                          other_write=False)
+        article.add_revision(ArticleRevision(title=competition.name), save=True)
+        article.save()
+        competition.wiki_article_id = article.id
+        competition.save(update_fields=['wiki_article'])
 
 class Migration(migrations.Migration):
 
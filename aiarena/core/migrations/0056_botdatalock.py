@@ -0,0 +1,35 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def lock_bots_in_current_matches(apps, schema_editor):
+    MatchParticipation = apps.get_model('core', 'MatchParticipation')
+    BotDataLock = apps.get_model('core', 'BotDataLock')
+    participations = MatchParticipation.objects.filter(match__started__isnull=False, match__result__isnull=True,
+                                                       use_bot_data=True, update_bot_data=True)
+    BotDataLock.objects.bulk_create([BotDataLock(bot_id=p.bot_id, match_id=p.match_id) for p in participations])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0055_match_first_started'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotDataLock',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('bot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='data_locks', to='core.bot')),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bot_data_locks', to='core.match')),
+            ],
+            options={
+                'unique_together': {('bot', 'match')},
+            },
+        ),
+        migrations.RunPython(lock_bots_in_current_matches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0056_botdatalock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='lease_expires',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0057_match_lease_expires'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='competition',
+            name='create_matches_on_demand',
+            field=models.BooleanField(blank=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='pending_pairings',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:48
+
+from django.db import migrations, models
+
+
+def count_active_participants(apps, schema_editor):
+    Competition = apps.get_model('core', 'Competition')
+    CompetitionParticipation = apps.get_model('core', 'CompetitionParticipation')
+    for competition in Competition.objects.all():
+        competition.active_participant_count = CompetitionParticipation.objects.filter(competition=competition,
+                                                                                       active=True).count()
+        competition.save(update_fields=['active_participant_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0058_round_pending_pairings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='competition',
+            name='active_participant_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='competition',
+            name='scheduling_pass',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_active_participants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0060_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='competitionparticipation',
+            name='stats_last_result_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0061_competitionparticipation_stats_last_result_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='competitionparticipation',
+            name='elo_graph_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
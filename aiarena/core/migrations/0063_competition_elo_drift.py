@@ -0,0 +1,32 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:06
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+from aiarena.settings import ELO_START_VALUE
+
+
+def count_elo_drift(apps, schema_editor):
+    Competition = apps.get_model('core', 'Competition')
+    CompetitionParticipation = apps.get_model('core', 'CompetitionParticipation')
+    for competition in Competition.objects.all():
+        totals = CompetitionParticipation.objects.filter(competition=competition) \
+            .aggregate(elo_sum=Sum('elo'), participant_count=Count('id'))
+        competition.elo_drift = (totals['elo_sum'] or 0) - totals['participant_count'] * ELO_START_VALUE
+        competition.save(update_fields=['elo_drift'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0062_competitionparticipation_elo_graph_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='competition',
+            name='elo_drift',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_elo_drift, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.15 on 2026-10-18 09:12
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_match_tags(apps, schema_editor):
+    MatchTag = apps.get_model('core', 'MatchTag')
+    Match = apps.get_model('core', 'Match')
+    MatchTags = Match.tags.through
+    for duplicate in MatchTag.objects.values('user_id', 'tag_id').order_by() \
+            .annotate(keep_id=Min('id'), match_tag_count=Count('id')).filter(match_tag_count__gt=1):
+        duplicate_ids = list(MatchTag.objects.filter(user_id=duplicate['user_id'], tag_id=duplicate['tag_id'])
+                             .exclude(id=duplicate['keep_id']).values_list('id', flat=True))
+        # move the duplicates' matches over to the match tag being kept, unless it's already on them
+        kept_on = MatchTags.objects.filter(matchtag_id=duplicate['keep_id']).values_list('match_id', flat=True)
+        MatchTags.objects.bulk_create(
+            [MatchTags(match_id=match_id, matchtag_id=duplicate['keep_id'])
+             for match_id in set(MatchTags.objects.filter(matchtag_id__in=duplicate_ids)
+                                 .exclude(match_id__in=kept_on).values_list('match_id', flat=True))])
+        MatchTag.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0063_competition_elo_drift'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_match_tags, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='matchtag',
+            unique_together={('user', 'tag')},
+        ),
+    ]
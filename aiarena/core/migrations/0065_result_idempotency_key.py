@@ -0,0 +1,22 @@
+# Generated by Django 3.2.15 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0064_matchtag_unique_user_tag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='result',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='result',
+            unique_together={('submitted_by', 'idempotency_key')},
+        ),
+    ]
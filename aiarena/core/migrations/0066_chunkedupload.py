@@ -0,0 +1,32 @@
+# Generated by Django 3.2.15 on 2026-10-18 11:20
+
+import aiarena.core.models.chunked_upload
+import aiarena.core.storage
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import private_storage.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0065_result_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(default='upload', max_length=100)),
+                ('file', private_storage.fields.PrivateFileField(blank=True, null=True, storage=aiarena.core.storage.OverwritePrivateStorage(base_url='/'), upload_to=aiarena.core.models.chunked_upload.chunked_upload_upload_to)),
+                ('size', models.BigIntegerField(default=0)),
+                ('md5hash', models.CharField(editable=False, max_length=32, null=True)),
+                ('status', models.CharField(choices=[('in_progress', 'In progress'), ('complete', 'Complete')], default='in_progress', max_length=16)),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunked_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
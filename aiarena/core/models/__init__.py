@@ -1,12 +1,15 @@
 from .arena_client import ArenaClient
 from .arena_client_status import ArenaClientStatus
 from .bot import Bot
+from .bot_data_lock import BotDataLock
+from .chunked_upload import ChunkedUpload
 from .competition import Competition
 from .competition_bot_matchup_stats import CompetitionBotMatchupStats
 from .competition_bot_map_stats import CompetitionBotMapStats
 from .competition_participation import CompetitionParticipation
 from .game import Game
 from .game_mode import GameMode
+from .job import Job
 from .map import Map
 from .map_pool import MapPool
 from .match import Match
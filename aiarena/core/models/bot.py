@@ -5,7 +5,7 @@ from constance import config
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
 from django.db.models import Sum
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
@@ -16,6 +16,7 @@ from private_storage.fields import PrivateFileField
 from wiki.models import Article, ArticleRevision
 
 from aiarena.api.arenaclient.exceptions import NoCurrentlyAvailableCompetitions
+from aiarena.core.d_utils import random_pick, invalidate_random_picks
 from aiarena.core.storage import OverwritePrivateStorage
 from aiarena.core.utils import calculate_md5_django_filefield
 from aiarena.core.validators import validate_bot_name, validate_bot_zip_file
@@ -141,27 +142,17 @@ class Bot(models.Model, LockableModelMixin):
 
     def bot_data_is_currently_frozen(self):
         # dont alter bot_data while the data is locked in a match, unless there was no bot_data initially
-        matches = Match.objects.only('id').filter(matchparticipation__bot=self, started__isnull=False,
-                                                  result__isnull=True)
-        data_frozen = False
-        for match in matches:
-            for p in match.matchparticipation_set.filter(bot=self):
-                if p.use_bot_data and p.update_bot_data:
-                    data_frozen = True  # todo: maybe we can cache this flag
-                    break
-        return self.bot_data and data_frozen
+        return self.bot_data and self.data_locks.exists()
 
     @staticmethod
     def get_random_active():
-        # todo: apparently this is really slow
-        # https://stackoverflow.com/questions/962619/how-to-pull-a-random-record-using-djangos-orm#answer-962672
-        return Bot.objects.filter(competition_participations__active=True).order_by('?').first()
+        return random_pick(Bot.objects.filter(competition_participations__active=True), 'bots', 'active')
 
     def get_random_active_excluding_self(self):
         from ..api import Bots  # avoid circular reference
         if Bots.get_active().count() <= 1:
             raise RuntimeError("I am the only bot.")
-        return Bots.get_active().exclude(id=self.id).order_by('?').first()
+        return random_pick(Bots.get_active(), 'bots', 'active', exclude_pks=(self.id,))
 
     def get_active_excluding_self(self):
         """Returns a queryset of active bots, excluding this one."""
@@ -173,7 +164,7 @@ class Bot(models.Model, LockableModelMixin):
     def get_random_excluding_self(self):
         if Bot.objects.all().count() <= 1:
             raise RuntimeError("I am the only bot.")
-        return Bot.objects.exclude(id=self.id).order_by('?').first()
+        return random_pick(Bot.objects.all(), 'bots', 'all', exclude_pks=(self.id,))
 
     @cached_property
     def get_absolute_url(self):
@@ -309,3 +300,13 @@ def post_save_bot(sender, instance, created, **kwargs):
         instance.save()
         post_save.connect(pre_save_bot, sender=sender)
 
+
+@receiver(post_save, sender=Bot)
+def post_save_bot_invalidate_random_picks(sender, instance, created, **kwargs):
+    if created:
+        invalidate_random_picks('bots')
+
+
+@receiver(post_delete, sender=Bot)
+def post_delete_bot(sender, instance, **kwargs):
+    invalidate_random_picks('bots')
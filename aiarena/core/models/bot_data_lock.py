@@ -0,0 +1,61 @@
+import logging
+
+from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from aiarena.core.d_utils import notify_match_availability_changed
+from .bot import Bot
+from .match import Match
+
+logger = logging.getLogger(__name__)
+
+
+class BotDataLock(models.Model):
+    """
+    Index of the bots whose data is currently locked by an in-progress match.
+    A row exists for every participation of a started, unfinished match which both uses and updates the bot's data.
+    Rows are added when a match starts and removed once the match has a result
+    (submitted, cancelled or timed out), so looking up whether a bot is busy doesn't require scanning matches.
+    """
+    bot = models.ForeignKey(Bot, on_delete=models.CASCADE, related_name='data_locks')
+    match = models.ForeignKey(Match, on_delete=models.CASCADE, related_name='bot_data_locks')
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = (('bot', 'match'),)
+
+    def __str__(self):
+        return f'{self.bot_id} locked by match {self.match_id}'
+
+    @staticmethod
+    def get_locked_bot_ids(bot_ids, excluding_match=None) -> set:
+        """Returns the subset of the supplied bot ids that are currently locked by a match."""
+        locks = BotDataLock.objects.filter(bot_id__in=bot_ids)
+        if excluding_match is not None:
+            locks = locks.exclude(match=excluding_match)
+        return set(locks.values_list('bot_id', flat=True))
+
+    @staticmethod
+    def get_data_frozen_bot_ids(bot_ids) -> set:
+        """Returns the subset of the supplied bot ids that have bot data which is currently frozen by a match."""
+        return set(BotDataLock.objects.filter(bot_id__in=bot_ids)
+                   .exclude(bot__bot_data__isnull=True).exclude(bot__bot_data='')
+                   .values_list('bot_id', flat=True))
+
+    @staticmethod
+    def lock_for_match(match: Match, participations):
+        BotDataLock.objects.bulk_create([BotDataLock(bot_id=p.bot_id, match=match) for p in participations
+                                         if p.use_bot_data and p.update_bot_data])
+
+    @staticmethod
+    def release_for_match(match_id: int):
+        BotDataLock.objects.filter(match_id=match_id).delete()
+
+
+@receiver(post_save, sender='core.Result')
+def post_save_result_release_bot_data_locks(sender, instance, created, **kwargs):
+    # Any result, including a cancellation or timeout, finishes the match and so frees its bots.
+    if created:
+        BotDataLock.release_for_match(instance.match_id)
+        notify_match_availability_changed()
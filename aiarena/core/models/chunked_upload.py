@@ -0,0 +1,106 @@
+import io
+import logging
+import os
+import shutil
+import uuid
+
+from django.core.files import File
+from django.db import models
+from django.utils import timezone
+from private_storage.fields import PrivateFileField
+
+from aiarena.core.storage import OverwritePrivateStorage
+from aiarena.core.utils import calculate_md5_django_filefield
+from .user import User
+
+logger = logging.getLogger(__name__)
+
+
+def chunked_upload_upload_to(instance, filename):
+    return '/'.join(['uploads', str(instance.user_id), str(instance.id)])
+
+
+class AttachableUpload(File):
+    """
+    A finished upload being attached to another model's file field.
+    Like a large request upload spooled to disk, the storage moves it into place rather than copying it.
+    What gets moved is a link to (or copy of) the upload's file, so the upload survives a rolled back transaction.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def discard(self):
+        """Closes the file, and removes it if it was never moved into place."""
+        self.close()
+        if os.path.exists(self.temporary_file_path()):
+            os.remove(self.temporary_file_path())
+
+
+class ChunkedUpload(models.Model):
+    """
+    A file uploaded over several requests, so a dropped connection only loses the chunk in flight.
+    Each chunk is written straight to the file in storage. Once finished, the upload can be referred to
+    when submitting a result, instead of sending the file again.
+    """
+    IN_PROGRESS = 'in_progress'
+    COMPLETE = 'complete'
+    STATUSES = (
+        (IN_PROGRESS, 'In progress'),
+        (COMPLETE, 'Complete'),
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    filename = models.CharField(max_length=100, default='upload')
+    file = PrivateFileField(upload_to=chunked_upload_upload_to, storage=OverwritePrivateStorage(base_url='/'),
+                            blank=True, null=True)
+    size = models.BigIntegerField(default=0)
+    """The number of bytes received so far, which is where the next chunk must start."""
+    md5hash = models.CharField(max_length=32, editable=False, null=True)
+    status = models.CharField(max_length=16, choices=STATUSES, default=IN_PROGRESS)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    finished = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.filename} ({self.id})'
+
+    @property
+    def _path(self):
+        return self.file.storage.path(self.file.name)
+
+    def append(self, stream, block_size=2 ** 20):
+        """Writes everything read from the stream onto the end of the file, without holding it in memory."""
+        if not self.file:
+            self.file.name = chunked_upload_upload_to(self, self.filename)
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            open(self._path, 'wb').close()
+
+        with open(self._path, 'r+b') as destination:
+            # discard anything left over from a chunk which was cut off part way through
+            destination.truncate(self.size)
+            destination.seek(self.size)
+            while True:
+                data = stream.read(block_size)
+                if not data:
+                    break
+                destination.write(data)
+                self.size += len(data)
+
+    def finish(self):
+        """Marks the upload as complete and records the MD5 hash of its file."""
+        if not self.file:
+            self.append(io.BytesIO())
+        self.md5hash = calculate_md5_django_filefield(self.file)
+        self.status = ChunkedUpload.COMPLETE
+        self.finished = timezone.now()
+
+    def open_for_attaching(self) -> AttachableUpload:
+        """
+        Opens a hard link to the file (or a copy, where the storage doesn't support them), to be assigned to
+        another model's file field, which will take it over when saved. It must be discarded afterwards.
+        """
+        path = f'{self._path}.{uuid.uuid4().hex}'
+        try:
+            os.link(self._path, path)
+        except OSError:
+            shutil.copyfile(self._path, path)
+        return AttachableUpload(open(path, 'rb'), name=self.filename)
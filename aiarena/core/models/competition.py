@@ -1,6 +1,7 @@
 import logging
 
 from django.db import models, transaction
+from django.db.models import F
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from django.urls import reverse
@@ -10,6 +11,7 @@ from django.utils.safestring import mark_safe
 from wiki.models import Article, ArticleRevision
 from django.core.validators import MinValueValidator
 
+from aiarena.core.d_utils import invalidate_random_picks, notify_match_availability_changed
 from .bot_race import BotRace
 from .game_mode import GameMode
 from .mixins import LockableModelMixin
@@ -62,10 +64,51 @@ class Competition(models.Model, LockableModelMixin):
     n_placements = models.IntegerField(default=0, validators=[MinValueValidator(0)], blank=True)
     # List of which bot races are playable in this competition. When left blank, all races are playable.
     playable_races = models.ManyToManyField(BotRace, blank=True)
+    # When set, a new round only stores its pairings and matches are created from them as arena clients need work,
+    # instead of every match in the round being created up front.
+    create_matches_on_demand = models.BooleanField(default=False, blank=True)
+    # Number of active participants, kept up to date as participations change. Used to weight match scheduling.
+    active_participant_count = models.IntegerField(default=0, editable=False)
+    # Fair-share scheduling position. Advances each time a match in this competition starts, by less the more active
+    # participants the competition has. Arena clients are offered the competition furthest behind first.
+    scheduling_pass = models.FloatField(default=0, editable=False)
+    # Net ELO the participations have gained or lost relative to everyone starting on ELO_START_VALUE, kept up to date
+    # as participations and results change. Results only move ELO between bots, so this should always be zero.
+    elo_drift = models.IntegerField(default=0, editable=False)
+
+    # Only ever written with update(). save() leaves them out, see below.
+    COUNTER_FIELDS = ('active_participant_count', 'scheduling_pass', 'elo_drift')
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Saves every field except the COUNTER_FIELDS, unless update_fields says otherwise.
+        The counters are only ever written with update() on their own, so saving an instance which was loaded before
+        they last changed mustn't overwrite them. Include them in update_fields to save them anyway.
+        """
+        if not self._state.adding and len(args) == 0 and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in Competition.COUNTER_FIELDS]
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def update_active_participant_counts(competition_ids):
+        from . import CompetitionParticipation  # avoid circular reference
+        # the set of active bots changed - once committed, so a pick made meanwhile can't cache the old set again
+        transaction.on_commit(lambda: invalidate_random_picks('bots'))
+        notify_match_availability_changed()
+        for competition_id in set(competition_ids):
+            Competition.objects.filter(id=competition_id).update(
+                active_participant_count=CompetitionParticipation.objects.filter(competition_id=competition_id,
+                                                                                 active=True).count())
+
+    @staticmethod
+    def add_elo_drift(competition_id, amount):
+        if amount != 0:
+            Competition.objects.filter(id=competition_id).update(elo_drift=F('elo_drift') + amount)
+
     def should_split_divisions(self, n_bots):
         return self.n_divisions < self.target_n_divisions and n_bots >= (self.n_divisions+1)*self.target_division_size
 
@@ -114,6 +157,7 @@ class Competition(models.Model, LockableModelMixin):
 
             self.status = 'open'
             self.save()
+            notify_match_availability_changed()
             return None
         else:
             return "Cannot open a competition with a status of {}".format(self.status)
@@ -137,6 +181,7 @@ class Competition(models.Model, LockableModelMixin):
             # deactivate bots in this competition
             from . import CompetitionParticipation  # avoid circular reference
             CompetitionParticipation.objects.filter(competition=self).update(active=False)
+            Competition.update_active_participant_counts([self.id])
 
     def get_absolute_url(self):
         return reverse('competition', kwargs={'pk': self.pk})
@@ -2,6 +2,8 @@ import logging
 
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator
 from private_storage.fields import PrivateFileField
@@ -38,7 +40,11 @@ class CompetitionParticipation(models.Model, LockableModelMixin):
     crash_count = models.IntegerField(default=0)
     elo_graph = models.FileField(upload_to=elo_graph_upload_to, storage=OverwriteStorage(), blank=True, null=True)
     elo_graph_update_plot = PrivateFileField(upload_to=elo_graph_update_plot_upload_to, storage=OverwritePrivateStorage(base_url='/'), blank=True, null=True)
+    elo_graph_hash = models.CharField(max_length=64, blank=True, null=True)
+    """A hash of the data the ELO graphs were rendered from, so unchanged graphs aren't rendered again."""
     highest_elo = models.IntegerField(blank=True, null=True)
+    stats_last_result_id = models.PositiveIntegerField(blank=True, null=True)
+    """The id of the latest result included in the stats and ELO graphs by the last generatestats run."""
     slug = models.SlugField(max_length=255, blank=True)
     active = models.BooleanField(default=True)
 
@@ -50,6 +56,13 @@ class CompetitionParticipation(models.Model, LockableModelMixin):
     division_num = models.IntegerField(default=DEFAULT_DIVISION, validators=[MinValueValidator(DEFAULT_DIVISION)])
     in_placements = models.BooleanField(default=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember whether this participation was active, so saves only recount active participants when it changes
+        instance._loaded_active = instance.__dict__.get('active')
+        return instance
+
     def validate_unique(self, exclude=None):
         if self.active:
             bot_limit = self.bot.user.get_active_bots_limit()
@@ -88,3 +101,19 @@ class CompetitionParticipation(models.Model, LockableModelMixin):
         return self.competition.playable_races.filter(id=bot_race.id).exists()
 
 
+@receiver(post_save, sender=CompetitionParticipation)
+def post_save_competition_participation(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        Competition.add_elo_drift(instance.competition_id, instance.elo - ELO_START_VALUE)
+    if update_fields is not None and 'active' not in update_fields:
+        return
+    active = instance.__dict__.get('active')
+    if created or getattr(instance, '_loaded_active', None) != active:
+        Competition.update_active_participant_counts([instance.competition_id])
+        instance._loaded_active = active
+
+
+@receiver(post_delete, sender=CompetitionParticipation)
+def post_delete_competition_participation(sender, instance, **kwargs):
+    Competition.add_elo_drift(instance.competition_id, ELO_START_VALUE - instance.elo)
+    Competition.update_active_participant_counts([instance.competition_id])
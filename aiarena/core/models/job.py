@@ -0,0 +1,41 @@
+import logging
+
+from django.db import models
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class Job(models.Model):
+    """
+    A unit of background work, such as the post-processing of a submitted result.
+    Jobs are queued in the same transaction as the change which caused them, so they are never lost,
+    and are run by the processjobs management command.
+    """
+    QUEUED = 'queued'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'Queued'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+    type = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    """Queueing a job with a key that already exists does nothing, so the same work is never queued twice."""
+    status = models.CharField(max_length=16, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    """The job won't be run before this time. Pushed back after each failed attempt."""
+    last_error = models.TextField(blank=True, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f'{self.type} ({self.idempotency_key})'
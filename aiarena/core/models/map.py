@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
 
+from aiarena.core.d_utils import invalidate_random_picks
 from aiarena.core.models.competition import Competition
 from aiarena.core.models.game_mode import GameMode
 from aiarena.core.storage import OverwriteStorage
@@ -22,3 +25,10 @@ class Map(models.Model):
 
     def __str__(self):
         return self.name
+
+
+@receiver(post_save, sender=Map)
+@receiver(post_delete, sender=Map)
+@receiver(m2m_changed, sender=Map.competitions.through)
+def invalidate_random_maps(sender, **kwargs):
+    invalidate_random_picks('maps')
@@ -1,5 +1,8 @@
 from django.db import models
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
 
+from aiarena.core.d_utils import invalidate_random_picks
 from aiarena.core.models import Map
 
 
@@ -11,3 +14,8 @@ class MapPool(models.Model):
 
     def __str__(self):
         return self.name
+
+
+@receiver(m2m_changed, sender=MapPool.maps.through)
+def invalidate_random_map_pool_maps(sender, **kwargs):
+    invalidate_random_picks('maps')
@@ -2,14 +2,14 @@ import logging
 from enum import Enum
 
 from django.db import models, transaction
-from django.db.models.signals import m2m_changed
+from django.db.models.signals import m2m_changed, post_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
-
+from aiarena.core.d_utils import notify_match_availability_changed
 from .map import Map
 from .mixins import LockableModelMixin, RandomManagerMixin
 from .round import Round
@@ -29,6 +29,9 @@ class Match(models.Model, LockableModelMixin, RandomManagerMixin):
     """The first time this match started. Different from the started field when multiple runs are attempted."""
     assigned_to = models.ForeignKey(User, on_delete=models.PROTECT, blank=True, null=True,
                                      related_name='assigned_matches')
+    lease_expires = models.DateTimeField(blank=True, null=True, editable=False, db_index=True)
+    """When the assigned arena client's lease on this match runs out, unless renewed by a heartbeat.
+    Matches with an expired lease are put back into the queue."""
     round = models.ForeignKey(Round, on_delete=models.CASCADE, blank=True, null=True)
     requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True,
                                      related_name='requested_matches')
@@ -49,7 +52,7 @@ class Match(models.Model, LockableModelMixin, RandomManagerMixin):
 
     @property
     def is_requested(self):
-        return self.requested_by is not None
+        return self.requested_by_id is not None
 
     @property
     def status(self):
@@ -134,10 +137,14 @@ class Match(models.Model, LockableModelMixin, RandomManagerMixin):
 
 
 @receiver(m2m_changed, sender=Match.tags.through)
-def delete_orphan_match_tags(sender, **kwargs):
-    # when something is removed from the m2m:
-    if kwargs['action'] == 'post_remove':
-        # select removed tags and check if they are not linked to any Match, and delete it
-        for mt in MatchTag.objects.filter(pk__in=kwargs['pk_set']):
-            if not mt.match_set.all():
-                mt.delete()
+def delete_orphan_match_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    # when something is removed from the m2m, delete whichever removed tags are no longer linked to any Match
+    if action == 'post_remove' and pk_set:
+        # from the MatchTag side, pk_set holds the matches it was removed from
+        MatchTag.delete_orphans([instance.pk] if reverse else pk_set)
+
+
+@receiver(post_save, sender=Match)
+def post_save_match(sender, instance, created, **kwargs):
+    if created and instance.requested_by_id is not None:
+        notify_match_availability_changed()  # a requested match was queued
@@ -5,6 +5,7 @@ from private_storage.fields import PrivateFileField
 from aiarena.core.storage import OverwritePrivateStorage
 from aiarena.core.validators import validate_not_nan, validate_not_inf
 from .bot import Bot
+from .bot_data_lock import BotDataLock
 from .match import Match
 from .mixins import LockableModelMixin
 
@@ -81,14 +82,8 @@ class MatchParticipation(models.Model, LockableModelMixin):
     def available_to_start_match(self):
         """Whether this bot can start the match at this time."""
         if not self.allow_parallel_run:
-            # Get all the matches that contain this bot that have started and not finished
-            # Then check to see if they should block entry into a new match
-            matches = Match.objects.only('id').filter(matchparticipation__bot_id=self.bot_id, started__isnull=False,
-                                                      result__isnull=True)
-            for match in matches:
-                for p in match.matchparticipation_set.filter(bot_id=self.bot_id):
-                    if not p.allow_parallel_run:
-                        return False
+            # Any started and unfinished match holding a lock on this bot's data blocks entry into a new match
+            return not BotDataLock.objects.filter(bot_id=self.bot_id).exists()
         return True
 
     def calculate_relative_result(self, result_type):
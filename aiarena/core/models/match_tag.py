@@ -1,8 +1,6 @@
 import logging
 
 from django.db import models
-from django.db.models.signals import post_delete
-from django.dispatch import receiver
 
 from .user import User
 from .tag import Tag
@@ -14,12 +12,17 @@ class MatchTag(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
 
+    class Meta:
+        unique_together = (('user', 'tag'),)
+
     def __str__(self):
         return f"{str(self.tag)} ({self.user.username})"
 
-
-@receiver(post_delete, sender=MatchTag)
-def delete_orphan_tags(sender, instance, **kwargs):
-    # If there are no objects that refer to this tag left, delete the tag
-    if not sender.objects.filter(tag=instance.tag):
-        instance.tag.delete()
+    @staticmethod
+    def delete_orphans(match_tag_ids):
+        """Deletes those of the match tags which are no longer on any match, then any tags this leaves unused."""
+        orphans = MatchTag.objects.filter(id__in=match_tag_ids, match__isnull=True)
+        tag_ids = list(orphans.values_list('tag_id', flat=True))
+        if tag_ids:
+            orphans.delete()
+            Tag.delete_orphans(tag_ids)
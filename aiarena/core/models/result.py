@@ -11,6 +11,7 @@ from .match import Match
 from .mixins import LockableModelMixin
 from .user import User
 from .bot import Bot
+from .competition import Competition
 
 logger = logging.getLogger(__name__)
 
@@ -20,14 +21,12 @@ logger = logging.getLogger(__name__)
 
 
 def replay_file_upload_to(instance, filename):
-    match = Match.objects.only('map__name', 'id')\
-        .prefetch_related('matchparticipation_set','matchparticipation_set__bot')\
-        .select_related('map').get(id=instance.match_id)
+    bot1, bot2 = instance.get_match_participant_bots
     return '/'.join(['replays',
-                     f'{match.id}'
-                     f'_{match.matchparticipation_set.get(participant_number=1).bot.name}'
-                     f'_{match.matchparticipation_set.get(participant_number=2).bot.name}'
-                     f'_{match.map.name}.SC2Replay'])
+                     f'{instance.match_id}'
+                     f'_{bot1.name}'
+                     f'_{bot2.name}'
+                     f'_{instance.match.map.name}.SC2Replay'])
 
 
 def arenaclient_log_upload_to(instance, filename):
@@ -66,6 +65,11 @@ class Result(models.Model, LockableModelMixin):
     """This is set to true when the replay file is deleted by the cleanup job."""
     arenaclient_log_has_been_cleaned = models.BooleanField(default=False)
     """This is set to true when the arena log file is deleted by the cleanup job."""
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True, editable=False)
+    """Supplied by the submitter, so a retried submission can be matched up with this result rather than re-processed."""
+
+    class Meta:
+        unique_together = (('submitted_by', 'idempotency_key'),)
 
     def __str__(self):
         return self.created.__str__() + " " + str(self.type) + " " + str(self.duration_seconds)
@@ -80,11 +84,11 @@ class Result(models.Model, LockableModelMixin):
 
     @cached_property
     def participant1(self):
-        return self.match.participant1
+        return self.get_match_participants[0]
 
     @cached_property
     def participant2(self):
-        return self.match.participant2
+        return self.get_match_participants[1]
 
     def validate_replay_file_requirement(self):
         if (self.has_winner or self.is_tie) and not self.replay_file and not self.replay_file_has_been_cleaned:
@@ -171,18 +175,26 @@ class Result(models.Model, LockableModelMixin):
 
     @cached_property
     def get_competition_participants(self):
-        """Returns the SeasonParticipant models for the MatchParticipants"""
-        from .match_participation import MatchParticipation
-        match_id = self.match_id
-        first = MatchParticipation.objects.get(match_id=match_id, participant_number=1)
-        second = MatchParticipation.objects.get(match_id=match_id, participant_number=2)
-        return first.competition_participant, second.competition_participant
+        """
+        Returns the CompetitionParticipation models for the MatchParticipants, locked for updating their ELO.
+        Must be called inside a transaction.
+        """
+        from .competition_participation import CompetitionParticipation
+        first, second = self.get_match_participants
+        participants = {sp.bot_id: sp for sp in CompetitionParticipation.objects.select_for_update()
+                        .filter(competition_id=self.match.round.competition_id, bot_id__in=[first.bot_id, second.bot_id])
+                        .order_by('id')}
+        first_sp, second_sp = participants[first.bot_id], participants[second.bot_id]
+        # reuse the related objects we already have, rather than joining (and locking) them in the query above
+        first_sp.bot, second_sp.bot = first.bot, second.bot
+        first_sp.competition = second_sp.competition = self.match.round.competition
+        return first_sp, second_sp
 
     @cached_property
     def get_match_participants(self):
-        from .match_participation import MatchParticipation
-        first = MatchParticipation.objects.get(match=self.match, participant_number=1)
-        second = MatchParticipation.objects.get(match=self.match, participant_number=2)
+        """Uses the match's participants if they've already been fetched."""
+        first, second = sorted(self.match.matchparticipation_set.all(),
+                               key=lambda participation: participation.participant_number)
         return first, second
 
     @cached_property
@@ -191,11 +203,9 @@ class Result(models.Model, LockableModelMixin):
         return first.bot, second.bot
 
     def save(self, *args, **kwargs):
-        from .match_participation import MatchParticipation
         # set winner
         if self.has_winner:
-            self.winner = MatchParticipation.objects.select_related('bot').get(match=self.match,
-                                                         participant_number=self.winner_participant_number).bot
+            self.winner = self.get_match_participants[self.winner_participant_number - 1].bot
 
         self.full_clean()  # ensure validation is run on save
         super().save(*args, **kwargs)
@@ -214,8 +224,19 @@ class Result(models.Model, LockableModelMixin):
         return first.elo, second.elo
 
     def _apply_elo_delta(self, delta, sp1, sp2):
+        from .competition_participation import CompetitionParticipation
         delta = int(round(delta))
+        # The ELO in the database as it's overwritten. If it isn't what the delta was calculated from,
+        # whatever changed it in the meantime is lost, and the competition's ELO sum changes.
+        stored_elos = dict(CompetitionParticipation.objects.filter(id__in=[sp1.id, sp2.id]).values_list('id', 'elo'))
         sp1.elo += delta
         sp1.save()
         sp2.elo -= delta
         sp2.save()
+
+        # Recorded in the same transaction, and only when the sum changed, so the competition's row isn't
+        # locked by every result.
+        drift = sp1.elo + sp2.elo - stored_elos[sp1.id] - stored_elos[sp2.id]
+        if drift != 0:
+            logger.critical(f"Result {self.id} changed the ELO sum of competition {sp1.competition_id} by {drift}.")
+            Competition.add_elo_drift(sp1.competition_id, drift)
@@ -24,22 +24,30 @@ class Round(models.Model, LockableModelMixin):
     started = models.DateTimeField(auto_now_add=True, db_index=True)
     finished = models.DateTimeField(blank=True, null=True, db_index=True)
     complete = models.BooleanField(default=False)
+    pending_pairings = models.JSONField(blank=True, null=True, editable=False)
+    """[bot1_id, bot2_id] pairs which still need a match created for them.
+    Only used by competitions which create matches on demand. Null once every match has been created."""
 
     @property
     def name(self):
         return 'Round ' + str(self.number)
 
+    @property
+    def pending_pairing_count(self):
+        return len(self.pending_pairings) if self.pending_pairings else 0
+
     def __str__(self):
         return self.name
 
-    # if all the matches have been run, mark this as complete
+    # if all the matches have been created and run, mark this as complete
     def update_if_completed(self):
         from .match import Match
         with transaction.atomic():
             # if there are no matches without results, this round is complete
             # if this round close attempt results in a row update, try to close the competition
             if Match.objects.filter(round=self, result__isnull=True).count() == 0 and \
-                    Round.objects.filter(id=self.id, complete=False).update(complete=True, finished=timezone.now()) > 0:
+                    Round.objects.filter(id=self.id, complete=False, pending_pairings__isnull=True) \
+                            .update(complete=True, finished=timezone.now()) > 0:
                 self.competition.try_to_close()
 
     def get_absolute_url(self):
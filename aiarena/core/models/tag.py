@@ -10,3 +10,8 @@ class Tag(models.Model):
 
     def __str__(self):
         return self.name
+
+    @staticmethod
+    def delete_orphans(tag_ids):
+        """Deletes those of the tags which no match tag refers to any more."""
+        Tag.objects.filter(id__in=tag_ids, matchtag__isnull=True).delete()
@@ -3,7 +3,7 @@ import logging
 from constance import config
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
@@ -12,6 +12,7 @@ from django.utils.html import escape
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 
+from aiarena.core.d_utils import random_pick, invalidate_random_picks
 from aiarena.core.models.mixins import LockableModelMixin
 
 logger = logging.getLogger(__name__)
@@ -119,9 +120,7 @@ class User(AbstractUser, LockableModelMixin):
 
     @staticmethod
     def random_supporter():
-        # todo: apparently order_by('?') is really slow
-        # https://stackoverflow.com/questions/962619/how-to-pull-a-random-record-using-djangos-orm#answer-962672
-        return User.objects.only('id', 'username').exclude(patreon_level='none').order_by('?').first()
+        return random_pick(User.objects.only('id', 'username').exclude(patreon_level='none'), 'supporters', 'all')
 
     @property
     def is_arenaclient(self):
@@ -144,3 +143,14 @@ class User(AbstractUser, LockableModelMixin):
 def pre_save_user(sender, instance, **kwargs):
     if not instance.is_websiteuser:
         instance.set_unusable_password()
+
+
+@receiver(post_save, sender=User)
+def post_save_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'patreon_level' in update_fields:
+        invalidate_random_picks('supporters')
+
+
+@receiver(post_delete, sender=User)
+def post_delete_user(sender, instance, **kwargs):
+    invalidate_random_picks('supporters')
@@ -2,9 +2,10 @@ import logging
 
 from constance import config
 from django.db import models
+from django.db.models.signals import post_save, post_delete
 from django.utils import timezone
 
-from .user import User
+from .user import User, post_save_user, post_delete_user
 
 logger = logging.getLogger(__name__)
 
@@ -33,3 +34,8 @@ class WebsiteUser(User):
 
     class Meta:
         verbose_name = 'WebsiteUser'
+
+
+# Saving a website user doesn't send the signals registered for its parent User model.
+post_save.connect(post_save_user, sender=WebsiteUser)
+post_delete.connect(post_delete_user, sender=WebsiteUser)
@@ -0,0 +1,29 @@
+def downsample_lttb(points: list, threshold: int) -> list:
+    """
+    Reduces a series of (x, y) points to at most threshold points using the Largest-Triangle-Three-Buckets algorithm,
+    which keeps the points that contribute most to the shape of the line. The first and last points are always kept.
+    The points must be sorted by x.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    # the points between the first and last are split into threshold - 2 buckets, each contributing one point
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    previous = points[0]
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # the third corner of the triangle is the average of the next bucket, or the last point
+        next_end = min(int((bucket + 2) * bucket_size) + 1, len(points))
+        next_points = points[end:next_end]
+        next_x = sum(x for x, _ in next_points) / len(next_points)
+        next_y = sum(y for _, y in next_points) / len(next_points)
+
+        selected = max(points[start:end], key=lambda point: abs((previous[0] - next_x) * (point[1] - previous[1])
+                                                                - (previous[0] - point[0]) * (next_y - previous[1])))
+        sampled.append(selected)
+        previous = selected
+    sampled.append(points[-1])
+    return sampled
@@ -0,0 +1,53 @@
+from aiarena.core.models import MatchParticipation, Result
+from aiarena.core.utils import Elo
+
+
+class EloReplay:
+    """Replays a competition's results in memory, in the order they were submitted."""
+
+    @staticmethod
+    def load_results(competition_id: int) -> list:
+        """
+        Returns every result in the competition, oldest first, as
+        (result type, participant 1 participation id, participant 1 bot id,
+        participant 2 participation id, participant 2 bot id) tuples.
+        """
+        participations = {}
+        for participation_id, match_id, participant_number, bot_id in MatchParticipation.objects \
+                .filter(match__round__competition_id=competition_id, match__result__isnull=False) \
+                .values_list('id', 'match_id', 'participant_number', 'bot_id').iterator():
+            participations[(match_id, participant_number)] = (participation_id, bot_id)
+
+        return [(result_type,) + participations[(match_id, 1)] + participations[(match_id, 2)]
+                for match_id, result_type in Result.objects.filter(match__round__competition_id=competition_id)
+                .order_by('created', 'id').values_list('match_id', 'type').iterator()]
+
+    @staticmethod
+    def replay(results: list, ratings: dict, elo: Elo, on_result=None):
+        """
+        Applies each result to the ratings, which are keyed by bot id, exactly as Result.adjust_elo would.
+        If supplied, on_result is called after each result with the result and both bots' ratings
+        before and after it: on_result(result, p1_before, p1_after, p2_before, p2_after).
+        """
+        winners = {result_type: Result(type=result_type).winner_participant_number for result_type, _ in Result.TYPES}
+        for result in results:
+            result_type, _, bot1_id, _, bot2_id = result
+            rating1 = ratings[bot1_id]
+            rating2 = ratings[bot2_id]
+
+            winner = winners[result_type]
+            if winner == 1:
+                delta = int(round(elo.calculate_elo_delta(rating1, rating2, 1.0)))
+                ratings[bot1_id] = rating1 + delta
+                ratings[bot2_id] = rating2 - delta
+            elif winner == 2:
+                delta = int(round(elo.calculate_elo_delta(rating2, rating1, 1.0)))
+                ratings[bot2_id] = rating2 + delta
+                ratings[bot1_id] = rating1 - delta
+            elif result_type == 'Tie':
+                delta = int(round(elo.calculate_elo_delta(rating1, rating2, 0.5)))
+                ratings[bot1_id] = rating1 + delta
+                ratings[bot2_id] = rating2 - delta
+
+            if on_result is not None:
+                on_result(result, rating1, ratings[bot1_id], rating2, ratings[bot2_id])
@@ -1,3 +1,4 @@
+import hashlib
 import io
 
 from datetime import datetime
@@ -6,7 +7,8 @@ import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import pandas as pd
 from django.db import connection
-from django.db.models import Max, Min
+from django.db.models import Max
+from django.utils import timezone
 from pytz import utc
 
 from aiarena.core.models import MatchParticipation, CompetitionParticipation, Bot
@@ -14,206 +16,242 @@ from aiarena.core.models.competition_bot_matchup_stats import CompetitionBotMatc
 from aiarena.core.models.competition_bot_map_stats import CompetitionBotMapStats
 from aiarena.core.models.competition import Competition
 
-class StatsGenerator:
-
-    @staticmethod
-    def update_stats(sp: CompetitionParticipation):
-        sp.match_count = MatchParticipation.objects.filter(bot=sp.bot,
-                                                           match__result__isnull=False,
-                                                           match__round__competition=sp.competition) \
-            .exclude(match__result__type__in=['MatchCancelled', 'InitializationError', 'Error']) \
-            .count()
-        if sp.match_count != 0:
-            sp.win_count = MatchParticipation.objects.filter(bot=sp.bot, result='win',
-                                                             match__round__competition=sp.competition
-                                                             ).count()
-            sp.win_perc = sp.win_count / sp.match_count * 100
-            sp.loss_count = MatchParticipation.objects.filter(bot=sp.bot, result='loss',
-                                                              match__round__competition=sp.competition
-                                                              ).count()
-            sp.loss_perc = sp.loss_count / sp.match_count * 100
-            sp.tie_count = MatchParticipation.objects.filter(bot=sp.bot, result='tie',
-                                                             match__round__competition=sp.competition
-                                                             ).count()
-            sp.tie_perc = sp.tie_count / sp.match_count * 100
-            sp.crash_count = MatchParticipation.objects.filter(bot=sp.bot, result='loss', result_cause__in=['crash',
-                                                                                                            'timeout',
-                                                                                                            'initialization_failure'],
-                                                               match__round__competition=sp.competition
-                                                               ).count()
-            sp.crash_perc = sp.crash_count / sp.match_count * 100
-
-            sp.highest_elo = MatchParticipation.objects.filter(bot=sp.bot,
-                                                               match__result__isnull=False,
-                                                               match__round__competition=sp.competition) \
-                .aggregate(Max('resultant_elo'))['resultant_elo__max']
-
-            graph1, graph2 = StatsGenerator._generate_elo_graph(sp.bot.id, sp.competition_id)
-            if graph1 is not None:
-                sp.elo_graph.save('elo.png', graph1)
-
-            if graph2 is not None:
-                sp.elo_graph_update_plot.save('elo_update_plot.png', graph2)
-        else:
-            sp.win_count = 0
-            sp.loss_count = 0
-            sp.tie_count = 0
-            sp.crash_count = 0
-        sp.save()
-
-        StatsGenerator._update_matchup_stats(sp)
-        StatsGenerator._update_map_stats(sp)
-
-    @staticmethod
-    def _update_matchup_stats(sp: CompetitionParticipation):
-        for competition_participation in CompetitionParticipation.objects.filter(competition=sp.competition).exclude(
-                bot=sp.bot):
-            with connection.cursor() as cursor:
-                matchup_stats = CompetitionBotMatchupStats.objects.select_for_update() \
-                    .get_or_create(bot=sp, opponent=competition_participation)[0]
-
-                matchup_stats.match_count = StatsGenerator._calculate_matchup_count(cursor, competition_participation,
-                                                                                    sp)
-
-                if matchup_stats.match_count != 0:
-                    matchup_stats.win_count = StatsGenerator._calculate_matchup_win_count(cursor, competition_participation, sp)
-                    matchup_stats.win_perc = matchup_stats.win_count / matchup_stats.match_count * 100
-
-                    matchup_stats.loss_count = StatsGenerator._calculate_matchup_loss_count(cursor, competition_participation,
-                                                                                    sp)
-                    matchup_stats.loss_perc = matchup_stats.loss_count / matchup_stats.match_count * 100
-
-                    matchup_stats.tie_count = StatsGenerator._calculate_matchup_tie_count(cursor, competition_participation, sp)
-                    matchup_stats.tie_perc = matchup_stats.tie_count / matchup_stats.match_count * 100
-
-                    matchup_stats.crash_count = StatsGenerator._calculate_matchup_crash_count(cursor, competition_participation,
-                                                                                      sp)
-                    matchup_stats.crash_perc = matchup_stats.crash_count / matchup_stats.match_count * 100
-                else:
-                    matchup_stats.win_count = 0
-                    matchup_stats.loss_count = 0
-                    matchup_stats.tie_count = 0
-                    matchup_stats.crash_count = 0
-
-                matchup_stats.save()
-
-    @staticmethod
-    def _update_map_stats(sp: CompetitionParticipation):
-        competition = Competition.objects.get(id=sp.competition.id)
-        for map in competition.maps.all():
-            with connection.cursor() as cursor:
-                map_stats = CompetitionBotMapStats.objects.select_for_update() \
-                    .get_or_create(bot=sp, map=map)[0]
-
-                map_stats.match_count = StatsGenerator._calculate_map_count(cursor, map, sp)
-
-                if map_stats.match_count != 0:
-                    map_stats.win_count = StatsGenerator._calculate_map_win_count(cursor, map, sp)
-                    map_stats.win_perc = map_stats.win_count / map_stats.match_count * 100
-
-                    map_stats.loss_count = StatsGenerator._calculate_map_loss_count(cursor, map, sp)
-                    map_stats.loss_perc = map_stats.loss_count / map_stats.match_count * 100
-
-                    map_stats.tie_count = StatsGenerator._calculate_map_tie_count(cursor, map, sp)
-                    map_stats.tie_perc = map_stats.tie_count / map_stats.match_count * 100
 
-                    map_stats.crash_count = StatsGenerator._calculate_map_crash_count(cursor, map, sp)
-                    map_stats.crash_perc = map_stats.crash_count / map_stats.match_count * 100
-                else:
-                    map_stats.win_count = 0
-                    map_stats.loss_count = 0
-                    map_stats.tie_count = 0
-                    map_stats.crash_count = 0
-
-                map_stats.save()
-
-    @staticmethod
-    def _run_single_column_query(cursor, query, params):
-        cursor.execute(query, params)
-        row = cursor.fetchone()
-        return row[0]
-
-    @staticmethod
-    def _calculate_matchup_data(cursor, competition_participation, sp, query):
-        return StatsGenerator._run_single_column_query(cursor, """
-                    select count(cm.id) as count
-                    from core_match cm
-                    inner join core_matchparticipation bot_p on cm.id = bot_p.match_id
-                    inner join core_matchparticipation opponent_p on cm.id = opponent_p.match_id
-                    inner join core_round cr on cm.round_id = cr.id
-                    inner join core_competition cs on cr.competition_id = cs.id
-                    where cs.id = %s -- make sure it's part of the current competition
-                    and bot_p.bot_id = %s
-                    and opponent_p.bot_id = %s
-                    and """ + query, 
-                    [sp.competition_id, sp.bot_id, competition_participation.bot_id])
-
-    @staticmethod
-    def _calculate_matchup_count(cursor, competition_participation, sp):
-        return StatsGenerator._calculate_matchup_data(cursor, competition_participation, sp,
-                    "bot_p.result is not null and bot_p.result != 'none'")
+class StatsGenerator:
+    _COUNTED_RESULTS = ['win', 'loss', 'tie']
+    _CRASH_CAUSES = ['crash', 'timeout', 'initialization_failure']
+    _BULK_BATCH_SIZE = 500
+    _ELO_GRAPH_VERSION = 1
+    """Part of each ELO graph's hash. Bump this when the graphs' appearance changes, so they all get re-rendered."""
+    _elo_graph_figure = None
+    _STAT_FIELDS = ['match_count', 'win_count', 'win_perc', 'loss_count', 'loss_perc', 'tie_count', 'tie_perc',
+                    'crash_count', 'crash_perc']
 
     @staticmethod
-    def _calculate_matchup_win_count(cursor, competition_participation, sp):
-        return StatsGenerator._calculate_matchup_data(cursor, competition_participation, sp,
-                    "bot_p.result = 'win'")
+    def apply_result(competition_id: int, map_id: int, participations, competition_participations=None):
+        """
+        Applies a newly submitted result to the competition, matchup and map stats of its participants,
+        so they don't need to be recomputed from scratch. The ELO graphs are still only rendered by update_stats.
+        Must be called in the transaction the result is saved in, so a concurrent update_stats can't count it twice.
+        If the participants' CompetitionParticipations have already been locked in this transaction,
+        they can be supplied instead of being fetched again.
+        """
+        if competition_participations is None:
+            competition_participations = CompetitionParticipation.objects.select_for_update() \
+                .filter(competition_id=competition_id, bot_id__in=[p.bot_id for p in participations]).order_by('id')
+        participants = {sp.bot_id: sp for sp in competition_participations}
+        for participation in participations:
+            sp = participants.get(participation.bot_id)
+            if sp is None:
+                continue  # the bot has since left the competition
+            updated_fields = []
+            if participation.resultant_elo is not None \
+                    and (sp.highest_elo is None or participation.resultant_elo > sp.highest_elo):
+                sp.highest_elo = participation.resultant_elo
+                updated_fields.append('highest_elo')
+
+            if participation.result not in StatsGenerator._COUNTED_RESULTS:
+                # the match didn't count, e.g. it was cancelled
+                if updated_fields:
+                    sp.save(update_fields=updated_fields)
+                continue
+
+            StatsGenerator._apply_participation(sp, participation)
+            sp.save(update_fields=updated_fields + StatsGenerator._STAT_FIELDS)
+
+            for opponent in participations:
+                if opponent.bot_id != participation.bot_id and opponent.bot_id in participants:
+                    matchup_stats = CompetitionBotMatchupStats.objects.select_for_update() \
+                        .get_or_create(bot=sp, opponent=participants[opponent.bot_id])[0]
+                    StatsGenerator._apply_participation(matchup_stats, participation)
+                    matchup_stats.save()
+
+            map_stats = CompetitionBotMapStats.objects.select_for_update().get_or_create(bot=sp, map_id=map_id)[0]
+            StatsGenerator._apply_participation(map_stats, participation)
+            map_stats.save()
 
     @staticmethod
-    def _calculate_matchup_loss_count(cursor, competition_participation, sp):
-        return StatsGenerator._calculate_matchup_data(cursor, competition_participation, sp,
-                    "bot_p.result = 'loss'")
+    def _apply_participation(stats, participation: MatchParticipation):
+        StatsGenerator._apply_counts(stats, (
+            (stats.match_count or 0) + 1,
+            (stats.win_count or 0) + (participation.result == 'win'),
+            (stats.loss_count or 0) + (participation.result == 'loss'),
+            (stats.tie_count or 0) + (participation.result == 'tie'),
+            (stats.crash_count or 0) + (participation.result == 'loss'
+                                        and participation.result_cause in StatsGenerator._CRASH_CAUSES)))
 
     @staticmethod
-    def _calculate_matchup_tie_count(cursor, competition_participation, sp):
-        return StatsGenerator._calculate_matchup_data(cursor, competition_participation, sp,
-                    "bot_p.result = 'tie'")
+    def update_stats(sp: CompetitionParticipation):
+        """
+        Recomputes the participant's stats from scratch and renders its ELO graphs.
+        The counts are otherwise kept up to date by apply_result, so this mostly serves to repair them.
+        """
+        StatsGenerator.update_competition_stats(sp.competition_id, [sp.bot_id])
+        sp.refresh_from_db()
+        StatsGenerator.update_elo_graphs(sp)
 
     @staticmethod
-    def _calculate_matchup_crash_count(cursor, competition_participation, sp):
-        return StatsGenerator._calculate_matchup_data(cursor, competition_participation, sp,
-                    """bot_p.result = 'loss'
-                    and bot_p.result_cause in ('crash', 'timeout', 'initialization_failure')""")
+    def update_competition_stats(competition_id: int, bot_ids: list = None):
+        """
+        Recomputes the competition, matchup and map stats of every participant in the competition from scratch.
+        The whole competition is counted with one grouped query for the matchups and one for the maps,
+        and the stats are then saved in bulk. If bot ids are supplied, only those bots' stats are recomputed.
+        Must be called inside a transaction. The updated participants stay locked until it ends, so results
+        submitted meanwhile apply their changes on top of the recomputed stats rather than being counted twice.
+        """
+        locked_participants = CompetitionParticipation.objects.select_for_update() \
+            .filter(competition_id=competition_id).order_by('id')
+        if bot_ids is not None:
+            locked_participants = locked_participants.filter(bot_id__in=bot_ids)
+        updated_participants = list(locked_participants)
+        if len(updated_participants) == 0:
+            return
+        # every participant is an opponent to count matchups against, but only the ids are needed for those
+        opponents = list(CompetitionParticipation.objects.filter(competition_id=competition_id).only('id', 'bot_id'))
+
+        matchup_counts = StatsGenerator._count_results(
+            competition_id, bot_ids, 'opponent_p.bot_id',
+            """inner join core_matchparticipation opponent_p on cm.id = opponent_p.match_id
+                and opponent_p.participant_number != bot_p.participant_number""")
+        map_counts = StatsGenerator._count_results(competition_id, bot_ids, 'cm.map_id')
+
+        # every counted match was played on exactly one map, so the map counts add up to the bot's totals
+        for sp in updated_participants:
+            bot_map_counts = [counts for (counted_bot_id, _), counts in map_counts.items()
+                              if counted_bot_id == sp.bot_id]
+            totals = [sum(counts[i] for counts in bot_map_counts) for i in range(5)]
+            StatsGenerator._apply_counts(sp, totals)
+            highest_elos = [counts[5] for counts in bot_map_counts if counts[5] is not None]
+            if highest_elos:
+                sp.highest_elo = max(highest_elos)
+        CompetitionParticipation.objects.bulk_update(updated_participants,
+                                                     StatsGenerator._STAT_FIELDS + ['highest_elo'],
+                                                     batch_size=StatsGenerator._BULK_BATCH_SIZE)
+
+        StatsGenerator._save_stats(
+            CompetitionBotMatchupStats, 'opponent_id', matchup_counts,
+            [(sp, opponent.id, opponent.bot_id) for sp in updated_participants for opponent in opponents
+             if opponent.bot_id != sp.bot_id])
+
+        competition_map_ids = set(Competition.objects.get(id=competition_id).maps.values_list('id', flat=True))
+        StatsGenerator._save_stats(
+            CompetitionBotMapStats, 'map_id', map_counts,
+            [(sp, map_id, map_id) for sp in updated_participants
+             for map_id in competition_map_ids | {map_id for counted_bot_id, map_id in map_counts
+                                                  if counted_bot_id == sp.bot_id}])
 
     @staticmethod
-    def _calculate_map_data(cursor, map, sp, query):
-        return StatsGenerator._run_single_column_query(cursor, """
-                    select count(cm.id) as count
-                    from core_match cm
-                    inner join core_matchparticipation bot_p on cm.id = bot_p.match_id
-                    inner join core_map map on cm.map_id = map.id
-                    inner join core_round cr on cm.round_id = cr.id
-                    inner join core_competition cs on cr.competition_id = cs.id
-                    where cs.id = %s -- make sure it's part of the current competition
-                    and map.id = %s
-                    and bot_p.bot_id = %s
-                    and """ + query, 
-                    [sp.competition_id, map.id, sp.bot_id])
+    def get_latest_result_ids(competition_id: int, created_before: datetime = None) -> dict:
+        """
+        Returns the id of the latest result of each bot in the competition, keyed by bot id.
+        If created_before is supplied, only results created before then are considered.
+        """
+        participations = MatchParticipation.objects.filter(match__round__competition_id=competition_id,
+                                                           match__result__isnull=False)
+        if created_before is not None:
+            participations = participations.filter(match__result__created__lt=created_before)
+        return dict(participations.values('bot_id').annotate(latest_result_id=Max('match__result__id'))
+                    .values_list('bot_id', 'latest_result_id'))
 
     @staticmethod
-    def _calculate_map_count(cursor, map, sp):
-        return StatsGenerator._calculate_map_data(cursor, map, sp, 
-                    "bot_p.result is not null and bot_p.result != 'none'")
+    def get_elo_series(bot_id: int, competition_id: int) -> list:
+        """Returns the bot's ELO after each of its results in the competition as (result time, ELO) pairs, oldest first."""
+        return list(MatchParticipation.objects.filter(bot_id=bot_id, match__round__competition_id=competition_id,
+                                                      match__result__isnull=False, resultant_elo__isnull=False)
+                    .order_by('match__result__created', 'match__result__id')
+                    .values_list('match__result__created', 'resultant_elo'))
 
     @staticmethod
-    def _calculate_map_win_count(cursor, map, sp):
-        return StatsGenerator._calculate_map_data(cursor,map, sp, 
-                    "bot_p.result = 'win'")
+    def update_elo_graphs(sp: CompetitionParticipation):
+        """
+        Renders the participant's ELO graphs, unless neither its ELO history nor its last bot update have changed
+        since they were last rendered.
+        """
+        if sp.match_count == 0:
+            return
+        graph_data = StatsGenerator._get_elo_graph_data(sp.bot_id, sp.competition_id)
+        if graph_data is None:
+            return
+        df, update_date = graph_data
+
+        graph_hash = StatsGenerator._hash_elo_graph_data(df, update_date)
+        if graph_hash == sp.elo_graph_hash and sp.elo_graph and sp.elo_graph_update_plot:
+            return
+
+        graph1, graph2 = StatsGenerator._generate_plot_images(df, update_date)
+        sp.elo_graph.save('elo.png', graph1, save=False)
+        sp.elo_graph_update_plot.save('elo_update_plot.png', graph2, save=False)
+        sp.elo_graph_hash = graph_hash
+        sp.save(update_fields=['elo_graph', 'elo_graph_update_plot', 'elo_graph_hash'])
 
     @staticmethod
-    def _calculate_map_loss_count(cursor, map, sp):
-        return StatsGenerator._calculate_map_data(cursor,map, sp,
-                    "bot_p.result = 'loss'")
+    def _count_results(competition_id: int, bot_ids, group_column: str, join: str = '') -> dict:
+        """
+        Counts each bot's results in the competition, grouped by the supplied column.
+        Returns a dict keyed by (bot id, group column value) of
+        (match count, win count, loss count, tie count, crash count, highest ELO).
+        """
+        params = [competition_id]
+        bot_filter = ''
+        if bot_ids is not None:
+            bot_filter = f"and bot_p.bot_id in ({', '.join(['%s'] * len(bot_ids))})"
+            params.extend(bot_ids)
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                select
+                    bot_p.bot_id,
+                    {group_column},
+                    sum(case when bot_p.result in ('win', 'loss', 'tie') then 1 else 0 end),
+                    sum(case when bot_p.result = 'win' then 1 else 0 end),
+                    sum(case when bot_p.result = 'loss' then 1 else 0 end),
+                    sum(case when bot_p.result = 'tie' then 1 else 0 end),
+                    sum(case when bot_p.result = 'loss'
+                        and bot_p.result_cause in ('crash', 'timeout', 'initialization_failure')
+                        then 1 else 0 end),
+                    max(bot_p.resultant_elo)
+                from core_match cm
+                inner join core_round cr on cm.round_id = cr.id
+                inner join core_matchparticipation bot_p on cm.id = bot_p.match_id
+                {join}
+                where cr.competition_id = %s
+                {bot_filter}
+                group by bot_p.bot_id, {group_column}
+                """, params)
+            return {(row[0], row[1]): tuple(int(count) for count in row[2:7]) + (row[7],)
+                    for row in cursor.fetchall()}
 
     @staticmethod
-    def _calculate_map_tie_count(cursor, map, sp):
-        return StatsGenerator._calculate_map_data(cursor,map, sp,
-                    "bot_p.result = 'tie'")
+    def _save_stats(model, key_field: str, counts: dict, rows: list):
+        """
+        Upserts the stats rows of the supplied model.
+        Each row is a (participant, value of key_field, value the counts are keyed by) tuple.
+        """
+        existing = {(stats.bot_id, getattr(stats, key_field)): stats for stats in model.objects.select_for_update()
+                    .filter(bot_id__in={sp.id for sp, _, _ in rows})}
+        now = timezone.now()
+        to_update = []
+        to_create = []
+        for sp, key, counted_key in rows:
+            stats = existing.get((sp.id, key))
+            if stats is None:
+                stats = model(bot=sp, **{key_field: key})
+                to_create.append(stats)
+            else:
+                to_update.append(stats)
+            StatsGenerator._apply_counts(stats, counts.get((sp.bot_id, counted_key), (0, 0, 0, 0, 0)))
+            stats.updated = now
+        model.objects.bulk_update(to_update, StatsGenerator._STAT_FIELDS + ['updated'],
+                                  batch_size=StatsGenerator._BULK_BATCH_SIZE)
+        model.objects.bulk_create(to_create, batch_size=StatsGenerator._BULK_BATCH_SIZE)
 
     @staticmethod
-    def _calculate_map_crash_count(cursor, map, sp):
-        return StatsGenerator._calculate_map_data(cursor,map, sp,
-                    """bot_p.result = 'loss'
-                    and bot_p.result_cause in ('crash', 'timeout', 'initialization_failure')""")
+    def _apply_counts(stats, counts):
+        stats.match_count, stats.win_count, stats.loss_count, stats.tie_count, stats.crash_count = counts[:5]
+        if stats.match_count != 0:
+            stats.win_perc = stats.win_count / stats.match_count * 100
+            stats.loss_perc = stats.loss_count / stats.match_count * 100
+            stats.tie_perc = stats.tie_count / stats.match_count * 100
+            stats.crash_perc = stats.crash_count / stats.match_count * 100
 
     @staticmethod
     def _get_data(bot_id, competition_id):
@@ -261,6 +299,18 @@ class StatsGenerator:
             cursor.execute(query)
             return cursor.fetchall()
 
+    @staticmethod
+    def _get_elo_graph_figure():
+        """
+        The figure is reused for every graph this process renders, because creating one is comparatively slow.
+        It's cleared rather than just its axes, so each graph renders exactly as it would on a new figure.
+        """
+        if StatsGenerator._elo_graph_figure is None:
+            StatsGenerator._elo_graph_figure = plt.figure(figsize=(12, 9))
+        fig = StatsGenerator._elo_graph_figure
+        fig.clf()
+        return fig, fig.add_subplot(1, 1, 1)
+
     @staticmethod
     def _generate_plot_images(df, update_date: datetime):
         plot1 = io.BytesIO()
@@ -268,7 +318,7 @@ class StatsGenerator:
 
         legend = []
 
-        fig, ax1 = plt.subplots(1, 1, figsize=(12, 9), sharex='all', sharey='all')
+        fig, ax1 = StatsGenerator._get_elo_graph_figure()
         ax1.plot(df["Date"], df['ELO'], color='#86c232')
         # ax.plot(df["Date"], df['ELO'], color='#86c232')
         ax1.spines["top"].set_visible(False)
@@ -286,20 +336,27 @@ class StatsGenerator:
         legend.append('ELO')
         ax1.legend(legend, loc='lower center', fontsize='xx-large')
 
-        plt.title('ELO over time', fontsize=20, color=('#86c232'))
-        plt.tight_layout()  # Avoids savefig cutting off x-label
-        plt.savefig(plot1, format="png", transparent=True)
+        ax1.set_title('ELO over time', fontsize=20, color=('#86c232'))
+        fig.tight_layout()  # Avoids savefig cutting off x-label
+        fig.savefig(plot1, format="png", transparent=True)
 
         ax1.vlines([update_date],
                    min(df['ELO']), max(df['ELO']), colors='r', linestyles='--')
         legend.append('Last bot update')
         ax1.legend(legend, loc='lower center', fontsize='xx-large')
-        plt.savefig(plot2, format="png", transparent=True)
-        plt.close(fig)
+        fig.savefig(plot2, format="png", transparent=True)
         return plot1, plot2
 
     @staticmethod
-    def _generate_elo_graph(bot_id: int, competition_id: int):
+    def _hash_elo_graph_data(df, update_date: datetime) -> str:
+        graph_hash = hashlib.sha256(f'{StatsGenerator._ELO_GRAPH_VERSION}|{update_date.isoformat()}'.encode())
+        for elo, date in zip(df['ELO'], df['Date']):
+            graph_hash.update(f'|{elo},{date}'.encode())
+        return graph_hash.hexdigest()
+
+    @staticmethod
+    def _get_elo_graph_data(bot_id: int, competition_id: int):
+        """Returns the ELO history and the date of the bot update marker to render, or None if there's no history."""
         df, update_date = StatsGenerator._get_data(bot_id, competition_id)
         if not df.empty:
             df.columns = ['Name', 'ELO', 'Date']
@@ -310,6 +367,6 @@ class StatsGenerator:
             if bot_updated_datetime > update_date:
                 update_date = bot_updated_datetime
 
-            return StatsGenerator._generate_plot_images(df, update_date)
+            return df, update_date
         else:
             return None
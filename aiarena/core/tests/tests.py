@@ -1,4 +1,5 @@
 import os
+from contextlib import contextmanager
 from datetime import timedelta
 from io import StringIO
 
@@ -7,17 +8,26 @@ from django.core.exceptions import ValidationError
 from django.core.files import File
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.management import call_command, CommandError
-from django.test import TestCase, TransactionTestCase
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework.authtoken.models import Token
 
 from aiarena.api.arenaclient.testing_utils import AcApiTestingClient
-from aiarena.core.api import Matches
+from aiarena.core.api import Competitions, Jobs, Matches, Tags
+from aiarena.core.api.maps import Maps
+from aiarena.core.d_utils import filter_tags, random_pick
 from aiarena.core.management.commands import cleanupreplays
 from aiarena.core.models import User, Bot, Map, Match, Result, MatchParticipation, Competition, Round, ArenaClient, \
-    CompetitionParticipation, MapPool, WebsiteUser
+    CompetitionParticipation, MapPool, WebsiteUser, Job, CompetitionBotMatchupStats, CompetitionBotMapStats, MatchTag, \
+    Tag
 from aiarena.core.models.bot_race import BotRace
+from aiarena.core.models.game import Game
 from aiarena.core.models.game_mode import GameMode
+from aiarena.core.stats.downsampling import downsample_lttb
+from aiarena.core.stats.stats_generator import StatsGenerator
 from aiarena.core.tests.testing_utils import TestAssetPaths
 from aiarena.core.utils import calculate_md5
 
@@ -35,6 +45,16 @@ class BaseTestMixin(object):
         self.test_ac_api_client = AcApiTestingClient()
 
 
+    @contextmanager
+    def assertMaxQueries(self, max_queries):
+        """Fails if the block runs more than max_queries database queries."""
+        with CaptureQueriesContext(connection) as queries:
+            yield
+        self.assertLessEqual(len(queries), max_queries,
+                             f"{len(queries)} queries were run, more than the budget of {max_queries}:\n"
+                             + '\n'.join(query['sql'] for query in queries.captured_queries))
+
+
     def _create_map_for_competition(self, name, competition_id):
         with open(TestAssetPaths.test_map_path, 'rb') as map_file:
             competition = Competition.objects.get(id=competition_id)
@@ -363,6 +383,44 @@ class UtilsTestCase(BaseTestMixin, TestCase):
         filename = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'test-media/../test-media/test_bot.zip')
         self.assertEqual('c96bcfc79318a8b50b0b2c8696400d06', calculate_md5(filename))
 
+    def test_downsample_lttb(self):
+        points = [(x, (x % 7) ** 2) for x in range(30)]
+        self.assertEqual(downsample_lttb(points, 30), points)
+        self.assertEqual(downsample_lttb(points, 100), points)
+
+        sampled = downsample_lttb(points, 6)
+        self.assertEqual(len(sampled), 6)
+        self.assertEqual(sampled[0], points[0])
+        self.assertEqual(sampled[-1], points[-1])
+        # the peaks are what shape the line, so they should be kept
+        self.assertEqual(sampled, [(0, 0), (6, 36), (8, 1), (20, 36), (22, 1), (29, 1)])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_random_pick(self):
+        game_mode = GameMode.objects.create(name='Melee', game=Game.objects.create(name='StarCraft II'))
+        self.assertIsNone(Maps.random_of_game_mode(game_mode))
+
+        map1 = Map.objects.create(name='map1', game_mode=game_mode)
+        self.assertEqual(Maps.random_of_game_mode(game_mode), map1)
+        self.assertIsNone(random_pick(Map.objects.filter(game_mode=game_mode), 'maps', 'test', exclude_pks=(map1.id,)))
+
+        # the cached id list should be invalidated when maps change
+        map2 = Map.objects.create(name='map2', game_mode=game_mode)
+        map1.delete()
+        for _ in range(5):
+            self.assertEqual(Maps.random_of_game_mode(game_mode), map2)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_random_pick_without_cache(self):
+        game_mode = GameMode.objects.create(name='Melee', game=Game.objects.create(name='StarCraft II'))
+        self.assertIsNone(Maps.random_of_game_mode(game_mode))
+
+        maps = [Map.objects.create(name=f'map{i}', game_mode=game_mode) for i in range(3)]
+        self.assertIn(Maps.random_of_game_mode(game_mode), maps)
+        for _ in range(5):
+            self.assertEqual(random_pick(Map.objects.filter(game_mode=game_mode), 'maps', 'test',
+                                         exclude_pks=(maps[0].id, maps[1].id)), maps[2])
+
 
 class BotTestCase(LoggedInMixin, TestCase):
 
@@ -542,6 +600,50 @@ class MatchTagsTestCase(MatchReadyMixin, TestCase):
         match_tags = Match.objects.get(id=match_response.data['id']).tags.all()
         self.assertTrue(match_tags.count()==64)
 
+    def test_set_match_tags(self):
+        game_mode = GameMode.objects.first()
+        match1 = Matches.request_match(self.staffUser1, self.staffUser1Bot2, self.regularUser1Bot1, game_mode=game_mode)
+        match2 = Matches.request_match(self.staffUser1, self.staffUser1Bot2, self.regularUser1Bot1, game_mode=game_mode)
+
+        # the number of queries shouldn't depend on the number of tags
+        with self.assertMaxQueries(8):
+            Tags.set_match_tags(match1, self.staffUser1, [str(i) for i in range(32)])
+        Tags.set_match_tags(match1, self.regularUser1, ['shared', 'mine'])
+        Tags.set_match_tags(match2, self.staffUser1, ['shared', 'other'])
+        self.assertEqual(match1.tags.filter(user=self.staffUser1).count(), 32)
+        # existing tags and match tags are reused
+        self.assertEqual(Tag.objects.filter(name='shared').count(), 1)
+        self.assertEqual(MatchTag.objects.filter(user=self.staffUser1, tag__name='shared').count(), 1)
+
+        # tags left off are removed, and deleted once nothing uses them
+        Tags.set_match_tags(match1, self.staffUser1, ['0', 'other'])
+        self.assertEqual(sorted(str(mt.tag) for mt in match1.tags.filter(user=self.staffUser1)), ['0', 'other'])
+        self.assertFalse(Tag.objects.filter(name='31').exists())
+        self.assertFalse(MatchTag.objects.filter(tag__name='31').exists())
+        # another user's tags on the same match are left alone
+        self.assertEqual(match1.tags.filter(user=self.regularUser1).count(), 2)
+
+        Tags.set_match_tags(match1, self.regularUser1, [])
+        self.assertFalse(match1.tags.filter(user=self.regularUser1).exists())
+        self.assertFalse(Tag.objects.filter(name='mine').exists())
+        # still tagged on match2 by staffUser1
+        self.assertTrue(Tag.objects.filter(name='shared').exists())
+
+        # tag searches match any part of a tag, and every searched tag has to be present
+        self.assertEqual(set(filter_tags(Match.objects.all(), 'othe', 'tags__tag__name', 'icontains', 'tags__user')),
+                         {match1, match2})
+        self.assertEqual(set(filter_tags(Match.objects.all(), f'{self.staffUser1.id}|hare,oth', 'tags__tag__name',
+                                         'icontains', 'tags__user')), {match2})
+
+        # deleting a match leaves its tags behind until they're cleaned up
+        match2.delete()
+        self.assertTrue(Tag.objects.filter(name='shared').exists())
+        out = StringIO()
+        call_command('cleanuptags', stdout=out)
+        self.assertIn('Cleaned up 1 match tags and 1 tags.', out.getvalue())
+        self.assertFalse(Tag.objects.filter(name='shared').exists())
+        self.assertEqual(match1.tags.filter(user=self.staffUser1).count(), 2)
+
 
 
 
@@ -844,6 +946,86 @@ class ManagementCommandTests(MatchReadyMixin, TransactionTestCase):
         self.assertIn('Done', out.getvalue())
 
 
+    def test_incremental_stats_match_generatestats(self):
+        self._generate_full_data_set()
+
+        # the stats are kept up to date as results are submitted
+        stat_fields = ['match_count', 'win_count', 'loss_count', 'tie_count', 'crash_count',
+                       'win_perc', 'loss_perc', 'tie_perc', 'crash_perc']
+        played = CompetitionParticipation.objects.filter(match_count__gt=0).order_by('id')
+        participant_stats = list(played.values_list('id', 'highest_elo', *stat_fields))
+        self.assertGreater(len(participant_stats), 0)
+        matchup_stats = {(stats.bot_id, stats.opponent_id): [getattr(stats, field) for field in stat_fields]
+                         for stats in CompetitionBotMatchupStats.objects.all()}
+        map_stats = {(stats.bot_id, stats.map_id): [getattr(stats, field) for field in stat_fields]
+                     for stats in CompetitionBotMapStats.objects.all()}
+
+        # recomputing them from scratch shouldn't change anything
+        call_command('generatestats', '--allcompetitions', stdout=StringIO())
+        self.assertEqual(participant_stats, list(played.values_list('id', 'highest_elo', *stat_fields)))
+        for stats in CompetitionBotMatchupStats.objects.filter(match_count__gt=0):
+            self.assertEqual(matchup_stats[(stats.bot_id, stats.opponent_id)],
+                             [getattr(stats, field) for field in stat_fields])
+        for stats in CompetitionBotMapStats.objects.filter(match_count__gt=0):
+            self.assertEqual(map_stats[(stats.bot_id, stats.map_id)],
+                             [getattr(stats, field) for field in stat_fields])
+
+
+    def test_generatestats_skips_unchanged_bots(self):
+        self._generate_full_data_set()
+        # results which might have been committed out of order are processed again by the next run
+        call_command('generatestats', stdout=StringIO())
+        out = StringIO()
+        call_command('generatestats', stdout=out)
+        self.assertIn('Generating ELO graphs', out.getvalue())
+
+        Result.objects.update(created=timezone.now() - timedelta(hours=1))
+        call_command('generatestats', stdout=StringIO())
+        self.assertFalse(CompetitionParticipation.objects.filter(competition__status__in=['open', 'closing'],
+                                                                 match_count__gt=0,
+                                                                 stats_last_result_id__isnull=True).exists())
+
+        # nothing has been played since the last run
+        out = StringIO()
+        call_command('generatestats', stdout=out)
+        self.assertNotIn('Generating ELO graphs', out.getvalue())
+        self.assertIn('No new results', out.getvalue())
+
+        # unless a full run is requested
+        out = StringIO()
+        call_command('generatestats', '--full', stdout=out)
+        self.assertIn('Generating ELO graphs', out.getvalue())
+
+
+    def test_generatestats_skips_unchanged_graphs(self):
+        self._generate_full_data_set()
+        call_command('generatestats', stdout=StringIO())
+        sp = CompetitionParticipation.objects.filter(match_count__gt=0, elo_graph_hash__isnull=False).first()
+        graph_hash = sp.elo_graph_hash
+        graph_modified = sp.elo_graph.storage.get_modified_time(sp.elo_graph.name)
+
+        # the ELO history hasn't changed, so the graphs aren't rendered again
+        StatsGenerator.update_elo_graphs(sp)
+        sp.refresh_from_db()
+        self.assertEqual(sp.elo_graph_hash, graph_hash)
+        self.assertEqual(sp.elo_graph.storage.get_modified_time(sp.elo_graph.name), graph_modified)
+
+        # a different hash means the graphs are out of date
+        CompetitionParticipation.objects.filter(id=sp.id).update(elo_graph_hash='outdated')
+        sp.refresh_from_db()
+        StatsGenerator.update_elo_graphs(sp)
+        sp.refresh_from_db()
+        self.assertEqual(sp.elo_graph_hash, graph_hash)
+
+
+    def test_generatestats_workers(self):
+        self._generate_full_data_set()
+        out = StringIO()
+        call_command('generatestats', '--workers', '2', stdout=out)
+        self.assertIn('Generated ELO graphs for bot', out.getvalue())
+        self.assertIn('Done', out.getvalue())
+
+
     def test_generatestats_competition(self):
         self._generate_full_data_set()
         out = StringIO()
@@ -860,12 +1042,83 @@ class ManagementCommandTests(MatchReadyMixin, TransactionTestCase):
         self.assertIn('Done', out.getvalue())
 
 
+    def test_recalculate_competition_elos(self):
+        self._generate_full_data_set()
+        for competition in Competition.objects.all():
+            participants = CompetitionParticipation.objects.filter(competition=competition).order_by('id')
+            participations = MatchParticipation.objects.filter(match__round__competition=competition,
+                                                               match__result__isnull=False).order_by('id')
+            elos = list(participants.values_list('id', 'elo'))
+            match_elos = list(participations.values_list('id', 'resultant_elo', 'elo_change'))
+
+            # replaying the results should arrive at exactly the same ELOs
+            CompetitionParticipation.objects.filter(competition=competition).update(elo=0)
+            participations.update(resultant_elo=None, elo_change=None)
+            out = StringIO()
+            call_command('recalculatecompetitionelos', competition.id, stdout=out)
+            self.assertIn('Job finished!', out.getvalue())
+            self.assertEqual(list(participants.values_list('id', 'elo')), elos)
+            # matches cancelled outside of result submission never had their ELOs recorded
+            self.assertEqual(list(participations.filter(id__in=[match_elo[0] for match_elo in match_elos
+                                                                if match_elo[1] is not None])
+                                  .values_list('id', 'resultant_elo', 'elo_change')),
+                             [match_elo for match_elo in match_elos if match_elo[1] is not None])
+
+    def test_audit_elos(self):
+        self._generate_full_data_set()
+        competition = Competition.objects.filter(participations__match_count__gt=0).first()
+
+        out = StringIO()
+        call_command('auditelos', stdout=out)
+        self.assertIn(f'Audited {Competition.objects.count()} competitions.', out.getvalue())
+
+        # corrupt an ELO behind the running count's back
+        CompetitionParticipation.objects.filter(id=competition.participations.first().id).update(elo=F('elo') + 5)
+        with self.assertRaisesMessage(CommandError, 'ELO drift found in 1 of'):
+            call_command('auditelos', stdout=StringIO(), stderr=StringIO())
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('auditelos', '--competitionid', competition.id, '--resync', stdout=out, stderr=StringIO())
+        self.assertIn(f'Competition {competition.id}: running count reset to 5.', out.getvalue())
+        self.assertEqual(Competition.objects.get(id=competition.id).elo_drift, 5)
+
+        # a result saved over ELO which changed since it was read loses that change, and the running count says so
+        sp1, sp2, sp3 = competition.participations.order_by('id')[:3]
+        # e.g. another result moved ELO from sp3 to sp1 in the meantime
+        CompetitionParticipation.objects.filter(id=sp1.id).update(elo=F('elo') + 3)
+        CompetitionParticipation.objects.filter(id=sp3.id).update(elo=F('elo') - 3)
+        Result(id=0)._apply_elo_delta(10, sp1, sp2)
+        self.assertEqual(Competitions.audit_elo_drift([competition.id]), [(competition.id, 2, 2)])
+
+    def test_evaluate_elo_settings(self):
+        self._generate_full_data_set()
+        competition = Competition.objects.filter(participations__match_count__gt=0).first()
+        elos = list(CompetitionParticipation.objects.order_by('id').values_list('id', 'elo'))
+
+        out = StringIO()
+        call_command('evaluateelosettings', competition.id, '--k', '8', '16', stdout=out)
+        self.assertIn('K=8: log-loss', out.getvalue())
+        self.assertIn('K=16: log-loss', out.getvalue())
+        # it's read only
+        self.assertEqual(list(CompetitionParticipation.objects.order_by('id').values_list('id', 'elo')), elos)
+
     def test_seed(self):
         out = StringIO()
         call_command('seed', stdout=out)
         self.assertIn('Done. User logins have a password of "x".', out.getvalue())
 
 
+    def test_benchmark_scheduler(self):
+        # it can be run again without flushing the database
+        for _ in range(2):
+            out = StringIO()
+            call_command('benchmarkscheduler', '--bots', '8', '--competitions', '2', '--arenaclients', '2',
+                         '--matches', '2', stdout=out)
+            self.assertIn('next_match:', out.getvalue())
+            self.assertIn('submit_result:', out.getvalue())
+            self.assertIn('lock wait per call:', out.getvalue())
+
     def test_check_bot_hashes(self):
         call_command('checkbothashes')
 
@@ -892,3 +1145,45 @@ class ManagementCommandTests(MatchReadyMixin, TransactionTestCase):
 
         # confirm a result was registered
         self.assertTrue(match1.result is not None)
+
+    def test_run_jobs(self):
+        self.test_client.login(User.objects.get(username='arenaclient1'))
+
+        response = self._post_to_matches()
+        self.assertEqual(response.status_code, 201)
+        response = self._post_to_results(response.data['id'], 'Player1Crash')
+        self.assertEqual(response.status_code, 201)
+        result_id = response.data['result_id']
+
+        # the result's post-processing is left to the worker
+        self.assertTrue(Job.objects.filter(idempotency_key=f'{Jobs.MATCH_RESULT_RECEIVED}:{result_id}',
+                                           status=Job.QUEUED).exists())
+        self.assertTrue(Job.objects.filter(idempotency_key=f'{Jobs.CONSECUTIVE_CRASHES_CHECK}:{result_id}',
+                                           status=Job.QUEUED).exists())
+
+        # queueing the same work again does nothing
+        job_count = Job.objects.count()
+        Jobs.enqueue(Jobs.MATCH_RESULT_RECEIVED, {'result_id': result_id}, f'{Jobs.MATCH_RESULT_RECEIVED}:{result_id}')
+        self.assertEqual(Job.objects.count(), job_count)
+
+        # a job which fails is pushed back to be retried
+        broken_job = Jobs.enqueue('no_such_job_type', {}, 'no_such_job_type:1')
+
+        out = StringIO()
+        call_command('processjobs', '--once', stdout=out)
+        self.assertIn(f'Ran {job_count + 1} jobs.', out.getvalue())
+        self.assertFalse(Job.objects.exclude(id=broken_job.id).exclude(status=Job.DONE).exists())
+
+        broken_job.refresh_from_db()
+        self.assertEqual(broken_job.status, Job.QUEUED)
+        self.assertEqual(broken_job.attempts, 1)
+        self.assertGreater(broken_job.run_after, timezone.now())
+        self.assertIsNotNone(broken_job.last_error)
+
+        # until it runs out of attempts
+        for attempt in range(config.JOB_MAX_ATTEMPTS - 1):
+            Job.objects.filter(id=broken_job.id).update(run_after=timezone.now())
+            self.assertTrue(Jobs.run_next())
+        broken_job.refresh_from_db()
+        self.assertEqual(broken_job.status, Job.FAILED)
+        self.assertFalse(Jobs.run_next())
@@ -4,9 +4,9 @@ from django.http import HttpResponseRedirect
 from wiki.editors import getEditor
 from wiki.models import ArticleRevision
 
-from aiarena.core.models import ArenaClient, Bot, Map, Match, MatchParticipation, Result, Round, Competition, \
+from aiarena.core.models import ArenaClient, Bot, BotDataLock, Map, Match, MatchParticipation, Result, Round, Competition, \
     CompetitionBotMatchupStats, CompetitionParticipation, Trophy, TrophyIcon, User, News, MapPool, MatchTag, Tag, \
-    ArenaClientStatus, WebsiteUser
+    ArenaClientStatus, WebsiteUser, Job, ChunkedUpload
 from aiarena.core.models.bot_race import BotRace
 from aiarena.core.models.game import Game
 from aiarena.core.models.game_mode import GameMode
@@ -129,6 +129,12 @@ class BotAdmin(admin.ModelAdmin):
         'wiki_article',
     )
 
+
+@admin.register(BotDataLock)
+class BotDataLockAdmin(admin.ModelAdmin):
+    list_display = ('id', 'bot', 'match', 'created',)
+    search_fields = ('bot__name', 'match__id',)
+
 @admin.register(BotRace)
 class BotRaceAdmin(admin.ModelAdmin):
     search_fields = ('label',)
@@ -170,6 +176,12 @@ class CompetitionAdminForm(forms.ModelForm):
         exclude = []
 
 
+@admin.register(ChunkedUpload)
+class ChunkedUploadAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'filename', 'size', 'md5hash', 'status', 'created', 'finished',)
+    list_filter = ('status',)
+
+
 @admin.register(Competition)
 class CompetitionAdmin(admin.ModelAdmin):
     list_display = (
@@ -274,6 +286,13 @@ class GameModeAdmin(admin.ModelAdmin):
     search_fields = ('name', 'game')
 
 
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'type', 'idempotency_key', 'status', 'attempts', 'run_after', 'created', 'finished',)
+    list_filter = ('type', 'status',)
+    search_fields = ('idempotency_key',)
+
+
 @admin.register(Map)
 class MapAdmin(admin.ModelAdmin):
     search_fields = ('name',)
@@ -351,6 +370,16 @@ class MatchTagAdmin(admin.ModelAdmin):
     )
     search_fields = ('tag__name',)
 
+    # tags are otherwise cleaned up when they're removed from their last match
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        Tag.delete_orphans([obj.tag_id])
+
+    def delete_queryset(self, request, queryset):
+        tag_ids = list(queryset.values_list('tag_id', flat=True))
+        super().delete_queryset(request, queryset)
+        Tag.delete_orphans(tag_ids)
+
 
 @admin.register(News)
 class NewsAdmin(admin.ModelAdmin):
@@ -147,6 +147,30 @@ class PageRenderTestCase(FullDataSetMixin, TransactionTestCase):
         self.assertEqual(response.status_code, 404)
 
 
+class PageQueryBudgetTestCase(FullDataSetMixin, TransactionTestCase):
+    """
+    Catches changes which add database queries to the main pages, such as a query per row of a table.
+    If a change legitimately needs more queries, raise the budget in the same change.
+    """
+
+    def test_page_queries(self):
+        competition = Competition.objects.filter(participations__match_count__gt=0).first()
+        pages = {
+            '/': 95,
+            '/bots/': 30,
+            f'/bots/{competition.participations.first().bot_id}/': 42,
+            '/results/': 20,
+            f'/matches/{Match.objects.filter(result__isnull=False).first().id}/': 36,
+            f'/rounds/{Round.objects.first().id}/': 160,
+            '/competitions/': 16,
+            f'/competitions/{competition.id}/': 46,
+        }
+        for url, budget in pages.items():
+            with self.subTest(url=url), self.assertMaxQueries(budget):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+
 class RequestMatchTestCase(FullDataSetMixin, TestCase):
 
     def test_request_match_regular_user(self):
@@ -29,13 +29,13 @@ from rest_framework.authtoken.models import Token
 from wiki.editors import getEditor
 from wiki.models import ArticleRevision
 
-from aiarena.core.api import Matches
+from aiarena.core.api import Matches, Tags
 from aiarena.core.api.ladders import Ladders
 from aiarena.core.api.maps import Maps
 from aiarena.core.d_utils import filter_tags
 from aiarena.core.models import Bot, Result, User, Round, Match, MatchParticipation, CompetitionParticipation, \
     Competition, Map, \
-    ArenaClient, News, MapPool, MatchTag, Tag
+    ArenaClient, News, MapPool
 from aiarena.core.models import Trophy
 from aiarena.core.models.bot_race import BotRace
 from aiarena.core.models.relative_result import RelativeResult
@@ -907,16 +907,7 @@ class MatchTagFormView(SingleObjectMixin, FormView):
     def post(self, request, *args, **kwargs):
         form = MatchTagForm(request.POST)
         if request.user.is_authenticated and form.is_valid():
-            match = self.get_object()
-            match_tags = []
-            for tag in form.cleaned_data["tags"]:
-                tag_obj = Tag.objects.get_or_create(name=tag)
-                match_tags.append(MatchTag.objects.get_or_create(tag=tag_obj[0], user=request.user)[0])
-
-            # remove tags for this match that belong to this user and were not sent in the form
-            match.tags.remove(*match.tags.filter(user=request.user).exclude(id__in=[mt.id for mt in match_tags]))
-            # add everything, this shouldn't cause duplicates
-            match.tags.add(*match_tags)
+            Tags.set_match_tags(self.get_object(), request.user, form.cleaned_data["tags"])
 
         return super().post(request, *args, **kwargs)
 
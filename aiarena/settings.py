@@ -161,6 +161,8 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 100,
 }
 
+# Random picks of maps and bots cache their candidate id lists in the default cache. With the dummy cache they
+# fall back to reading a row at a random offset instead.
 CACHES = {
     "default": {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
@@ -186,8 +188,28 @@ CONSTANCE_CONFIG = {
     'TIMEOUT_MATCHES_AFTER': (
         timedelta(hours=1),
         'How long to wait before the website should time out a running match.', timedelta),
+    'MATCH_LEASE_DURATION': (
+        timedelta(0),
+        'How long an arena client holds a match without sending a heartbeat. Once a lease expires the match is '
+        'put back into the queue. 0 disables leases. Only enable this once the arena clients send heartbeats, '
+        'and keep it no shorter than TIMEOUT_MATCHES_AFTER unless they send them more often than that.', timedelta),
     'REISSUE_UNFINISHED_MATCHES': (True, 'Whether to reissue previously assigned unfinished matches '
                                          'when an arena client requests a match.'),
+    'MATCH_REQUEST_LONG_POLL_TIMEOUT': (30, 'The longest time, in seconds, an arena client may ask to wait for a '
+                                            'match to become available when requesting one. Each waiting client '
+                                            'holds a web worker thread. Waiting clients are woken through the cache, '
+                                            'so with a dummy cache long polling is turned off. '
+                                            '0 disables long polling.'),
+    'MAX_MATCHES_PER_ARENACLIENT_REQUEST': (8, 'The maximum number of matches an arena client can be handed '
+                                               'in a single batch request.'),
+    'MAX_RESULTS_PER_ARENACLIENT_REQUEST': (16, 'The maximum number of results an arena client can submit '
+                                                'in a single batch request.'),
+    'ON_DEMAND_MATCH_QUEUE_SIZE': (10, 'For competitions which create matches on demand, the number of queued '
+                                       'matches to keep ready for arena clients.'),
+    'CLAIM_MATCHES_WITH_SKIP_LOCKED': (True, 'Whether arena clients claim queued matches using '
+                                             'SELECT ... FOR UPDATE SKIP LOCKED, so that concurrent requests '
+                                             'receive different matches instead of waiting on the same row locks. '
+                                             'Ignored on database backends which do not support SKIP LOCKED.'),
     'BOT_CONSECUTIVE_CRASH_LIMIT': (0, 'The number of consecutive crashes after which a bot is deactivated. '
                                        'Any value below 1 will disable the check for this feature. Default: 0'),
     'MAX_USER_BOT_COUNT': (20, 'Maximum bots a user can have uploaded.'),
@@ -243,8 +265,13 @@ CONSTANCE_CONFIG = {
                                         '(lower ranked bot beats higher ranked) affects the interest score: ELO_DIFF_RATING_MODIFIER^ELO_DIFF-1'),
     'COMBINED_ELO_RATING_DIVISOR': (200, 'Controls how the combined bot ELO affects the interest score: '
                                          '1/(1+e^(-AVG_BOT_ELO/COMBINED_ELO_RATING_DIVISOR))-0.5'),
-    'ENABLE_ELO_SANITY_CHECK': (True, 'Whether to sanity check the total sum of bot ELO '
-                                      'on result submission in order to detect ELO corruption.'),
+    'ENABLE_ELO_SANITY_CHECK': (True, 'Whether to check the competition\'s running count of ELO drift on result '
+                                      'submission in order to detect ELO corruption. Run the auditelos command to '
+                                      'check the count against the bots\' actual ELO.'),
+    'JOB_MAX_ATTEMPTS': (5, 'The number of times a background job is attempted before it is marked as failed.'),
+    'JOB_RETRY_DELAY': (
+        timedelta(seconds=30), 'How long to wait before retrying a failed background job. '
+                               'The delay doubles with each further attempt.', timedelta),
     'BOT_UPLOADS_ENABLED': (True, 'Whether authors can upload new bots to the website.'),
     'DISCORD_INVITE_LINK': ('', 'An invite link to the Discord community server.'),
     'PATREON_LINK': ('', 'Link the Patreon.'),
@@ -264,7 +291,8 @@ CONSTANCE_CONFIG_FIELDSETS = {
              'MAX_USER_BOT_PARTICIPATIONS_ACTIVE_GOLD_TIER', 'MAX_USER_BOT_PARTICIPATIONS_ACTIVE_PLATINUM_TIER',
              'MAX_USER_BOT_PARTICIPATIONS_ACTIVE_DIAMOND_TIER',),
     'General': ('DEBUG_LOGGING_ENABLED', 'GETTING_STARTED_URL', 'HOUSE_BOTS_USER_ID', 'ALLOW_REQUESTED_MATCHES',
-                'ENABLE_ELO_SANITY_CHECK', 'PUBLIC_BANNER_MESSAGE', 'LOGGED_IN_BANNER_MESSAGE', 'ELO_TREND_N_MATCHES'),
+                'ENABLE_ELO_SANITY_CHECK', 'PUBLIC_BANNER_MESSAGE', 'LOGGED_IN_BANNER_MESSAGE', 'ELO_TREND_N_MATCHES',
+                'JOB_MAX_ATTEMPTS', 'JOB_RETRY_DELAY'),
     'Match Requests': ('MATCH_REQUEST_LIMIT_FREE_TIER', 'MATCH_REQUEST_LIMIT_BRONZE_TIER',
                        'MATCH_REQUEST_LIMIT_SILVER_TIER', 'MATCH_REQUEST_LIMIT_GOLD_TIER',
                        'MATCH_REQUEST_LIMIT_PLATINUM_TIER', 'MATCH_REQUEST_LIMIT_DIAMOND_TIER',
@@ -272,8 +300,10 @@ CONSTANCE_CONFIG_FIELDSETS = {
     'File size limits': ('BOT_ZIP_SIZE_LIMIT_IN_MB_FREE_TIER', 'BOT_ZIP_SIZE_LIMIT_IN_MB_BRONZE_TIER',
                          'BOT_ZIP_SIZE_LIMIT_IN_MB_SILVER_TIER', 'BOT_ZIP_SIZE_LIMIT_IN_MB_GOLD_TIER',
                          'BOT_ZIP_SIZE_LIMIT_IN_MB_PLATINUM_TIER', 'BOT_ZIP_SIZE_LIMIT_IN_MB_DIAMOND_TIER',),
-    'Ladders': ('LADDER_ENABLED', 'TIMEOUT_MATCHES_AFTER',
-                'BOT_CONSECUTIVE_CRASH_LIMIT', 'REISSUE_UNFINISHED_MATCHES',),
+    'Ladders': ('LADDER_ENABLED', 'TIMEOUT_MATCHES_AFTER', 'MATCH_LEASE_DURATION',
+                'BOT_CONSECUTIVE_CRASH_LIMIT', 'REISSUE_UNFINISHED_MATCHES', 'CLAIM_MATCHES_WITH_SKIP_LOCKED',
+                'MAX_MATCHES_PER_ARENACLIENT_REQUEST', 'MAX_RESULTS_PER_ARENACLIENT_REQUEST', 'ON_DEMAND_MATCH_QUEUE_SIZE',
+                'MATCH_REQUEST_LONG_POLL_TIMEOUT',),
     'Integrations': ('DISCORD_CLIENT_ID', 'DISCORD_CLIENT_SECRET', 'PATREON_CLIENT_ID', 'PATREON_CLIENT_SECRET',
                      'PATREON_CREATOR_REFRESH_TOKEN'),
     'Match interest analysis': ('ELO_DIFF_RATING_MODIFIER', 'COMBINED_ELO_RATING_DIVISOR',),